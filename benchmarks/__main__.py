@@ -0,0 +1,71 @@
+import json
+import sys
+
+import click
+
+from benchmarks.runner import SCENARIOS, compare, run
+
+
+def parse_config(values):
+    config = {}
+
+    for value in values:
+        key, _, raw = value.partition('=')
+
+        # Numbers, booleans and JSON objects are decoded; anything else
+        # (including "null", a CACHE_TYPE) is kept as a string.
+        try:
+            decoded = json.loads(raw)
+        except ValueError:
+            decoded = None
+
+        config[key] = raw if decoded is None or isinstance(decoded, str) else decoded
+
+    return config
+
+
+@click.command()
+@click.option('--users', default=10, show_default=True, help='Users to seed.')
+@click.option('--posts', default=1000, show_default=True, help='Posts to seed.')
+@click.option('--requests', default=200, show_default=True, help='Timed requests per scenario.')
+@click.option('--warmup', default=20, show_default=True, help='Untimed requests per scenario.')
+@click.option('--scenario', 'scenarios', multiple=True,
+              type=click.Choice(list(SCENARIOS)), help='Only run these scenarios.')
+@click.option('--config', 'config', multiple=True, metavar='KEY=VALUE',
+              help='App config override, e.g. CACHE_TYPE=null.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Write results as JSON.')
+@click.option('--compare', 'baseline', type=click.File(),
+              help='Baseline results to check for regressions.')
+@click.option('--threshold', default=0.2, show_default=True,
+              help='Allowed relative slowdown before a regression is reported.')
+def main(users, posts, requests, warmup, scenarios, config, output, baseline, threshold):
+    """Seed a synthetic blog and measure flaskr's endpoints."""
+    results = run(
+        users=users, posts=posts, requests=requests, warmup=warmup,
+        scenarios=scenarios, config=parse_config(config),
+    )
+
+    click.echo(f"{'scenario':<18}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+
+    for name, result in results['results'].items():
+        click.echo(
+            f"{name:<18}{result['throughput']:>10.1f}{result['p50_ms']:>10.2f}"
+            f"{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['errors']:>8}"
+        )
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if baseline:
+        regressions = compare(results, json.load(baseline), threshold)
+
+        for regression in regressions:
+            click.echo(f'REGRESSION {regression}', err=True)
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
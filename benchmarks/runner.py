@@ -0,0 +1,219 @@
+import math
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from flaskr import create_app
+from flaskr.db import get_db, init_db
+from flaskr.testing import AuthActions, close_app
+
+from benchmarks.seed import CATEGORIES, PASSWORD, TAGS, seed
+
+SCENARIOS = {}
+
+
+def scenario(name, login=False):
+    """Register a benchmark: a function of (client, ids, rng) making one request."""
+    def decorator(func):
+        SCENARIOS[name] = (func, login)
+        return func
+
+    return decorator
+
+
+@scenario('index')
+def index(client, ids, rng):
+    return client.get('/')
+
+
+@scenario('index_logged_in', login=True)
+def index_logged_in(client, ids, rng):
+    return client.get('/')
+
+
+@scenario('article')
+def article(client, ids, rng):
+    return client.get(f'/article/{rng.choice(ids)}')
+
+
+@scenario('tag')
+def tag(client, ids, rng):
+    return client.get(f'/tag/{rng.choice(TAGS)}')
+
+
+@scenario('category')
+def category(client, ids, rng):
+    return client.get(f'/category/{rng.choice(CATEGORIES)}')
+
+
+@scenario('popular')
+def popular(client, ids, rng):
+    return client.get('/popular')
+
+
+@scenario('feed')
+def feed(client, ids, rng):
+    return client.get('/feed.xml')
+
+
+@scenario('sitemap')
+def sitemap(client, ids, rng):
+    return client.get('/sitemap.xml')
+
+
+@scenario('api_posts')
+def api_posts(client, ids, rng):
+    return client.get('/api/v1/posts')
+
+
+@scenario('search')
+def search(client, ids, rng):
+    return client.get('/search', query_string={'q': rng.choice(('cache', 'query index', 'stream'))})
+
+
+@scenario('login')
+def login(client, ids, rng):
+    return client.post('/auth/login', data={'username': 'user0', 'password': PASSWORD})
+
+
+@scenario('create_form', login=True)
+def create_form(client, ids, rng):
+    return client.get('/create')
+
+
+@scenario('create', login=True)
+def create(client, ids, rng):
+    return client.post('/create', data={
+        'title': 'Benchmark post', 'body': '<p>Benchmark body</p>', 'tags': 'python, web',
+    })
+
+
+@scenario('autosave', login=True)
+def autosave(client, ids, rng):
+    return client.post('/autosave', data={'title': 'Draft', 'body': '<p>Draft</p>'})
+
+
+def fetch(func, client, ids, rng):
+    # Streamed responses (feeds, the API) do their work as the body is read.
+    response = func(client, ids, rng)
+    response.get_data()
+    response.close()
+    return response
+
+
+def percentile(samples, q):
+    # Nearest-rank percentile of an already sorted list.
+    return samples[max(math.ceil(q / 100 * len(samples)) - 1, 0)]
+
+
+def summarize(timings, errors, elapsed):
+    timings = sorted(timings)
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'throughput': len(timings) / elapsed if elapsed else 0.0,
+        'mean_ms': sum(timings) / len(timings) * 1000,
+        'p50_ms': percentile(timings, 50) * 1000,
+        'p95_ms': percentile(timings, 95) * 1000,
+        'p99_ms': percentile(timings, 99) * 1000,
+    }
+
+
+def run(users=10, posts=1000, requests=200, warmup=20, scenarios=None,
+        config=None, seed_value=0):
+    """Seed a throwaway database and time every scenario against it.
+
+    Returns the results document that ``compare`` and the command line work
+    with.
+    """
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite')
+    uploads = tempfile.mkdtemp()
+    feeds = tempfile.mkdtemp()
+    app = create_app({
+        'DATABASE': db_path,
+        'UPLOAD_FOLDER': uploads,
+        'FEED_CACHE_DIR': feeds,
+        **(config or {}),
+    })
+
+    try:
+        with app.app_context():
+            init_db()
+            seed(get_db(), users=users, posts=posts, seed=seed_value)
+            ids = [row[0] for row in get_db().execute('SELECT id FROM post')]
+
+        results = {}
+
+        for name in scenarios or SCENARIOS:
+            func, needs_login = SCENARIOS[name]
+            client = app.test_client()
+            rng = random.Random(seed_value)
+
+            if needs_login:
+                AuthActions(client).login('user0', PASSWORD)
+
+            for _ in range(warmup):
+                fetch(func, client, ids, rng)
+
+            timings, errors = [], 0
+            started = time.perf_counter()
+
+            for _ in range(requests):
+                start = time.perf_counter()
+                response = fetch(func, client, ids, rng)
+                timings.append(time.perf_counter() - start)
+
+                if response.status_code >= 400:
+                    errors += 1
+
+            results[name] = summarize(timings, errors, time.perf_counter() - started)
+    finally:
+        close_app(app)
+        os.close(db_fd)
+        os.unlink(db_path)
+        shutil.rmtree(uploads)
+        shutil.rmtree(feeds)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'users': users,
+            'posts': posts,
+            'requests': requests,
+            'config': config or {},
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold=0.2):
+    """List regressions of ``current`` against ``baseline``.
+
+    A scenario regresses when its p95 latency grows, or its throughput
+    drops, by more than ``threshold`` (a fraction).
+    """
+    regressions = []
+
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+
+        if before is None:
+            continue
+
+        if result['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            regressions.append(
+                f"{name}: p95 {before['p95_ms']:.2f} ms -> {result['p95_ms']:.2f} ms"
+            )
+
+        if result['throughput'] < before['throughput'] * (1 - threshold):
+            regressions.append(
+                f"{name}: throughput {before['throughput']:.1f}/s -> {result['throughput']:.1f}/s"
+            )
+
+    return regressions
@@ -0,0 +1,90 @@
+import random
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from werkzeug.security import generate_password_hash
+
+from flaskr.counters import record_views
+from flaskr.excerpts import summarize
+from flaskr.tags import sync_post_tags
+
+WORDS = (
+    'python flask sqlite query index cache request response template render '
+    'worker thread process latency throughput memory cursor page article blog '
+    'post author editor draft search ranking token schema migration table row '
+    'column transaction commit lock journal write read stream buffer batch '
+    'profile metric histogram benchmark deploy server client browser static '
+    'image upload thumbnail feed sitemap category tag summary body title'
+).split()
+
+TAGS = (
+    'python', 'javascript', 'c', 'flutter', 'solidity', 'databases',
+    'performance', 'web', 'testing', 'devops', 'security', 'tutorial',
+)
+
+CATEGORIES = ('python', 'javascript', 'c', 'flutter', 'solidity')
+
+PASSWORD = 'benchmark'
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def paragraph(rng):
+    return ' '.join(sentence(rng, rng.randint(8, 20)) for _ in range(rng.randint(3, 7)))
+
+
+def seed(db, users=10, posts=1000, seed=0):
+    """Fill an initialized database with a synthetic but realistic blog.
+
+    Every user gets the password ``PASSWORD``. Post bodies are a few HTML
+    paragraphs (as the editor produces), with tags, categories and creation
+    dates spread over the last two years. A fifth of the posts have view
+    counts, for /popular. Must run in an app context.
+    """
+    rng = random.Random(seed)
+    pwhash = generate_password_hash(PASSWORD)
+    db.executemany(
+        'INSERT INTO user (username, password) VALUES (?, ?)',
+        [(f'user{n}', pwhash) for n in range(users)]
+    )
+    user_ids = [row[0] for row in db.execute('SELECT id FROM user')]
+    now = datetime.now().replace(microsecond=0)
+
+    def rows():
+        for n in range(posts):
+            created = now - timedelta(minutes=rng.randint(1, 2 * 365 * 24 * 60))
+            body = ''.join(f'<p>{paragraph(rng)}</p>' for _ in range(rng.randint(2, 8)))
+            stats = summarize(body)
+            yield (
+                sentence(rng, rng.randint(3, 9)).rstrip('.'),
+                body,
+                sentence(rng, 20),
+                rng.choice(CATEGORIES),
+                ', '.join(rng.sample(TAGS, rng.randint(1, 4))),
+                created,
+                created,
+                stats['excerpt'],
+                stats['word_count'],
+                stats['reading_time'],
+                rng.choice(user_ids),
+            )
+
+    db.executemany(
+        'INSERT INTO post (title, body, summary, category, tags, created, publish_date, '
+        'excerpt, word_count, reading_time, author_id) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        rows()
+    )
+    post_ids = []
+
+    for post_id, tags in db.execute('SELECT id, tags FROM post').fetchall():
+        sync_post_tags(db, post_id, tags)
+        post_ids.append(post_id)
+
+    record_views(
+        {post_id: rng.randint(1, 500) for post_id in rng.sample(post_ids, len(post_ids) // 5)},
+        time.time(), current_app.config['POPULAR_HALF_LIFE']
+    )
+    db.commit()
@@ -0,0 +1,188 @@
+"""Reader latency while slow clients upload images.
+
+Starts flaskr on a threaded development server and has ``--uploads`` clients
+post an image to ``/<id>/update``, trickling the body over ``--duration``
+seconds. Meanwhile ``--readers`` clients fetch ``/api/v1/posts/<id>`` in a
+loop. A view that checks out a database connection before reading the body
+keeps it for the whole upload; once there are more uploads than pooled
+connections, every reader queues behind them.
+
+    python -m benchmarks.slow_clients --uploads 8 --pool-size 4
+"""
+import http.client
+import io
+import logging
+import os
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+import click
+from werkzeug.serving import make_server
+
+from flaskr import create_app
+from flaskr.db import get_db, init_db
+from flaskr.testing import close_app
+
+try:
+    from PIL import Image
+except ImportError:  # Without Pillow the uploads are random bytes.
+    Image = None
+
+from benchmarks.runner import percentile
+from benchmarks.seed import seed
+
+BOUNDARY = 'flaskr-benchmark'
+
+
+def multipart(fields, image):
+    parts = []
+
+    for name, value in fields.items():
+        parts.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+
+    parts.append(
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="image"; filename="photo.jpg"\r\n'
+        'Content-Type: image/jpeg\r\n\r\n'.encode() + image + b'\r\n'
+    )
+    parts.append(f'--{BOUNDARY}--\r\n'.encode())
+    return b''.join(parts)
+
+
+def noise_image(kb):
+    # Noise barely compresses, so the JPEG comes out close to ``kb``.
+    if Image is None:
+        return os.urandom(kb * 1024)
+
+    side = int((kb * 1024 / 3) ** 0.5)
+    output = io.BytesIO()
+    Image.frombytes('RGB', (side, side), os.urandom(side * side * 3)).save(
+        output, 'JPEG', quality=95
+    )
+    return output.getvalue()
+
+
+def slow_upload(port, cookie, post_id, body, duration, chunks=20):
+    # Send the headers at once and the body a piece at a time, like a client
+    # on a slow link.
+    sock = socket.create_connection(('127.0.0.1', port))
+
+    try:
+        sock.sendall((
+            f'POST /{post_id}/update HTTP/1.1\r\nHost: localhost\r\n'
+            f'Cookie: session={cookie}\r\nConnection: close\r\n'
+            f'Content-Type: multipart/form-data; boundary={BOUNDARY}\r\n'
+            f'Content-Length: {len(body)}\r\n\r\n'
+        ).encode())
+        step = -(-len(body) // chunks)
+
+        for start in range(0, len(body), step):
+            sock.sendall(body[start:start + step])
+            time.sleep(duration / chunks)
+
+        return sock.recv(64).split(b' ', 2)[1].decode()
+    finally:
+        sock.close()
+
+
+def read_loop(port, ids, stop, timings, errors, seed_value):
+    rng = random.Random(seed_value)
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+
+    while not stop.is_set():
+        start = time.perf_counter()
+        connection.request('GET', f'/api/v1/posts/{rng.choice(ids)}')
+        response = connection.getresponse()
+        response.read()
+        timings.append(time.perf_counter() - start)
+
+        if response.status >= 400:
+            errors.append(response.status)
+
+
+@click.command()
+@click.option('--uploads', default=8, show_default=True, help='Concurrent slow uploads.')
+@click.option('--readers', default=4, show_default=True, help='Concurrent readers.')
+@click.option('--duration', default=2.0, show_default=True, help='Seconds each upload takes.')
+@click.option('--pool-size', default=4, show_default=True, help='DATABASE_POOL_SIZE.')
+@click.option('--image-kb', default=256, show_default=True, help='Size of each upload.')
+def main(uploads, readers, duration, pool_size, image_kb):
+    """Measure reader latency while slow clients upload images."""
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite')
+    upload_folder = tempfile.mkdtemp()
+    app = create_app({
+        'DATABASE': db_path,
+        'UPLOAD_FOLDER': upload_folder,
+        'DATABASE_POOL_SIZE': pool_size,
+        'DATABASE_POOL_TIMEOUT': 60.0,
+    })
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        with app.app_context():
+            init_db()
+            seed(get_db(), users=2, posts=200)
+            ids = [row[0] for row in get_db().execute('SELECT id FROM post')]
+            owned = [row[0] for row in get_db().execute(
+                'SELECT id FROM post WHERE author_id = 1 LIMIT ?', (uploads,)
+            )]
+
+        serializer = app.session_interface.get_signing_serializer(app)
+        cookie = serializer.dumps({'user_id': 1})
+        stop = threading.Event()
+        timings, errors, statuses = [], [], []
+        reader_threads = [
+            threading.Thread(target=read_loop, args=(server.port, ids, stop, timings, errors, n))
+            for n in range(readers)
+        ]
+        upload_threads = [
+            threading.Thread(target=lambda n=n: statuses.append(slow_upload(
+                server.port, cookie, owned[n % len(owned)],
+                multipart({'title': f'Updated {n}', 'body': '<p>Updated</p>'},
+                          noise_image(image_kb)),
+                duration,
+            )))
+            for n in range(uploads)
+        ]
+
+        started = time.perf_counter()
+
+        for thread in reader_threads + upload_threads:
+            thread.start()
+
+        for thread in upload_threads:
+            thread.join()
+
+        stop.set()
+
+        for thread in reader_threads:
+            thread.join()
+
+        elapsed = time.perf_counter() - started
+        timings.sort()
+        click.echo(f'{uploads} uploads of {image_kb} KB over {duration:.1f}s each, '
+                   f'pool of {pool_size} connections, {readers} readers')
+        click.echo(f"upload statuses: {', '.join(sorted(statuses))}")
+        click.echo(
+            f'reads: {len(timings)} in {elapsed:.2f}s ({len(timings) / elapsed:.1f}/s), '
+            f'p50 {percentile(timings, 50) * 1000:.1f} ms, '
+            f'p95 {percentile(timings, 95) * 1000:.1f} ms, '
+            f'max {timings[-1] * 1000:.1f} ms, errors {len(errors)}'
+        )
+    finally:
+        server.shutdown()
+        close_app(app)
+        os.close(db_fd)
+        os.unlink(db_path)
+        shutil.rmtree(upload_folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,71 @@
 import os
+import time
 from flask import Flask
 
 
 def create_app(test_config=None):
+    started = time.perf_counter()
     app = Flask(__name__, instance_relative_config=True)
     app.config.from_mapping(
         SECRET_KEY='dev',
         DATABASE=os.path.join(app.instance_path, 'flaskr.sqlite'),
+        DATABASE_POOL_SIZE=5,
+        DATABASE_POOL_TIMEOUT=30.0,
+        DATABASE_POOL_MAX_AGE=3600.0,
+        SQLITE_PRAGMAS={
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'mmap_size': 64 * 1024 * 1024,
+            'cache_size': -16000,
+            'busy_timeout': 5000,
+            'foreign_keys': 'ON',
+        },
+        POSTS_PER_PAGE=10,
+        API_MAX_PER_PAGE=100,
+        CACHE_TYPE='lru',
+        CACHE_MAX_BYTES=32 * 1024 * 1024,
+        CACHE_DIR=None,
+        CACHE_DEFAULT_TIMEOUT=300,
+        PASSWORD_HASH_METHOD='scrypt',
+        PASSWORD_HASH_SALT_LENGTH=16,
+        PASSWORD_HASH_WORKERS=2,
+        PASSWORD_HASH_QUEUE_DEPTH=16,
+        PASSWORD_HASH_TIMEOUT=10.0,
+        USER_CACHE_SIZE=1024,
+        USER_CACHE_TTL=300,
+        AUTH_SESSION_USER=False,
+        UPLOAD_FOLDER=os.path.join(app.root_path, 'static', 'uploads'),
+        UPLOAD_MAX_BYTES=10 * 1024 * 1024,
+        MAX_CONTENT_LENGTH=16 * 1024 * 1024,
+        TASK_WORKERS=1,
+        ASYNC_IO_WORKERS=4,
+        WRITER_MAX_BATCH=64,
+        WRITER_MAX_WAIT=0.0,
+        WRITER_TIMEOUT=30.0,
+        VIEW_FLUSH_INTERVAL=5.0,
+        POPULAR_HALF_LIFE=3 * 24 * 3600,
+        POPULAR_SIZE=10,
+        RELATED_POSTS=5,
+        RELATED_MIN_SCORE=0.05,
+        RELATED_MAX_DF=0.5,
+        AUTOSAVE_WINDOW=5.0,
+        EXCERPT_LENGTH=200,
+        ASSET_MAX_AGE=365 * 24 * 3600,
+        WORDS_PER_MINUTE=200,
+        FEED_TITLE='Flaskr',
+        FEED_SIZE=20,
+        FEED_CACHE_DIR=None,
+        SITEMAP_MAX_URLS=50000,
+        TEMPLATE_CACHE=True,
+        TEMPLATE_CACHE_DIR=None,
+        WARM_UP=False,
+        SCHEDULER_INTERVAL=60.0,
+        INSTRUMENTATION=False,
+        SLOW_QUERY_SECONDS=0.1,
+        N_PLUS_ONE_THRESHOLD=10,
+        PROFILE_SAMPLE_RATE=0.0,
+        PROFILE_KEEP=10,
+        PROFILE_DIR=None,
     )
 
     if test_config is None:
@@ -22,11 +81,74 @@ def create_app(test_config=None):
     from . import db
     db.init_app(app)
 
+    from . import offload
+    offload.init_app(app)
+
+    from . import writer
+    writer.init_app(app)
+
+    from . import counters
+    counters.init_app(app)
+
+    from . import migrate
+    migrate.init_app(app)
+
+    from . import warmup
+    warmup.init_app(app)
+
+    from . import metrics
+    metrics.init_app(app)
+
+    from . import cache
+    cache.init_app(app)
+
+    from . import hashing
+    hashing.init_app(app)
+
+    from . import tasks
+    tasks.init_app(app)
+
+    from . import uploads
+    uploads.init_app(app)
+
+    from . import assets
+    assets.init_app(app)
+
+    from . import drafts
+    drafts.init_app(app)
+
+    from . import tags
+    tags.init_app(app)
+
+    from . import excerpts
+    excerpts.init_app(app)
+
+    from . import related
+    related.init_app(app)
+
+    from . import bulk
+    bulk.init_app(app)
+
+    from . import scheduler
+    scheduler.init_app(app)
+
     from . import auth
-    app.register_blueprint(auth.bp)
+    auth.init_app(app)
 
     from .blog import bp
     app.register_blueprint(bp)
     app.add_url_rule('/', endpoint='index')
 
+    from . import search
+    app.register_blueprint(search.bp)
+
+    from . import feeds
+    feeds.init_app(app)
+
+    from . import api
+    app.register_blueprint(api.bp)
+
+    if app.config['WARM_UP']:
+        warmup.warm_up(app, started)
+
     return app
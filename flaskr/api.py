@@ -0,0 +1,165 @@
+import hashlib
+import json
+from datetime import datetime
+
+from flask import Blueprint, abort, current_app, request, stream_with_context, url_for
+from werkzeug.exceptions import HTTPException
+from flaskr.blog import (
+    decode_cursor, get_posts_page, not_modified, published_post_query
+)
+from flaskr.db import get_db
+from flaskr.tags import parse_tags
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Field name -> SQL. Only the requested fields are selected.
+FIELDS = {
+    'id': 'p.id',
+    'title': 'title',
+    'summary': 'summary',
+    'excerpt': 'excerpt',
+    'body': 'body',
+    'image': 'image',
+    'category': 'category',
+    'tags': 'tags',
+    'author': 'username AS author',
+    'created': 'p.created',
+    'updated': 'updated',
+    'publish_date': 'publish_date',
+    'word_count': 'word_count',
+    'reading_time': 'reading_time',
+    'seo_title': 'seo_title',
+    'seo_description': 'seo_description',
+    'seo_keywords': 'seo_keywords',
+    'version': 'version',
+}
+DEFAULT_FIELDS = ('id', 'title', 'excerpt', 'author', 'created', 'reading_time')
+
+# Cursors and ETags are made of these, whatever was asked for.
+REQUIRED = ('id', 'created', 'version')
+
+
+def requested_fields():
+    fields = request.args.get('fields')
+
+    if not fields:
+        return list(DEFAULT_FIELDS)
+
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in FIELDS]
+
+    if unknown:
+        abort(400, f"Unknown fields: {', '.join(unknown)}.")
+
+    return list(dict.fromkeys(fields))
+
+
+def select_columns(fields):
+    return ', '.join(FIELDS[field] for field in dict.fromkeys([*REQUIRED, *fields]))
+
+
+def serialize(row, fields):
+    post = {}
+
+    for field in fields:
+        value = row[field]
+
+        if field == 'tags':
+            value = parse_tags(value)
+        elif field == 'image' and value:
+            value = url_for('static', filename=value, _external=True)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+
+        post[field] = value
+
+    return post
+
+
+def json_response(chunks, etag):
+    response = current_app.response_class(chunks, mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+
+@bp.route('/posts')
+def posts():
+    fields = requested_fields()
+    max_per_page = current_app.config['API_MAX_PER_PAGE']
+    per_page = request.args.get('per_page', current_app.config['POSTS_PER_PAGE'], type=int)
+    per_page = min(max(per_page, 1), max_per_page)
+    before = request.args.get('before')
+    after = request.args.get('after')
+    filters = {}
+
+    if request.args.get('tag'):
+        tag = get_db().execute(
+            'SELECT id FROM tag WHERE name = ?', (request.args['tag'].lower(),)
+        ).fetchone()
+
+        if tag is None:
+            abort(404, f"Tag {request.args['tag']!r} doesn't exist.")
+
+        filters['tag_id'] = tag['id']
+    elif request.args.get('category'):
+        filters['category'] = request.args['category']
+
+    rows, newer, older = get_posts_page(
+        before=decode_cursor(before) if before else None,
+        after=decode_cursor(after) if after else None,
+        per_page=per_page,
+        columns=select_columns(fields),
+        **filters
+    )
+    etag = hashlib.sha1(repr((
+        [(row['id'], row['version']) for row in rows], newer, older, fields,
+    )).encode()).hexdigest()
+    response = not_modified(etag)
+
+    if response is not None:
+        return response
+
+    args = {key: value for key, value in request.args.items() if key not in ('before', 'after')}
+    links = {
+        'next': url_for('api.posts', before=older, **args, _external=True) if older else None,
+        'prev': url_for('api.posts', after=newer, **args, _external=True) if newer else None,
+    }
+
+    def generate():
+        # Encode one post at a time instead of building the whole document.
+        yield json.dumps(links)[:-1] + ', "posts": ['
+
+        for n, row in enumerate(rows):
+            yield (', ' if n else '') + json.dumps(serialize(row, fields))
+
+        yield ']}'
+
+    # serialize() builds image URLs, which needs the request context.
+    return json_response(stream_with_context(generate()), etag)
+
+
+@bp.route('/posts/<int:id>')
+def post(id):
+    fields = requested_fields()
+    row = get_db().execute(
+        published_post_query(select_columns(fields)), (id,)
+    ).fetchone()
+
+    if row is None:
+        abort(404, f"Post id {id} doesn't exist.")
+
+    etag = f"{row['id']}-{row['version']}-{hashlib.sha1(','.join(fields).encode()).hexdigest()[:8]}"
+    response = not_modified(etag)
+
+    if response is not None:
+        return response
+
+    return json_response(json.dumps(serialize(row, fields)), etag)
+
+
+@bp.errorhandler(HTTPException)
+def error(e):
+    response = e.get_response()
+    response.data = json.dumps({'error': e.description, 'status': e.code})
+    response.mimetype = 'application/json'
+    return response
@@ -0,0 +1,227 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; without it only gzip is written.
+    brotli = None
+
+BUILD_DIR = 'build'
+MANIFEST = 'manifest.json'
+
+# Already-compressed formats (PNG, JPEG, fonts) gain nothing from gzip.
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.xml', '.map', '.ico'}
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def fingerprint(relpath, data):
+    stem, ext = posixpath.splitext(relpath)
+    return posixpath.join(BUILD_DIR, f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}')
+
+
+def rewrite_css(relpath, data, manifest):
+    # Point relative url()s at the fingerprinted files; both live in build/
+    # with the same layout, so the relative path keeps working.
+    base = posixpath.dirname(relpath)
+
+    def replace(match):
+        quote, ref = match.groups()
+        target, suffix = re.match(r'([^?#]*)(.*)', ref).groups()
+
+        if re.match(r'(?:[a-z]+:|/)', target) or not target:
+            return match.group(0)
+
+        entry = manifest.get(posixpath.normpath(posixpath.join(base, target)))
+
+        if entry is None:
+            return match.group(0)
+
+        hashed = posixpath.relpath(entry['path'], posixpath.join(BUILD_DIR, base))
+        return f'url({quote}{hashed}{suffix}{quote})'
+
+    return CSS_URL.sub(replace, data.decode('utf8')).encode('utf8')
+
+
+def compress(data):
+    variants = {'gzip': gzip.compress(data, 9, mtime=0)}
+
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+
+    # Keep a variant only where it actually saves bytes.
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data)}
+
+
+def source_files(static_folder, exclude):
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(
+            d for d in dirs if os.path.join(root, d) not in exclude
+        )
+
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            yield os.path.relpath(path, static_folder).replace(os.sep, '/'), path
+
+
+def build_assets(static_folder, exclude=(), clean=False):
+    """Write fingerprinted, precompressed copies of the static files.
+
+    Copies go to ``build/`` in the static folder, next to a manifest mapping
+    each source path to its copy and available encodings. Stylesheets are
+    done last so their url()s can point at fingerprinted images. Returns the
+    manifest.
+    """
+    build = os.path.join(static_folder, BUILD_DIR)
+    exclude = {os.path.abspath(path) for path in exclude} | {os.path.abspath(build)}
+    files = sorted(
+        source_files(os.path.abspath(static_folder), exclude),
+        key=lambda item: (item[0].endswith('.css'), item[0])
+    )
+    manifest = {}
+
+    for relpath, path in files:
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        if relpath.endswith('.css'):
+            data = rewrite_css(relpath, data, manifest)
+
+        hashed = fingerprint(relpath, data)
+        target = os.path.join(static_folder, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        encodings = {}
+
+        if os.path.splitext(relpath)[1].lower() in COMPRESSIBLE:
+            encodings = compress(data)
+
+        for encoding, body in [(None, data), *encodings.items()]:
+            output = target + SUFFIXES.get(encoding, '')
+
+            if not os.path.exists(output):
+                with open(output + '.tmp', 'wb') as f:
+                    f.write(body)
+
+                os.replace(output + '.tmp', output)
+
+        manifest[relpath] = {
+            'path': hashed,
+            'size': len(data),
+            'encodings': {encoding: len(body) for encoding, body in encodings.items()},
+        }
+
+    with open(os.path.join(build, MANIFEST + '.tmp'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    os.replace(os.path.join(build, MANIFEST + '.tmp'), os.path.join(build, MANIFEST))
+
+    if clean:
+        keep = {MANIFEST} | {
+            posixpath.relpath(entry['path'], BUILD_DIR) + suffix
+            for entry in manifest.values() for suffix in ['', *SUFFIXES.values()]
+        }
+
+        for relpath, path in list(source_files(build, ())):
+            if relpath not in keep:
+                os.unlink(path)
+
+    return manifest
+
+
+class Assets:
+    """Serve fingerprinted static files, precompressed and cached forever."""
+
+    def __init__(self, app):
+        self.app = app
+        self.max_age = app.config['ASSET_MAX_AGE']
+        self.load()
+
+    def load(self):
+        manifest = {}
+
+        if self.app.static_folder:
+            try:
+                with open(os.path.join(self.app.static_folder, BUILD_DIR, MANIFEST)) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+        self.paths = {source: entry['path'] for source, entry in manifest.items()}
+        self.encodings = {
+            entry['path']: [e for e in ('br', 'gzip') if e in entry['encodings']]
+            for entry in manifest.values()
+        }
+
+    def url_defaults(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.paths:
+            values['filename'] = self.paths[values['filename']]
+
+    def send_static_file(self, filename):
+        encodings = self.encodings.get(filename)
+
+        if encodings is None:
+            return current_app.send_static_file(filename)
+
+        encoding = next(
+            (e for e in encodings if request.accept_encodings[e] > 0), None
+        )
+        response = send_from_directory(
+            current_app.static_folder,
+            filename + SUFFIXES.get(encoding, ''),
+            mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+            max_age=self.max_age,
+        )
+
+        if encoding is not None:
+            response.content_encoding = encoding
+
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+def get_assets(app=None):
+    return (app or current_app).extensions['flaskr.assets']
+
+
+@click.command('build-assets')
+@click.option('--clean', is_flag=True, help='Remove build files no longer in the manifest.')
+@with_appcontext
+def build_assets_command(clean):
+    """Fingerprint and precompress the static files."""
+    static_folder = current_app.static_folder
+    # Uploads are user content, already named by their hash.
+    manifest = build_assets(
+        static_folder, exclude=[current_app.config['UPLOAD_FOLDER']], clean=clean
+    )
+
+    for source, entry in manifest.items():
+        sizes = ', '.join(f'{e} {n}' for e, n in entry['encodings'].items())
+        click.echo(f"{source} -> {entry['path']} ({entry['size']} bytes{', ' + sizes if sizes else ''})")
+
+    if brotli is None:
+        click.echo('brotli is not installed; only gzip variants were written.')
+
+    get_assets().load()
+    click.echo(f'Built {len(manifest)} assets.')
+
+
+def init_app(app):
+    assets = app.extensions['flaskr.assets'] = Assets(app)
+    app.url_defaults(assets.url_defaults)
+
+    if app.has_static_folder:
+        app.view_functions['static'] = assets.send_static_file
+
+    app.cli.add_command(build_assets_command)
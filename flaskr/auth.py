@@ -1,13 +1,66 @@
 import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
 from flask import (
-    Blueprint, flash, g, redirect, render_template, request, session, url_for
+    Blueprint, current_app, flash, g, has_request_context, redirect,
+    render_template, request, session, url_for
 )
-from werkzeug.security import check_password_hash, generate_password_hash
-from flaskr.db import get_db
+from flask.ctx import _AppCtxGlobals
+from flaskr.db import get_db, run_db
+from flaskr.hashing import get_hasher
+from flaskr.writer import get_writer
 
 bp = Blueprint('auth', __name__, url_prefix='/auth')
 
 
+class UserCache:
+    """Per-process LRU of the user columns templates need, with a TTL."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._users.get(user_id)
+
+            if entry is None or entry[0] < time.monotonic():
+                return None
+
+            self._users.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id, user):
+        with self._lock:
+            self._users[user_id] = (time.monotonic() + self.ttl, user)
+            self._users.move_to_end(user_id)
+
+            while len(self._users) > self.size:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+
+class AppGlobals(_AppCtxGlobals):
+    # g.user is only looked up the first time something reads it.
+    def __getattr__(self, name):
+        if name == 'user':
+            self.user = load_logged_in_user()
+            return self.user
+
+        return super().__getattr__(name)
+
+
+def invalidate_user(user_id):
+    current_app.extensions['flaskr.users'].invalidate(user_id)
+
+
 @bp.route('/register', methods=('GET', 'POST'))
 def register():
     if request.method == 'POST':
@@ -26,11 +79,15 @@ def register():
             error = f'User {username} is already registered.'
 
         if error is None:
-            db.execute(
-                'INSERT INTO user (username, password) VALUES (?, ?)',
-                (username, generate_password_hash(password))
-            )
-            db.commit()
+            pwhash = get_hasher().generate(password)
+
+            def insert():
+                get_db().execute(
+                    'INSERT INTO user (username, password) VALUES (?, ?)',
+                    (username, pwhash)
+                )
+
+            get_writer().write(insert)
             return redirect(url_for('auth.login'))
 
         flash(error)
@@ -51,12 +108,26 @@ def login():
 
         if user is None:
             error = 'Incorrect username.'
-        elif not check_password_hash(user['password'], password):
+        elif not get_hasher().check(user['password'], password):
             error = 'Incorrect password.'
 
         if error is None:
+            if get_hasher().needs_rehash(user['password']):
+                pwhash = get_hasher().generate(password)
+
+                def rehash():
+                    get_db().execute(
+                        'UPDATE user SET password = ? WHERE id = ?', (pwhash, user['id'])
+                    )
+
+                get_writer().write(rehash)
+                invalidate_user(user['id'])
+
             session.clear()
             session['user_id'] = user['id']
+
+            if current_app.config['AUTH_SESSION_USER']:
+                session['user'] = {'id': user['id'], 'username': user['username']}
             return redirect(url_for('index'))
 
         flash(error)
@@ -64,17 +135,39 @@ def login():
     return render_template('auth/login.html')
 
 
-@bp.before_app_request
 def load_logged_in_user():
+    if not has_request_context():
+        return None
+
     user_id = session.get('user_id')
 
     if user_id is None:
-        g.user = None
-    else:
-        g.user = get_db().execute(
-            'SELECT * FROM user WHERE id = ?', (user_id,)
+        return None
+
+    # The signed session snapshot is trusted on read-only requests; anything
+    # that changes data re-checks the user against the database.
+    snapshot = session.get('user')
+
+    if snapshot is not None and snapshot['id'] == user_id \
+            and request.method in ('GET', 'HEAD'):
+        return snapshot
+
+    cache = current_app.extensions['flaskr.users']
+    user = cache.get(user_id)
+
+    if user is None:
+        row = get_db().execute(
+            'SELECT id, username FROM user WHERE id = ?', (user_id,)
         ).fetchone()
 
+        if row is None:
+            return None
+
+        user = dict(row)
+        cache.set(user_id, user)
+
+    return user
+
 
 @bp.route('/logout')
 def logout():
@@ -83,6 +176,17 @@ def logout():
 
 
 def login_required(view):
+    if inspect.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapped_async_view(**kwargs):
+            # Loading g.user may query the database; keep that off the loop.
+            if await run_db(getattr, g, 'user') is None:
+                return redirect(url_for('auth.login'))
+
+            return await view(**kwargs)
+
+        return wrapped_async_view
+
     @functools.wraps(view)
     def wrapped_view(**kwargs):
         if g.user is None:
@@ -91,3 +195,11 @@ def login_required(view):
         return view(**kwargs)
 
     return wrapped_view
+
+
+def init_app(app):
+    app.app_ctx_globals_class = AppGlobals
+    app.extensions['flaskr.users'] = UserCache(
+        app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL']
+    )
+    app.register_blueprint(bp)
@@ -1,12 +1,23 @@
-import os
-import json
+import hashlib
 from datetime import datetime
 from flask import (
-    Blueprint, flash, g, redirect, render_template, request, url_for, jsonify, abort
+    Blueprint, current_app, flash, g, make_response, redirect,
+    render_template, request, session, url_for, jsonify, abort
 )
-from werkzeug.utils import secure_filename
+from werkzeug.http import is_resource_modified
 from flaskr.auth import login_required
-from flaskr.db import get_db
+from flaskr.cache import cached
+from flaskr.counters import counts_views
+from flaskr.db import get_db, run_db
+from flaskr.drafts import FIELDS, delete_draft, get_drafts
+from flaskr.excerpts import summarize
+from flaskr.offload import run_io
+from flaskr.related import schedule_update
+from flaskr.scheduler import is_due, seconds_until_next_publish
+from flaskr.signals import post_changed
+from flaskr.tags import get_tag_cloud, sync_post_tags
+from flaskr.uploads import UploadError, save_image
+from flaskr.writer import get_writer
 
 bp = Blueprint('blog', __name__, template_folder='templates')
 
@@ -16,22 +27,225 @@ def home():
     return render_template('base.html')
 
 
+def encode_cursor(post):
+    return f"{post['created']}_{post['id']}"
+
+
+def decode_cursor(cursor):
+    created, _, id = cursor.rpartition('_')
+
+    try:
+        return created, int(id)
+    except ValueError:
+        abort(400, f"Invalid cursor {cursor!r}.")
+
+
+# Listings show the precomputed excerpt and never load post bodies.
+PAGE_COLUMNS = 'p.id, title, excerpt, reading_time, summary, image, p.created, version, author_id, username'
+
+
+def page_query(direction=None, tag=False, category=False, columns=PAGE_COLUMNS):
+    """Build the SQL for one page of published posts, newest first.
+
+    ``direction`` is ``'before'`` or ``'after'`` a cursor, or None for the
+    first page. Tag pages walk post_tag's (tag_id, created, post_id) index
+    and category pages idx_post_category, so every variant is an index range
+    scan of at most per_page + 1 rows. ``columns`` must include p.id and
+    p.created, which the cursors are made of.
+    """
+    if tag:
+        source = 'post_tag t JOIN post p ON p.id = t.post_id'
+        key = 't.created, t.post_id'
+        where = 'AND t.tag_id = ? '
+    else:
+        source = 'post p'
+        key = 'p.created, p.id'
+        where = 'AND p.category = ? ' if category else ''
+
+    first, second = key.split(', ')
+    order = 'ASC' if direction == 'after' else 'DESC'
+
+    if direction is not None:
+        where += f"AND ({key}) {'>' if direction == 'after' else '<'} (?, ?) "
+
+    return (
+        f'SELECT {columns} '
+        f'FROM {source} JOIN user u ON p.author_id = u.id '
+        'WHERE p.published = 1 '
+        f'{where}'
+        f'ORDER BY {first} {order}, {second} {order} LIMIT ?'
+    )
+
+
+def popular_query(columns=PAGE_COLUMNS):
+    # The ranking is precomputed when view counts are flushed; this is a
+    # walk down idx_post_stats_score. CROSS JOIN keeps SQLite from starting
+    # at post instead and sorting every published post.
+    return (
+        f'SELECT {columns}, views, score FROM post_stats s '
+        'CROSS JOIN post p ON p.id = s.post_id JOIN user u ON p.author_id = u.id '
+        'WHERE p.published = 1 ORDER BY s.score DESC, s.post_id LIMIT ?'
+    )
+
+
+def related_query():
+    # Precomputed by flaskr.related; a range of idx_post_related_score.
+    return (
+        'SELECT p.id, title, version FROM post_related r CROSS JOIN post p ON p.id = r.related_id '
+        'WHERE r.post_id = ? AND p.published = 1 '
+        'ORDER BY r.score DESC, r.related_id LIMIT ?'
+    )
+
+
+def published_post_query(columns):
+    return (
+        f'SELECT {columns} FROM post p JOIN user u ON p.author_id = u.id '
+        'WHERE p.id = ? AND published = 1'
+    )
+
+
+def explain_queries():
+    # Queries built at run time, for flask db-explain.
+    for direction in (None, 'before', 'after'):
+        for filters in ({}, {'tag': True}, {'category': True}):
+            yield page_query(direction, **filters)
+
+    yield published_post_query('p.id, title, username')
+    yield popular_query()
+    yield related_query()
+
+
+def get_posts_page(before=None, after=None, per_page=None, tag_id=None, category=None,
+                   columns=PAGE_COLUMNS):
+    # Keyset pagination on (created, id): every page is an index range scan
+    # of at most per_page + 1 rows, however deep the reader has paged.
+    if per_page is None:
+        per_page = current_app.config['POSTS_PER_PAGE']
+
+    params = []
+
+    if tag_id is not None:
+        params.append(tag_id)
+    elif category is not None:
+        params.append(category)
+
+    direction = 'after' if after is not None else 'before' if before is not None else None
+    sql = page_query(
+        direction, tag=tag_id is not None, category=category is not None, columns=columns
+    )
+
+    if direction is not None:
+        params.extend(after if after is not None else before)
+
+    posts = get_db().execute(sql, (*params, per_page + 1)).fetchall()
+
+    if after is not None:
+        has_newer = len(posts) > per_page
+        posts = posts[:per_page][::-1]
+        has_older = True
+    else:
+        has_older = len(posts) > per_page
+        posts = posts[:per_page]
+        has_newer = before is not None
+
+    newer = encode_cursor(posts[0]) if posts and has_newer else None
+    older = encode_cursor(posts[-1]) if posts and has_older else None
+    return posts, newer, older
+
+
+def not_modified(etag, last_modified=None):
+    # Answer a conditional GET before anything is rendered.
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+
+    return add_validators(
+        current_app.response_class(status=304), etag, last_modified
+    )
+
+
+def add_validators(response, etag, last_modified=None):
+    response.set_etag(etag)
+
+    # Werkzeug turns a last_modified of None into the current time.
+    if last_modified is not None:
+        response.last_modified = last_modified
+
+    # Pages differ for logged-in readers, whose cookie is the only tell.
+    response.vary.add('Cookie')
+    return response
+
+
+def render_listing(title, **filters):
+    before = request.args.get('before')
+    after = request.args.get('after')
+    posts, newer, older = get_posts_page(
+        before=decode_cursor(before) if before else None,
+        after=decode_cursor(after) if after else None,
+        **filters
+    )
+    return render_posts(title, posts, newer, older)
+
+
+def render_posts(title, posts, newer=None, older=None, shown=None):
+    tag_cloud = get_tag_cloud()
+    # The page is exactly identified by the posts and versions on it, plus
+    # ``shown``: anything else on the page that changes without a new
+    # version. It gets no Last-Modified: a deleted or newly published post
+    # can change the page without any of its rows having been modified.
+    etag = hashlib.sha1(repr((
+        [(post['id'], post['version']) for post in posts],
+        newer, older, [tuple(tag) for tag in tag_cloud], session.get('user_id'), shown,
+    )).encode()).hexdigest()
+    response = not_modified(etag)
+
+    if response is None:
+        response = add_validators(make_response(render_template(
+            'blog/index.html', title=title, posts=posts, newer=newer,
+            older=older, tag_cloud=tag_cloud
+        )), etag)
+
+    return response
+
+
 @bp.route('/')
+@cached(timeout=seconds_until_next_publish)
 def index():
-    db = get_db()
-    posts = db.execute(
-        'SELECT p.id, title, summary, created, author_id, username '
-        'FROM post p JOIN user u ON p.author_id = u.id '
-        'WHERE publish_date IS NOT NULL AND publish_date <= ? ' 
-        'ORDER BY created DESC',
-        (datetime.now(),)
+    return render_listing('Latest Articles')
+
+
+@bp.route('/tag/<name>')
+@cached(timeout=seconds_until_next_publish)
+def tag(name):
+    tag = get_db().execute(
+        'SELECT id, name FROM tag WHERE name = ?', (name.lower(),)
+    ).fetchone()
+
+    if tag is None:
+        abort(404, f"Tag {name!r} doesn't exist.")
+
+    return render_listing(f"Posts tagged {tag['name']}", tag_id=tag['id'])
+
+
+@bp.route('/popular')
+@cached(timeout=lambda: current_app.config['VIEW_FLUSH_INTERVAL'])
+def popular():
+    posts = get_db().execute(
+        popular_query(), (current_app.config['POPULAR_SIZE'],)
     ).fetchall()
-    return render_template('blog/index.html', posts=posts)
+    return render_posts('Most read', posts, shown=[
+        (post['views'], post['score']) for post in posts
+    ])
+
+
+@bp.route('/category/<name>')
+@cached(timeout=seconds_until_next_publish)
+def category(name):
+    return render_listing(f'{name} articles', category=name)
 
 
 @bp.route('/create', methods=('GET', 'POST'))
 @login_required
-def create():
+async def create():
     if request.method == 'POST':
         title = request.form['title']
         body = request.form['body']
@@ -43,6 +257,7 @@ def create():
         seo_title = request.form.get('seo_title')
         seo_description = request.form.get('seo_description')
         seo_keywords = request.form.get('seo_keywords')
+        publish_datetime = datetime.now().replace(microsecond=0)
         error = None
 
         if not title:
@@ -54,70 +269,121 @@ def create():
                 publish_datetime = datetime.strptime(publish_date, '%Y-%m-%dT%H:%M')
             except ValueError:
                 error = 'Invalid date format for publish date. Use YYYY-MM-DDTHH:MM.'
-                flash(error)
-                return render_template('blog/create.html')
+
+        if error is None:
+            try:
+                image_url = await run_io(save_image, image)
+            except UploadError as e:
+                error = str(e)
+
+        if error is not None:
+            flash(error)
         else:
-            image_url = None
-            if image and image.filename != '':
-                uploads_dir = os.path.join(bp.root_path, 'static/uploads')
-                if not os.path.exists(uploads_dir):
-                    os.makedirs(uploads_dir)
-
-                filename = secure_filename(image.filename)
-                image_path = os.path.join(uploads_dir, filename)
-                image.save(image_path)
-                image_url = f'uploads/{filename}'
-
-            db = get_db()
-            db.execute(
-                'INSERT INTO post (title, body, summary, image, category, tags, publish_date, seo_title, seo_description, seo_keywords, author_id) '
-                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                (title,
-                 body,
-                 summary,
-                 image_url,
-                 category,
-                 tags,
-                 publish_datetime,
-                 seo_title,
-                 seo_description,
-                 seo_keywords,
-                 g.user['id']))
-            db.commit()
-            article_id = db.execute('SELECT last_insert_rowid()').fetchone()[0]
+            user_id = g.user['id']
+            stats = summarize(body)
+
+            # Runs on the writer thread, which commits it.
+            def insert():
+                db = get_db()
+                cursor = db.execute(
+                    'INSERT INTO post (title, body, summary, image, category, tags, publish_date, seo_title, seo_description, seo_keywords, excerpt, word_count, reading_time, published, author_id) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (title,
+                     body,
+                     summary,
+                     image_url,
+                     category,
+                     tags,
+                     publish_datetime,
+                     seo_title,
+                     seo_description,
+                     seo_keywords,
+                     stats['excerpt'],
+                     stats['word_count'],
+                     stats['reading_time'],
+                     is_due(publish_datetime),
+                     user_id))
+                sync_post_tags(db, cursor.lastrowid, tags)
+                delete_draft(user_id, 0)
+                return cursor.lastrowid
+
+            get_drafts().discard(user_id, 0)
+            article_id = await get_writer().write_async(insert)
+            await run_io(post_changed.send, current_app._get_current_object(), post_id=article_id)
             return redirect(url_for('blog.article', article_id=article_id))
 
     return render_template('blog/create.html')
 
 
-@bp.route('/autosave', methods=['POST'])
-def autosave():
+@bp.route('/autosave', methods=('GET', 'POST'))
+@login_required
+async def autosave():
+    # Drafts of new posts are stored under post_id 0.
+    post_id = request.values.get('post_id', 0, type=int)
+
+    if post_id:
+        await run_db(get_post, post_id)
+
+    drafts = get_drafts()
+
     try:
-        data = request.form.to_dict()
-        with open('draft.json', 'w') as f:
-            json.dump(data, f)
+        if request.method == 'GET':
+            draft = await run_db(drafts.load, g.user['id'], post_id)
+            return jsonify({'status': 'success', 'draft': draft})
+
+        data = {
+            name: request.form[name] for name in FIELDS if name in request.form
+        }
+        await run_io(drafts.save, g.user['id'], post_id, data)
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
 @bp.route('/article/<int:article_id>')
+@counts_views('article_id')
+@cached(post_arg='article_id')
 def article(article_id):
     db = get_db()
+    validators = db.execute(
+        'SELECT version FROM post WHERE id = ?', (article_id,)
+    ).fetchone()
+
+    if validators is None:
+        abort(404)
+
+    # Related posts change when other posts do, so they go into the ETag.
+    # For the same reason the page gets no Last-Modified: its list and the
+    # titles on it can change while this post's row keeps an old timestamp.
+    related = db.execute(
+        related_query(), (article_id, current_app.config['RELATED_POSTS'])
+    ).fetchall()
+    etag = '{}-{}-{}-{}'.format(
+        article_id, validators['version'], session.get('user_id', 0),
+        '.'.join(f"{post['id']}v{post['version']}" for post in related)
+    )
+    response = not_modified(etag)
+
+    if response is not None:
+        return response
+
     article = db.execute(
-        'SELECT id, title, body, summary, image, category, tags, publish_date, seo_title, seo_description, seo_keywords, created, author_id '
-        'FROM post WHERE id = ?', (article_id,)
+        'SELECT p.id, title, body, summary, image, category, tags, publish_date, seo_title, seo_description, seo_keywords, reading_time, created, author_id, username '
+        'FROM post p JOIN user u ON p.author_id = u.id WHERE p.id = ?', (article_id,)
     ).fetchone()
 
     if article is None:
         abort(404)
 
-    return render_template('blog/view.html', article=article)
+    return add_validators(
+        make_response(render_template('blog/view.html', post=article, related=related)),
+        etag
+    )
 
 
 def get_post(id, check_author=True):
     post = get_db().execute(
-        'SELECT p.id, title, body, created, author_id, username '
+        'SELECT p.id, title, body, summary, image, category, tags, publish_date, seo_title, seo_description, seo_keywords, created, author_id, username '
         'FROM post p JOIN user u ON p.author_id = u.id '
         'WHERE p.id = ?',
         (id,)
@@ -134,20 +400,23 @@ def get_post(id, check_author=True):
 
 @bp.route('/<int:id>/update', methods=('GET', 'POST'))
 @login_required
-def update(id):
-    post = get_post(id)
+async def update(id):
+    # Don't hold a connection while the client is still sending the form.
+    post = await run_db(get_post, id)
 
     if request.method == 'POST':
+        # update.html only edits some fields; keep the rest as they are.
         title = request.form['title']
         body = request.form['body']
-        summary = request.form.get('summary')
+        summary = request.form.get('summary', post['summary'])
         image = request.files.get('image')
-        category = request.form.get('category')
-        tags = request.form.get('tags')
+        category = request.form.get('category', post['category'])
+        tags = request.form.get('tags', post['tags'])
         publish_date = request.form.get('publish_date')
-        seo_title = request.form.get('seo_title')
-        seo_description = request.form.get('seo_description')
-        seo_keywords = request.form.get('seo_keywords')
+        seo_title = request.form.get('seo_title', post['seo_title'])
+        seo_description = request.form.get('seo_description', post['seo_description'])
+        seo_keywords = request.form.get('seo_keywords', post['seo_keywords'])
+        publish_datetime = post['publish_date']
         error = None
 
         if not title:
@@ -159,36 +428,47 @@ def update(id):
                 publish_datetime = datetime.strptime(publish_date, '%Y-%m-%dT%H:%M')
             except ValueError:
                 error = 'Invalid date format for publish date. Use YYYY-MM-DDTHH:MM.'
-                flash(error)
-                return render_template('blog/update.html', post=post)
+
+        if error is None:
+            try:
+                image_url = await run_io(save_image, image, default=post['image'])
+            except UploadError as e:
+                error = str(e)
+
+        if error is not None:
+            flash(error)
         else:
-            image_url = post['image']
-            if image and image.filename != '':
-                uploads_dir = os.path.join(bp.root_path, 'static/uploads')
-                if not os.path.exists(uploads_dir):
-                    os.makedirs(uploads_dir)
-
-                filename = secure_filename(image.filename)
-                image_path = os.path.join(uploads_dir, filename)
-                image.save(image_path)
-                image_url = f'uploads/{filename}'
-
-            db = get_db()
-            db.execute(
-                'UPDATE post SET title = ?, body = ?, summary = ?, image = ?, category = ?, tags = ?, publish_date = ?, seo_title = ?, seo_description = ?, seo_keywords = ?'
-                'WHERE id = ?',
-                (title,
-                 body,
-                 summary,
-                 image_url,
-                 category,
-                 tags,
-                 publish_datetime,
-                 seo_title,
-                 seo_description,
-                 seo_keywords,
-                 id))
-            db.commit()
+            user_id = g.user['id']
+            stats = summarize(body)
+
+            def write():
+                db = get_db()
+                db.execute(
+                    'UPDATE post SET title = ?, body = ?, summary = ?, image = ?, category = ?, tags = ?, publish_date = ?, seo_title = ?, seo_description = ?, seo_keywords = ?, '
+                    'excerpt = ?, word_count = ?, reading_time = ?, published = ?, '
+                    'updated = CURRENT_TIMESTAMP, version = version + 1 '
+                    'WHERE id = ?',
+                    (title,
+                     body,
+                     summary,
+                     image_url,
+                     category,
+                     tags,
+                     publish_datetime,
+                     seo_title,
+                     seo_description,
+                     seo_keywords,
+                     stats['excerpt'],
+                     stats['word_count'],
+                     stats['reading_time'],
+                     is_due(publish_datetime),
+                     id))
+                sync_post_tags(db, id, tags)
+                delete_draft(user_id, id)
+
+            get_drafts().discard(user_id, id)
+            await get_writer().write_async(write)
+            await run_io(post_changed.send, current_app._get_current_object(), post_id=id)
             return redirect(url_for('blog.article', article_id=id))
     return render_template('blog/update.html', post=post)
 
@@ -196,8 +476,21 @@ def update(id):
 @bp.route('/<int:id>/delete', methods=('POST',))
 @login_required
 def delete(id):
-    post = get_post(id)
-    db = get_db()
-    db.execute('DELETE FROM post WHERE id = ?', (id,))
-    db.commit()
+    get_post(id)
+
+    def remove():
+        db = get_db()
+        # The posts listing this one as related lose it when it's deleted.
+        listed_on = [row[0] for row in db.execute(
+            'SELECT post_id FROM post_related WHERE related_id = ?', (id,)
+        )]
+        db.execute('DELETE FROM draft WHERE post_id = ?', (id,))
+        sync_post_tags(db, id, None)
+        db.execute('DELETE FROM post WHERE id = ?', (id,))
+        return listed_on
+
+    for other in get_writer().write(remove):
+        schedule_update(other)
+
+    post_changed.send(current_app._get_current_object(), post_id=id)
     return redirect(url_for('blog.index'))
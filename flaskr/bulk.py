@@ -0,0 +1,273 @@
+import itertools
+import json
+import secrets
+import time
+from datetime import datetime, timezone
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flaskr.db import get_db
+from flaskr.excerpts import summarize
+from flaskr.hashing import get_hasher
+from flaskr.scheduler import is_due
+from flaskr.signals import post_changed
+from flaskr.tags import parse_tags
+
+COLUMNS = (
+    'title', 'body', 'summary', 'image', 'category', 'publish_date',
+    'seo_title', 'seo_description', 'seo_keywords', 'created', 'updated',
+)
+DATES = ('publish_date', 'created', 'updated')
+# created and updated are UTC, like CURRENT_TIMESTAMP. publish_date is local
+# time, like the editor's form and the scheduler's datetime.now().
+LOCAL_DATES = ('publish_date',)
+
+# Secondary indexes and triggers are dropped for the import and rebuilt once
+# at the end; maintaining them row by row is most of the cost of an insert.
+DEFERRED_TABLES = ('post', 'post_tag')
+
+
+def export_posts():
+    """Yield every post as a dict, reading one row at a time."""
+    posts = get_db().execute(
+        'SELECT p.*, username FROM post p JOIN user u ON p.author_id = u.id ORDER BY p.id'
+    )
+
+    for post in posts:
+        record = {'id': post['id'], 'author': post['username']}
+
+        for column in COLUMNS:
+            value = post[column]
+            record[column] = str(value) if isinstance(value, datetime) else value
+
+        record['tags'] = parse_tags(post['tags'])
+        yield record
+
+
+def parse_date(value, local=False):
+    # Stored naive; an offset is converted to UTC, or to local time.
+    if value is None:
+        return None
+
+    value = datetime.fromisoformat(value)
+
+    if value.tzinfo is not None:
+        value = value.astimezone(None if local else timezone.utc).replace(tzinfo=None)
+
+    return value
+
+
+class Importer:
+    """Insert posts in executemany batches inside one transaction."""
+
+    def __init__(self, db, batch_size=10000, create_authors=True):
+        self.db = db
+        self.batch_size = batch_size
+        self.create_authors = create_authors
+        self.authors = {}
+        self.tags = {}
+        self.touched_tags = set()
+        self.deferred = []
+        self.first_id = self.next_id = None
+        self.count = 0
+
+    def begin(self, defer=True):
+        db = self.db
+        db.commit()
+        db.execute('BEGIN IMMEDIATE')
+        # AUTOINCREMENT hands out max(sequence, max id) + 1; taking the ids
+        # ourselves lets post_tag rows be written without a lookup per post.
+        self.first_id = self.next_id = db.execute(
+            "SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'post'), 0), "
+            'COALESCE((SELECT MAX(id) FROM post), 0)) + 1'
+        ).fetchone()[0]
+
+        if defer:
+            placeholders = ', '.join('?' * len(DEFERRED_TABLES))
+            self.deferred = db.execute(
+                f'SELECT type, name, sql FROM sqlite_master '
+                f"WHERE type IN ('index', 'trigger') AND sql IS NOT NULL "
+                f'AND tbl_name IN ({placeholders})',
+                DEFERRED_TABLES
+            ).fetchall()
+
+            for type, name, _ in self.deferred:
+                db.execute(f'DROP {type.upper()} "{name}"')
+
+    def author_id(self, username):
+        if username not in self.authors:
+            row = self.db.execute(
+                'SELECT id FROM user WHERE username = ?', (username,)
+            ).fetchone()
+
+            if row is None:
+                if not self.create_authors:
+                    raise click.ClickException(f'Unknown author {username!r}.')
+
+                # Imported authors get a random password and have to set one
+                # before they can log in.
+                row = (self.db.execute(
+                    'INSERT INTO user (username, password) VALUES (?, ?)',
+                    (username, get_hasher().generate(secrets.token_urlsafe()))
+                ).lastrowid,)
+
+            self.authors[username] = row[0]
+
+        return self.authors[username]
+
+    def tag_ids(self, names):
+        missing = [name for name in names if name not in self.tags]
+
+        if missing:
+            self.db.executemany(
+                'INSERT OR IGNORE INTO tag (name) VALUES (?)', [(name,) for name in missing]
+            )
+            placeholders = ', '.join('?' * len(missing))
+            self.tags.update(self.db.execute(
+                f'SELECT name, id FROM tag WHERE name IN ({placeholders})', missing
+            ).fetchall())
+
+        return [self.tags[name] for name in names]
+
+    def add_batch(self, records):
+        posts, post_tags = [], []
+
+        for line, text in records:
+            try:
+                record = json.loads(text)
+                author_id = self.author_id(record['author'])
+                values = {column: record.get(column) for column in COLUMNS}
+
+                for column in DATES:
+                    values[column] = parse_date(values[column], local=column in LOCAL_DATES)
+
+                if not values['title'] or not values['body']:
+                    raise KeyError('title' if not values['title'] else 'body')
+
+                tags = record.get('tags') or ''
+
+                if isinstance(tags, (list, tuple)):
+                    tags = ', '.join(tags)
+                elif not isinstance(tags, str):
+                    raise TypeError(f'tags must be a string or a list, not {type(tags).__name__}')
+            except (KeyError, TypeError, AttributeError, ValueError) as e:
+                raise click.ClickException(f'Line {line}: invalid post ({e}).')
+
+            now = datetime.now(timezone.utc).replace(microsecond=0, tzinfo=None)
+            values['created'] = values['created'] or now
+            values['updated'] = values['updated'] or values['created']
+            tags = parse_tags(tags)
+            stats = summarize(values['body'])
+            post_id = self.next_id
+            self.next_id += 1
+            posts.append((post_id, author_id, ', '.join(tags) or None,
+                          stats['excerpt'], stats['word_count'], stats['reading_time'],
+                          is_due(values['publish_date']),
+                          *(values[column] for column in COLUMNS)))
+            tag_ids = self.tag_ids(tags)
+            self.touched_tags.update(tag_ids)
+            post_tags.extend((tag_id, post_id, values['created']) for tag_id in tag_ids)
+
+        self.db.executemany(
+            'INSERT INTO post (id, author_id, tags, excerpt, word_count, reading_time, '
+            f"published, {', '.join(COLUMNS)}) VALUES ({', '.join('?' * (len(COLUMNS) + 7))})",
+            posts
+        )
+        self.db.executemany(
+            'INSERT INTO post_tag (tag_id, post_id, created) VALUES (?, ?, ?)', post_tags
+        )
+        self.count += len(posts)
+
+    def finish(self):
+        db = self.db
+
+        for _, _, sql in self.deferred:
+            db.execute(sql)
+
+        if self.deferred:
+            # The search triggers were among the deferred ones.
+            db.execute(
+                'INSERT INTO post_fts (rowid, title, summary, body, tags, seo_keywords) '
+                'SELECT id, title, summary, body, tags, seo_keywords FROM post WHERE id >= ?',
+                (self.first_id,)
+            )
+
+        db.executemany(
+            'UPDATE tag SET post_count = (SELECT COUNT(*) FROM post_tag WHERE tag_id = ?) '
+            'WHERE id = ?',
+            [(tag_id, tag_id) for tag_id in self.touched_tags]
+        )
+        db.commit()
+
+
+def import_posts(lines, batch_size=10000, defer=True, create_authors=True):
+    """Import JSON Lines posts in a single transaction.
+
+    Yields the number of posts inserted after each batch. Nothing is kept if
+    any line is invalid.
+    """
+    db = get_db()
+    importer = Importer(db, batch_size, create_authors)
+    importer.begin(defer)
+
+    try:
+        records = ((n, line) for n, line in enumerate(lines, 1) if line.strip())
+
+        while True:
+            batch = list(itertools.islice(records, batch_size))
+
+            if not batch:
+                break
+
+            importer.add_batch(batch)
+            yield importer.count
+
+        importer.finish()
+    except BaseException:
+        db.rollback()
+        raise
+
+    post_changed.send(current_app._get_current_object(), post_id=None)
+
+
+@click.command('export-posts')
+@click.argument('output', type=click.File('w'), default='-')
+@with_appcontext
+def export_posts_command(output):
+    """Write all posts to OUTPUT (default stdout) as JSON Lines."""
+    start = time.perf_counter()
+    count = 0
+
+    for count, post in enumerate(export_posts(), 1):
+        output.write(json.dumps(post, ensure_ascii=False))
+        output.write('\n')
+
+    elapsed = time.perf_counter() - start
+    click.echo(f'Exported {count} posts ({count / elapsed:.0f} posts/s).', err=True)
+
+
+@click.command('import-posts')
+@click.argument('input', type=click.File('r'), default='-')
+@click.option('--batch-size', default=10000, show_default=True)
+@click.option('--defer-indexes/--keep-indexes', default=True, show_default=True,
+              help='Rebuild indexes once at the end instead of row by row.')
+@click.option('--create-authors/--no-create-authors', default=True, show_default=True,
+              help='Add users for unknown authors.')
+@with_appcontext
+def import_posts_command(input, batch_size, defer_indexes, create_authors):
+    """Import posts from INPUT (default stdin), as written by export-posts."""
+    start = time.perf_counter()
+    count = 0
+
+    for count in import_posts(input, batch_size, defer_indexes, create_authors):
+        elapsed = time.perf_counter() - start
+        click.echo(f'Imported {count} posts ({count / elapsed:.0f} posts/s)...', err=True)
+
+    elapsed = time.perf_counter() - start
+    click.echo(f'Imported {count} posts in {elapsed:.1f}s ({count / elapsed:.0f} posts/s).', err=True)
+
+
+def init_app(app):
+    app.cli.add_command(export_posts_command)
+    app.cli.add_command(import_posts_command)
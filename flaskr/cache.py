@@ -0,0 +1,312 @@
+import functools
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from flask import current_app, request, session
+from flaskr.signals import post_changed
+
+
+class LRUCache:
+    """In-process cache bounded by the total size of the stored bodies."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def generation(self):
+        return self._generation
+
+    def bump(self):
+        with self._lock:
+            self._generation += 1
+
+    def get(self, namespace, key):
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+
+            if entry is None:
+                return None
+
+            if entry[0] < time.time():
+                self._remove((namespace, key))
+                return None
+
+            self._entries.move_to_end((namespace, key))
+            return entry[1]
+
+    def set(self, namespace, key, value, timeout):
+        size = len(value['body'])
+
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._remove((namespace, key))
+            self._entries[(namespace, key)] = (time.time() + timeout, value, size)
+            self.size += size
+
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self, namespace):
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[0] == namespace]:
+                self._remove(entry_key)
+
+    def clear_group(self, group):
+        # Every namespace named '<group>:...'.
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[0].startswith(f'{group}:')]:
+                self._remove(entry_key)
+
+    def _remove(self, entry_key):
+        entry = self._entries.pop(entry_key, None)
+
+        if entry is not None:
+            self.size -= entry[2]
+
+
+class FileSystemCache:
+    """Cache shared by every worker that points at the same directory.
+
+    Each namespace is a directory so it can be dropped in one go, and the
+    namespaces of a group ('<group>:...') share a parent directory. Entries
+    are written to a temporary file and renamed into place. The generation
+    is a stamp file, so every worker sees it change.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.evictions = 0
+        self.stamp_path = os.path.join(path, 'stamp')
+        os.makedirs(path, exist_ok=True)
+
+    def generation(self):
+        try:
+            with open(self.stamp_path) as f:
+                return f.read()
+        except OSError:
+            return ''
+
+    def bump(self):
+        tmp = f'{self.stamp_path}.{uuid.uuid4().hex}'
+
+        with open(tmp, 'w') as f:
+            f.write(uuid.uuid4().hex)
+
+        os.replace(tmp, self.stamp_path)
+
+    def _namespace_path(self, namespace):
+        group, _, _ = namespace.rpartition(':')
+        return os.path.join(
+            self.path, group, hashlib.sha1(namespace.encode()).hexdigest()[:16]
+        )
+
+    def _entry_path(self, namespace, key):
+        return os.path.join(
+            self._namespace_path(namespace),
+            hashlib.sha1(key.encode()).hexdigest()
+        )
+
+    def get(self, namespace, key):
+        try:
+            with open(self._entry_path(namespace, key), 'rb') as f:
+                meta = json.loads(f.readline())
+
+                if meta['expires'] < time.time():
+                    return None
+
+                return dict(meta['value'], body=f.read())
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set(self, namespace, key, value, timeout):
+        path = self._entry_path(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        meta = {
+            'expires': time.time() + timeout,
+            'value': {k: v for k, v in value.items() if k != 'body'},
+        }
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(json.dumps(meta).encode() + b'\n')
+                f.write(value['body'])
+
+            os.replace(tmp, path)
+        except OSError:
+            current_app.logger.warning('Could not write cache entry %s', path)
+
+    def clear(self, namespace):
+        self._remove_dir(self._namespace_path(namespace))
+
+    def clear_group(self, group):
+        self._remove_dir(os.path.join(self.path, group))
+
+    def _remove_dir(self, path):
+        doomed = f'{path}.{os.getpid()}.{threading.get_ident()}.deleted'
+
+        try:
+            os.rename(path, doomed)
+        except OSError:
+            return
+
+        shutil.rmtree(doomed, ignore_errors=True)
+
+
+class NullCache:
+    evictions = 0
+
+    def generation(self):
+        return 0
+
+    def bump(self):
+        pass
+
+    def get(self, namespace, key):
+        return None
+
+    def set(self, namespace, key, value, timeout):
+        pass
+
+    def clear(self, namespace):
+        pass
+
+    def clear_group(self, group):
+        pass
+
+
+class ResponseCache:
+    def __init__(self, backend, default_timeout):
+        self.backend = backend
+        self.default_timeout = default_timeout
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.backend.evictions,
+        }
+
+    def invalidate_post(self, post_id):
+        # Bulk changes send post_id=None; they may have touched any post.
+        self.backend.bump()
+        self.backend.clear('listings')
+
+        if post_id is None:
+            self.backend.clear_group('post')
+        else:
+            self.backend.clear(f'post:{post_id}')
+
+    def invalidate_articles(self, post_ids):
+        # For changes shown only on the posts' own pages, such as their
+        # related posts.
+        self.backend.bump()
+
+        for post_id in post_ids:
+            self.backend.clear(f'post:{post_id}')
+
+    def serve(self, view, kwargs, timeout=None, post_arg=None):
+        # Only anonymous GETs are shared; logged-in pages carry per-user
+        # controls and flashed messages.
+        if request.method != 'GET' or session.get('user_id') is not None:
+            return view(**kwargs)
+
+        if post_arg is None:
+            namespace = 'listings'
+        else:
+            namespace = f'post:{kwargs[post_arg]}'
+
+        key = f'{request.endpoint}:anon:{request.full_path}'
+        entry = self.backend.get(namespace, key)
+
+        if entry is not None:
+            self.hits += 1
+            response = current_app.response_class(
+                entry['body'], status=entry['status'], headers=entry['headers']
+            )
+            response.headers['X-Cache'] = 'HIT'
+            return response.make_conditional(request)
+
+        self.misses += 1
+        generation = self.backend.generation()
+        response = current_app.make_response(view(**kwargs))
+        entry_timeout = self.default_timeout
+
+        if timeout is not None:
+            entry_timeout = min(entry_timeout, timeout())
+
+        # Don't store a page rendered from data invalidated in the meantime.
+        if response.status_code == 200 and not response.is_streamed \
+                and 'Set-Cookie' not in response.headers and entry_timeout > 0 \
+                and generation == self.backend.generation():
+            self.backend.set(namespace, key, {
+                'status': response.status_code,
+                'headers': list(response.headers.items()),
+                'body': response.get_data(),
+            }, entry_timeout)
+
+        response.headers['X-Cache'] = 'MISS'
+        return response
+
+
+def get_cache(app=None):
+    if app is None:
+        app = current_app
+
+    return app.extensions['flaskr.cache']
+
+
+def cached(timeout=None, post_arg=None):
+    """Cache the anonymous GET responses of a view.
+
+    Listing pages are dropped whenever any post changes. Views showing a
+    single post name the view argument holding its id in ``post_arg`` and
+    are dropped only when that post changes. ``timeout`` is an optional
+    callable giving the longest a freshly rendered page may be served.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped_view(**kwargs):
+            return get_cache().serve(view, kwargs, timeout, post_arg)
+
+        return wrapped_view
+
+    return decorator
+
+
+def _invalidate(app, post_id, **extra):
+    get_cache(app).invalidate_post(post_id)
+
+
+def init_app(app):
+    cache_type = app.config['CACHE_TYPE']
+
+    if cache_type == 'lru':
+        backend = LRUCache(app.config['CACHE_MAX_BYTES'])
+    elif cache_type == 'filesystem':
+        backend = FileSystemCache(
+            app.config['CACHE_DIR'] or os.path.join(app.instance_path, 'cache')
+        )
+    elif cache_type == 'null':
+        backend = NullCache()
+    else:
+        raise ValueError(f'Unknown CACHE_TYPE {cache_type!r}.')
+
+    app.extensions['flaskr.cache'] = ResponseCache(
+        backend, app.config['CACHE_DEFAULT_TIMEOUT']
+    )
+    post_changed.connect(_invalidate, sender=app)
@@ -0,0 +1,157 @@
+import atexit
+import functools
+import math
+import threading
+import time
+from collections import Counter
+
+from flask import current_app
+from flaskr.db import get_db
+from flaskr.writer import get_writer
+
+# Posts looked up per statement when flushing.
+CHUNK_SIZE = 500
+
+
+def decayed_weight(count, now, half_life):
+    # log(count * exp(now / tau)), with tau making a weight halve every
+    # half_life seconds relative to newer ones.
+    return math.log(count) + now * math.log(2) / half_life
+
+
+def logaddexp(a, b):
+    if a is None:
+        return b
+
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def record_views(counts, now, half_life):
+    """Add ``counts`` ({post_id: views}) to post_stats.
+
+    Runs inside a writer transaction. Views of posts deleted since are
+    dropped.
+    """
+    db = get_db()
+    ids = list(counts)
+
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start:start + CHUNK_SIZE]
+        placeholders = ', '.join('?' * len(chunk))
+        current = {
+            row['post_id']: (row['views'], row['score']) for row in db.execute(
+                f'SELECT post_id, views, score FROM post_stats WHERE post_id IN ({placeholders})',
+                chunk
+            )
+        }
+        rows = []
+
+        for post_id in chunk:
+            views, score = current.get(post_id, (0, None))
+            weight = decayed_weight(counts[post_id], now, half_life)
+            rows.append((views + counts[post_id], logaddexp(score, weight), post_id))
+
+        db.executemany(
+            'INSERT INTO post_stats (post_id, views, score) '
+            'SELECT id, ?, ? FROM post WHERE id = ? '
+            'ON CONFLICT (post_id) DO UPDATE '
+            'SET views = excluded.views, score = excluded.score',
+            rows
+        )
+
+
+class ViewCounter:
+    """Counts article views in memory and writes them out in batches.
+
+    Counting a view is a dict increment under a lock, so reading an article
+    never writes to the database. Every ``interval`` seconds a background
+    thread hands the counts to the writer as one transaction, which also
+    moves the viewed posts up the popularity ranking. Counts not yet
+    flushed are lost if the process dies without running its exit hooks.
+    """
+
+    def __init__(self, app, interval, half_life):
+        self.app = app
+        self.interval = interval
+        self.half_life = half_life
+        self._counts = Counter()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def add(self, post_id):
+        self._start()
+
+        with self._lock:
+            self._counts[post_id] += 1
+
+    def flush(self, at_exit=False):
+        """Write out the buffered counts; returns how many views were written."""
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+
+        if not counts:
+            return 0
+
+        try:
+            writer = get_writer(self.app)
+            write = writer.write_at_exit if at_exit else writer.write
+            write(record_views, counts, time.time(), self.half_life)
+        except BaseException:
+            with self._lock:
+                self._counts.update(counts)
+
+            raise
+
+        return sum(counts.values())
+
+    def _start(self):
+        if self._thread is not None:
+            return
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='flaskr-view-counter', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception('Flushing view counts failed')
+
+
+def get_view_counter(app=None):
+    return (app or current_app).extensions['flaskr.counters']
+
+
+def counts_views(arg):
+    """Count a view of the post whose id is the view argument ``arg``.
+
+    Goes outside @cached, so views served from the cache count too.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped_view(**kwargs):
+            response = current_app.make_response(view(**kwargs))
+
+            if response.status_code in (200, 304):
+                get_view_counter().add(kwargs[arg])
+
+            return response
+
+        return wrapped_view
+
+    return decorator
+
+
+def init_app(app):
+    counter = app.extensions['flaskr.counters'] = ViewCounter(
+        app, app.config['VIEW_FLUSH_INTERVAL'], app.config['POPULAR_HALF_LIFE']
+    )
+    atexit.register(counter.flush, at_exit=True)
@@ -1,20 +1,281 @@
+import contextvars
 import sqlite3
+import threading
+import time
+from collections import deque
+
 import click
 from flask import current_app, g
 from flask.cli import with_appcontext
+from flaskr.offload import get_offload
+
+_pool_lock = threading.Lock()
+
+# The connection of the run_db() call running in this context, if any.
+_call_db = contextvars.ContextVar('flaskr.db.call', default=None)
+
+
+class PooledConnection:
+    """A checked-out connection; closing it hands it back to the pool."""
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+
+        return self._connection
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    def __enter__(self):
+        return self.connection.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self.connection.__exit__(*exc_info)
+
+    def close(self):
+        connection, self._connection = self._connection, None
+
+        if connection is not None:
+            self._pool.release(connection)
+
+
+class ConnectionPool:
+    def __init__(self, database, size=5, timeout=30.0, max_age=3600.0,
+                 pragmas=None):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.pragmas = dict(pragmas or {})
+        self._idle = deque()
+        self._born = {}
+        self._open = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = dict.fromkeys(
+            ('checkouts', 'waits', 'creations', 'recycled', 'discarded'), 0
+        )
+
+    def connect(self):
+        connection = sqlite3.connect(
+            self.database,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+        )
+        connection.row_factory = sqlite3.Row
+
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+
+        return connection
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+
+        while True:
+            connection = self._checkout(deadline)
+
+            if connection is None:
+                try:
+                    connection = self.connect()
+                except BaseException:
+                    self._forget()
+                    raise
+
+                with self._cond:
+                    self._born[connection] = time.monotonic()
+                    self._stats['creations'] += 1
+            elif not self._healthy(connection):
+                self._discard(connection, 'discarded')
+                continue
+
+            return PooledConnection(self, connection)
+
+    def _checkout(self, deadline):
+        # Returns an idle connection, or None when the caller may open a new
+        # one. Waits while the pool is at capacity.
+        with self._cond:
+            self._stats['checkouts'] += 1
+            waited = False
+
+            while True:
+                while self._idle:
+                    connection = self._idle.pop()
+
+                    if time.monotonic() - self._born[connection] > self.max_age:
+                        self._close(connection)
+                        self._stats['recycled'] += 1
+                        continue
+
+                    return connection
+
+                if self._open < self.size:
+                    self._open += 1
+                    return None
+
+                if not waited:
+                    self._stats['waits'] += 1
+                    waited = True
+
+                remaining = deadline - time.monotonic()
+
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    raise sqlite3.OperationalError(
+                        'Timed out waiting for a database connection.'
+                    )
+
+    def _healthy(self, connection):
+        try:
+            connection.execute('SELECT 1').fetchone()
+        except sqlite3.Error:
+            return False
+
+        return True
+
+    def release(self, connection):
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except sqlite3.Error:
+            self._discard(connection, 'discarded')
+            return
+
+        with self._cond:
+            if self._closed:
+                self._close(connection)
+            else:
+                self._idle.append(connection)
+
+            self._cond.notify()
+
+    def _discard(self, connection, reason):
+        with self._cond:
+            self._close(connection)
+            self._stats[reason] += 1
+            self._cond.notify()
+
+    def _forget(self):
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    def _close(self, connection):
+        # Caller holds the lock.
+        self._born.pop(connection, None)
+        self._open -= 1
+
+        try:
+            connection.close()
+        except sqlite3.Error:
+            pass
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+
+            while self._idle:
+                self._close(self._idle.pop())
+
+    def stats(self):
+        with self._cond:
+            return dict(
+                self._stats,
+                size=self.size,
+                open=self._open,
+                idle=len(self._idle),
+                in_use=self._open - len(self._idle),
+            )
+
+
+def get_pool(app=None):
+    if app is None:
+        app = current_app._get_current_object()
+
+    pool = app.extensions.get('flaskr.db')
+
+    if pool is None:
+        with _pool_lock:
+            pool = app.extensions.get('flaskr.db')
+
+            if pool is None:
+                pool = app.extensions['flaskr.db'] = ConnectionPool(
+                    app.config['DATABASE'],
+                    size=app.config['DATABASE_POOL_SIZE'],
+                    timeout=app.config['DATABASE_POOL_TIMEOUT'],
+                    max_age=app.config['DATABASE_POOL_MAX_AGE'],
+                    pragmas=app.config['SQLITE_PRAGMAS'],
+                )
+
+    return pool
+
+
+def _instrument(db, app):
+    metrics = app.extensions.get('flaskr.metrics')
+
+    if metrics is not None:
+        db = metrics.wrap(db)
+
+    return db
+
+
+def _acquire():
+    return _instrument(get_pool().acquire(), current_app)
+
+
+def connect(app):
+    """Open a connection of its own, outside the pool.
+
+    For a long-lived thread that must never wait on a pooled connection.
+    The caller closes it.
+    """
+    return _instrument(get_pool(app).connect(), app)
+
+
+def use_db(db):
+    """Make get_db() return ``db`` in the current context."""
+    _call_db.set(db)
 
 
 def get_db():
+    db = _call_db.get()
+
+    if db is not None:
+        return db
+
     if 'db' not in g:
-        g.db = sqlite3.connect(
-            current_app.config['DATABASE'],
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
+        g.db = _acquire()
 
     return g.db
 
 
+def _call_with_db(func, args, kwargs):
+    # Runs in a copied context, so the connection is only seen by func.
+    db = _acquire()
+    _call_db.set(db)
+
+    try:
+        return func(*args, **kwargs)
+    finally:
+        db.close()
+
+
+async def run_db(func, *args, **kwargs):
+    """Call ``func`` on the database executor; the async get_db().
+
+    ``func`` uses get_db() as usual but gets a connection of its own, which
+    goes back to the pool (uncommitted work rolled back) as soon as it
+    returns. An async view therefore holds no connection while it awaits
+    anything else, such as a slow client's upload.
+    """
+    return await get_offload().run('db', _call_with_db, func, args, kwargs)
+
+
 def close_db(e=None):
     db = g.pop('db', None)
 
@@ -23,11 +284,16 @@ def close_db(e=None):
 
 
 def init_db():
+    from flaskr.migrate import stamp
+
     db = get_db()
 
     with current_app.open_resource('schema.sql') as f:
         db.executescript(f.read().decode('utf8'))
 
+    # schema.sql is the latest schema; no migration needs to run on it.
+    stamp(db)
+
 
 @click.command('init-db')
 @with_appcontext
@@ -36,6 +302,147 @@ def init_db_command():
     click.echo('Initialized the database.')
 
 
+def iter_post_batches(batch_size, process, columns='id', where='', params=()):
+    """Call ``process`` with the posts in id-ordered batches.
+
+    Each batch is read with ``SELECT columns FROM post WHERE id > ? where``
+    and committed in a transaction of its own, so backfills never hold the
+    write lock for long. Yields the number of posts done after each batch.
+    """
+    db = get_db()
+    last_id, total = 0, 0
+
+    while True:
+        posts = db.execute(
+            f'SELECT {columns} FROM post WHERE id > ? {where} ORDER BY id LIMIT ?',
+            (last_id, *params, batch_size)
+        ).fetchall()
+
+        if not posts:
+            break
+
+        process(posts)
+        db.commit()
+        last_id = posts[-1]['id']
+        total += len(posts)
+        yield total
+
+
+FTS_COLUMNS = 'title, summary, body, tags, seo_keywords'
+
+
+def rebuild_search_index(batch_size=1000):
+    # Build a new index beside post_fts in id-ordered batches, one
+    # transaction each, so the write lock is never held for long, then swap
+    # it in with one short transaction. Searches use the old index until
+    # then, and still do if the rebuild fails. Yields the running total
+    # after every batch.
+    db = get_db()
+    row = db.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'post_fts'"
+    ).fetchone()
+
+    if row is None:
+        raise click.ClickException(
+            'The search index does not exist; initialize the database first.'
+        )
+
+    db.execute('BEGIN IMMEDIATE')
+
+    try:
+        _drop_search_build(db)
+        db.execute(row['sql'].replace('post_fts', 'post_fts_build', 1))
+        # Writes to posts already copied are mirrored into the new index.
+        db.execute('CREATE TABLE post_fts_build_progress (last_id INTEGER NOT NULL)')
+        db.execute('INSERT INTO post_fts_build_progress VALUES (0)')
+        copied = '(SELECT last_id FROM post_fts_build_progress)'
+        db.execute(
+            f'CREATE TRIGGER post_fts_build_insert AFTER INSERT ON post '
+            f'WHEN new.id <= {copied} BEGIN '
+            f'INSERT INTO post_fts_build (rowid, {FTS_COLUMNS}) '
+            f'VALUES (new.id, new.title, new.summary, new.body, new.tags, new.seo_keywords); END'
+        )
+        db.execute(
+            f'CREATE TRIGGER post_fts_build_delete AFTER DELETE ON post '
+            f'WHEN old.id <= {copied} BEGIN '
+            f'INSERT INTO post_fts_build (post_fts_build, rowid, {FTS_COLUMNS}) '
+            f"VALUES ('delete', old.id, old.title, old.summary, old.body, old.tags, old.seo_keywords); END"
+        )
+        db.execute(
+            f'CREATE TRIGGER post_fts_build_update AFTER UPDATE OF {FTS_COLUMNS} ON post '
+            f'WHEN old.id <= {copied} BEGIN '
+            f'INSERT INTO post_fts_build (post_fts_build, rowid, {FTS_COLUMNS}) '
+            f"VALUES ('delete', old.id, old.title, old.summary, old.body, old.tags, old.seo_keywords); "
+            f'INSERT INTO post_fts_build (rowid, {FTS_COLUMNS}) '
+            f'VALUES (new.id, new.title, new.summary, new.body, new.tags, new.seo_keywords); END'
+        )
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+
+    def copy(posts):
+        db.execute(
+            f'INSERT INTO post_fts_build (rowid, {FTS_COLUMNS}) '
+            f'SELECT id, {FTS_COLUMNS} FROM post WHERE id >= ? AND id <= ?',
+            (posts[0]['id'], posts[-1]['id'])
+        )
+        db.execute('UPDATE post_fts_build_progress SET last_id = ?', (posts[-1]['id'],))
+
+    yield from iter_post_batches(batch_size, copy)
+
+    db.execute("INSERT INTO post_fts_build (post_fts_build) VALUES ('optimize')")
+    db.commit()
+
+    # The swap. The triggers name post_fts, so they are recreated after
+    # the rename rather than rewritten by it.
+    db.execute('BEGIN IMMEDIATE')
+
+    try:
+        _drop_search_build(db, index=False)
+        triggers = db.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND sql LIKE '%post_fts%'"
+        ).fetchall()
+
+        for name, _ in triggers:
+            db.execute(f'DROP TRIGGER "{name}"')
+
+        db.execute('DROP TABLE post_fts')
+        db.execute('ALTER TABLE post_fts_build RENAME TO post_fts')
+
+        for _, sql in triggers:
+            db.execute(sql)
+
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+
+
+def _drop_search_build(db, index=True):
+    # Remove what a rebuild adds beside post_fts, e.g. after one failed.
+    for name in ('insert', 'delete', 'update'):
+        db.execute(f'DROP TRIGGER IF EXISTS post_fts_build_{name}')
+
+    db.execute('DROP TABLE IF EXISTS post_fts_build_progress')
+
+    if index:
+        db.execute('DROP TABLE IF EXISTS post_fts_build')
+
+
+@click.command('rebuild-search-index')
+@click.option('--batch-size', default=1000, show_default=True)
+@with_appcontext
+def rebuild_search_index_command(batch_size):
+    total = 0
+
+    for total in rebuild_search_index(batch_size):
+        click.echo(f'Indexed {total} posts...')
+
+    click.echo(f'Rebuilt the search index ({total} posts).')
+
+
 def init_app(app):
     app.teardown_appcontext(close_db)
     app.cli.add_command(init_db_command)
+    app.cli.add_command(rebuild_search_index_command)
@@ -0,0 +1,156 @@
+import atexit
+import json
+import threading
+import time
+from flask import current_app
+from flaskr.db import get_db
+from flaskr.writer import get_writer
+
+# Form fields kept in a draft; anything else posted to autosave is ignored.
+FIELDS = (
+    'title', 'summary', 'body', 'category', 'tags', 'publish_date',
+    'seo_title', 'seo_description', 'seo_keywords',
+)
+
+
+# Both run inside a writer transaction and leave the commit to it.
+
+def write_draft(user_id, post_id, data):
+    get_db().execute(
+        'INSERT INTO draft (user_id, post_id, data, updated) '
+        'VALUES (?, ?, ?, CURRENT_TIMESTAMP) '
+        'ON CONFLICT (user_id, post_id) DO UPDATE '
+        'SET data = excluded.data, updated = excluded.updated',
+        (user_id, post_id, json.dumps(data))
+    )
+
+
+def delete_draft(user_id, post_id):
+    get_db().execute(
+        'DELETE FROM draft WHERE user_id = ? AND post_id = ?', (user_id, post_id)
+    )
+
+
+class DraftWriter:
+    """Debounces autosaves.
+
+    The first save for a draft is written straight away; saves arriving
+    within ``window`` seconds of the last write are held in memory and
+    collapse into a single write when the window ends. Reads see the held
+    version, so a restore never loses the latest keystrokes.
+    """
+
+    def __init__(self, app, window):
+        self.app = app
+        self.window = window
+        self.writes = 0
+        self.coalesced = 0
+        self._pending = {}
+        self._timers = {}
+        self._last_write = {}
+        self._lock = threading.Lock()
+
+    def save(self, user_id, post_id, data):
+        key = (user_id, post_id)
+
+        with self._lock:
+            now = time.monotonic()
+            last = self._last_write.get(key)
+
+            if key in self._timers or (last is not None and now - last < self.window):
+                if key in self._pending:
+                    self.coalesced += 1
+
+                self._pending[key] = data
+
+                if key not in self._timers:
+                    timer = threading.Timer(last + self.window - now, self._flush, (key,))
+                    timer.daemon = True
+                    self._timers[key] = timer
+                    timer.start()
+
+                return
+
+            self._last_write[key] = now
+            self._forget_idle(now)
+
+        get_writer(self.app).write(write_draft, user_id, post_id, data)
+        self.writes += 1
+
+    def _flush(self, key, at_exit=False):
+        # The held version stays readable until it is committed, and is
+        # kept if a newer save replaced it in the meantime.
+        with self._lock:
+            self._timers.pop(key, None)
+            data = self._pending.get(key)
+            self._last_write[key] = time.monotonic()
+
+        if data is None:
+            return
+
+        writer = get_writer(self.app)
+        write = writer.write_at_exit if at_exit else writer.write
+        write(write_draft, *key, data)
+
+        with self._lock:
+            if self._pending.get(key) is data:
+                del self._pending[key]
+
+        self.writes += 1
+
+    def _forget_idle(self, now):
+        # Caller holds the lock.
+        if len(self._last_write) > 1024:
+            for key, last in list(self._last_write.items()):
+                if now - last >= self.window:
+                    del self._last_write[key]
+
+    def load(self, user_id, post_id):
+        with self._lock:
+            data = self._pending.get((user_id, post_id))
+
+        if data is not None:
+            return data
+
+        row = get_db().execute(
+            'SELECT data FROM draft WHERE user_id = ? AND post_id = ?',
+            (user_id, post_id)
+        ).fetchone()
+        return json.loads(row['data']) if row is not None else None
+
+    def discard(self, user_id, post_id):
+        # Drops held saves; the stored draft is removed with delete_draft()
+        # in the same write that saves the post.
+        with self._lock:
+            timer = self._timers.pop((user_id, post_id), None)
+            self._pending.pop((user_id, post_id), None)
+
+        if timer is not None:
+            timer.cancel()
+
+    def flush(self):
+        with self._lock:
+            keys = list(self._timers)
+
+        for key in keys:
+            with self._lock:
+                timer = self._timers.get(key)
+
+            if timer is not None:
+                timer.cancel()
+                self._flush(key, at_exit=True)
+
+
+def get_drafts(app=None):
+    if app is None:
+        app = current_app
+
+    return app.extensions['flaskr.drafts']
+
+
+def init_app(app):
+    writer = app.extensions['flaskr.drafts'] = DraftWriter(
+        app, app.config['AUTOSAVE_WINDOW']
+    )
+    # Held drafts live on daemon timers; write them out before exiting.
+    atexit.register(writer.flush)
@@ -0,0 +1,88 @@
+import math
+from html.parser import HTMLParser
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flaskr.db import get_db, iter_post_batches
+
+
+class TextExtractor(HTMLParser):
+    # The readable text of a post body; script and style contents are not.
+    skip = ('script', 'style')
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.skip:
+            self.skipping += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.skip and self.skipping:
+            self.skipping -= 1
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.parts.append(data)
+
+
+def plain_text(html):
+    parser = TextExtractor()
+    # Block elements end without whitespace ("<p>a</p><p>b</p>"), so pad
+    # every tag with a space before the text is collapsed.
+    parser.feed((html or '').replace('<', ' <'))
+    parser.close()
+    return ' '.join(''.join(parser.parts).split())
+
+
+def summarize(body, length=None, words_per_minute=None):
+    """Return the excerpt, word count and reading time (minutes) of a body."""
+    config = current_app.config
+    length = length or config['EXCERPT_LENGTH']
+    words_per_minute = words_per_minute or config['WORDS_PER_MINUTE']
+    text = plain_text(body)
+    word_count = len(text.split())
+
+    if len(text) > length:
+        text = text[:length + 1].rsplit(' ', 1)[0].rstrip(' .,;:') + '…'
+
+    return {
+        'excerpt': text,
+        'word_count': word_count,
+        'reading_time': max(math.ceil(word_count / words_per_minute), 1),
+    }
+
+
+def backfill_excerpts(batch_size=1000, everything=False):
+    # Fill the summary columns; yields the number of posts updated so far.
+    def update(posts):
+        get_db().executemany(
+            'UPDATE post SET excerpt = :excerpt, word_count = :word_count, '
+            'reading_time = :reading_time WHERE id = :id',
+            [{'id': post['id'], **summarize(post['body'])} for post in posts]
+        )
+
+    return iter_post_batches(
+        batch_size, update, 'id, body', 'AND (? OR excerpt IS NULL)', (everything,)
+    )
+
+
+@click.command('backfill-excerpts')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--all', 'everything', is_flag=True,
+              help='Recompute every post, not only those without an excerpt.')
+@with_appcontext
+def backfill_excerpts_command(batch_size, everything):
+    total = 0
+
+    for total in backfill_excerpts(batch_size, everything):
+        click.echo(f'Summarized {total} posts...')
+
+    click.echo(f'Backfilled excerpts for {total} posts.')
+
+
+def init_app(app):
+    app.cli.add_command(backfill_excerpts_command)
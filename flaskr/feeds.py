@@ -0,0 +1,246 @@
+import glob
+import os
+import uuid
+from datetime import datetime
+from xml.sax.saxutils import escape, quoteattr
+
+from flask import (
+    Blueprint, abort, current_app, send_file, stream_with_context, url_for
+)
+from flaskr.db import get_db
+from flaskr.signals import post_changed
+from flaskr.tags import parse_tags
+
+bp = Blueprint('feeds', __name__)
+
+ATOM = 'application/atom+xml'
+XML = 'application/xml'
+
+
+class DocumentCache:
+    """Generated XML documents kept as files, shared by every worker.
+
+    A document is written to a temporary file while it streams to the first
+    client and moved into place when it completes. Changing a post replaces
+    the stamp file and removes the documents; a generation that started
+    before the stamp changed is thrown away instead of being stored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.stamp_path = os.path.join(path, 'stamp')
+
+    def _path(self, name):
+        return os.path.join(self.path, name)
+
+    def _stamp(self):
+        try:
+            with open(self.stamp_path) as f:
+                return f.read()
+        except OSError:
+            return ''
+
+    def get(self, name):
+        # Publishing a scheduled post sends post_changed like any other
+        # change, so a stored document is current until it is removed.
+        path = self._path(name)
+        return path if os.path.exists(path) else None
+
+    def store(self, name, chunks):
+        """Yield ``chunks`` while copying them into the cache."""
+        os.makedirs(self.path, exist_ok=True)
+        stamp = self._stamp()
+        tmp = self._path(f'.{name}.{uuid.uuid4().hex}')
+        complete = False
+
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+
+            complete = True
+        finally:
+            if complete and self._stamp() == stamp:
+                os.replace(tmp, self._path(name))
+            else:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+
+    def invalidate(self):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = f'{self.stamp_path}.{uuid.uuid4().hex}'
+
+        with open(tmp, 'w') as f:
+            f.write(uuid.uuid4().hex)
+
+        os.replace(tmp, self.stamp_path)
+
+        for path in glob.glob(self._path('*.xml')):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+def get_documents(app=None):
+    return (app or current_app).extensions['flaskr.feeds']
+
+
+def isoformat(value):
+    # Timestamps are stored as naive UTC.
+    return value.replace(microsecond=0).isoformat() + 'Z'
+
+
+def published_posts(columns, where='', params=()):
+    # Iterating the cursor steps through the rows one at a time, so a
+    # document of any size is built without loading every post.
+    return get_db().execute(
+        f'SELECT {columns} FROM post p JOIN user u ON p.author_id = u.id '
+        'WHERE published = 1 '
+        f'{where}',
+        params
+    )
+
+
+def generate_feed():
+    # The feed is bounded by FEED_SIZE, so its rows are fetched up front to
+    # find the feed's own <updated>.
+    posts = published_posts(
+        'p.id, title, summary, tags, seo_title, seo_description, seo_keywords, '
+        'p.created, updated, username',
+        'ORDER BY p.created DESC, p.id DESC LIMIT ?',
+        (current_app.config['FEED_SIZE'],)
+    ).fetchall()
+    home = escape(url_for('blog.index', _external=True))
+    updated = max((post['updated'] for post in posts), default=datetime(1970, 1, 1))
+    yield '<?xml version="1.0" encoding="utf-8"?>\n'
+    yield '<feed xmlns="http://www.w3.org/2005/Atom">\n'
+    yield f'<title>{escape(current_app.config["FEED_TITLE"])}</title>\n'
+    yield f'<id>{home}</id>\n'
+    yield f'<link href="{home}"/>\n'
+    yield f'<link rel="self" href="{escape(url_for("feeds.feed", _external=True))}"/>\n'
+    yield f'<updated>{isoformat(updated)}</updated>\n'
+
+    for post in posts:
+        url = escape(url_for('blog.article', article_id=post['id'], _external=True))
+        yield '<entry>\n'
+        yield f'<title>{escape(post["seo_title"] or post["title"])}</title>\n'
+        yield f'<id>{url}</id>\n'
+        yield f'<link href="{url}"/>\n'
+        yield f'<published>{isoformat(post["created"])}</published>\n'
+        yield f'<updated>{isoformat(post["updated"])}</updated>\n'
+        yield f'<author><name>{escape(post["username"])}</name></author>\n'
+
+        for term in parse_tags(post['tags']) + parse_tags(post['seo_keywords']):
+            yield f'<category term={quoteattr(term)}/>\n'
+
+        summary = post['seo_description'] or post['summary']
+
+        if summary:
+            yield f'<summary>{escape(summary)}</summary>\n'
+
+        yield '</entry>\n'
+
+    yield '</feed>\n'
+
+
+def generate_urlset(low=0, high=None):
+    # Published posts with ids in (low, high], streamed from the cursor.
+    yield '<?xml version="1.0" encoding="utf-8"?>\n'
+    yield '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+
+    if low == 0:
+        yield f'<url><loc>{escape(url_for("blog.index", _external=True))}</loc></url>\n'
+
+    if high is None:
+        posts = published_posts('p.id, updated', 'AND p.id > ? ORDER BY p.id', (low,))
+    else:
+        posts = published_posts(
+            'p.id, updated', 'AND p.id > ? AND p.id <= ? ORDER BY p.id', (low, high)
+        )
+
+    for post in posts:
+        url = escape(url_for('blog.article', article_id=post['id'], _external=True))
+        yield f'<url><loc>{url}</loc><lastmod>{isoformat(post["updated"])}</lastmod></url>\n'
+
+    yield '</urlset>\n'
+
+
+def generate_sitemap_index(shards):
+    yield '<?xml version="1.0" encoding="utf-8"?>\n'
+    yield '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+
+    for shard in range(1, shards + 1):
+        url = escape(url_for('feeds.sitemap_shard', shard=shard, _external=True))
+        yield f'<sitemap><loc>{url}</loc></sitemap>\n'
+
+    yield '</sitemapindex>\n'
+
+
+def ids_per_shard():
+    # One URL of the first shard is the home page.
+    return current_app.config['SITEMAP_MAX_URLS'] - 1
+
+
+def count_shards():
+    # Shards are fixed id ranges. Deleted posts leave gaps, so a shard can
+    # hold fewer than SITEMAP_MAX_URLS URLs but never more.
+    max_id = get_db().execute('SELECT MAX(id) FROM post').fetchone()[0] or 0
+    return max(-(-max_id // ids_per_shard()), 1)
+
+
+def serve(name, mimetype, generate):
+    documents = get_documents()
+    path = documents.get(name)
+
+    if path is not None:
+        return send_file(path, mimetype=mimetype)
+
+    return current_app.response_class(
+        stream_with_context(documents.store(name, generate())),
+        mimetype=mimetype,
+    )
+
+
+@bp.route('/feed.xml')
+def feed():
+    return serve('feed.xml', ATOM, generate_feed)
+
+
+@bp.route('/sitemap.xml')
+def sitemap():
+    shards = count_shards()
+
+    if shards == 1:
+        return serve('sitemap.xml', XML, generate_urlset)
+
+    return serve('sitemap.xml', XML, lambda: generate_sitemap_index(shards))
+
+
+@bp.route('/sitemap-<int:shard>.xml')
+def sitemap_shard(shard):
+    shards = count_shards()
+
+    if not 1 <= shard <= shards or shards == 1:
+        abort(404)
+
+    per_shard = ids_per_shard()
+    return serve(
+        f'sitemap-{shard}.xml', XML,
+        lambda: generate_urlset((shard - 1) * per_shard, shard * per_shard)
+    )
+
+
+def _invalidate(app, post_id, **extra):
+    get_documents(app).invalidate()
+
+
+def init_app(app):
+    app.extensions['flaskr.feeds'] = DocumentCache(
+        app.config['FEED_CACHE_DIR'] or os.path.join(app.instance_path, 'feeds')
+    )
+    post_changed.connect(_invalidate, app)
+    app.register_blueprint(bp)
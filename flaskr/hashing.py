@@ -0,0 +1,130 @@
+import atexit
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from flask import current_app
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+class PasswordHasher:
+    """Runs password hashing on a small process pool.
+
+    Hashing is deliberately slow, so it is kept off the request threads and
+    limited to ``workers`` hashes in flight plus ``queue_depth`` waiting.
+    Anything beyond that is turned away with a 503 straight away instead of
+    queueing behind a login burst.
+    """
+
+    def __init__(self, method, salt_length, workers=2, queue_depth=16,
+                 timeout=10.0):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + queue_depth)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._current_prefix = None
+        self._stats = dict.fromkeys(
+            ('calls', 'rejected', 'timeouts', 'wait_seconds', 'compute_seconds'), 0
+        )
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rejected'] += 1
+
+            raise ServiceUnavailable(
+                'Too many sign-ins at once, please try again.', retry_after=1
+            )
+
+        try:
+            start = time.perf_counter()
+
+            if self.workers:
+                future = self._get_executor().submit(_timed, func, *args)
+
+                try:
+                    result, compute = future.result(timeout=self.timeout)
+                except TimeoutError:
+                    with self._lock:
+                        self._stats['timeouts'] += 1
+
+                    raise ServiceUnavailable(
+                        'Sign-in is taking too long, please try again.',
+                        retry_after=1
+                    )
+            else:
+                result, compute = _timed(func, *args)
+
+            total = time.perf_counter() - start
+        finally:
+            self._slots.release()
+
+        with self._lock:
+            self._stats['calls'] += 1
+            self._stats['wait_seconds'] += max(total - compute, 0.0)
+            self._stats['compute_seconds'] += compute
+
+        return result
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+
+            return self._executor
+
+    def generate(self, password):
+        return self._run(
+            generate_password_hash, password, self.method, self.salt_length
+        )
+
+    def check(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        # Werkzeug expands the configured method with its current defaults,
+        # e.g. "scrypt" -> "scrypt:32768:8:1", so compare against a real hash.
+        if self._current_prefix is None:
+            self._current_prefix = self.generate('').split('$', 1)[0]
+
+        return pwhash.split('$', 1)[0] != self._current_prefix
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def get_hasher(app=None):
+    if app is None:
+        app = current_app
+
+    return app.extensions['flaskr.hashing']
+
+
+def init_app(app):
+    hasher = app.extensions['flaskr.hashing'] = PasswordHasher(
+        app.config['PASSWORD_HASH_METHOD'],
+        app.config['PASSWORD_HASH_SALT_LENGTH'],
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        queue_depth=app.config['PASSWORD_HASH_QUEUE_DEPTH'],
+        timeout=app.config['PASSWORD_HASH_TIMEOUT'],
+    )
+    atexit.register(hasher.shutdown)
@@ -0,0 +1,367 @@
+import bisect
+import cProfile
+import heapq
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from flask import (
+    Blueprint, before_render_template, current_app, g, has_request_context,
+    request, template_rendered
+)
+
+bp = Blueprint('metrics', __name__)
+
+SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNTS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=SECONDS, label=None):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.label = label
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, label_value=None):
+        with self._lock:
+            series = self._series.get(label_value)
+
+            if series is None:
+                series = self._series[label_value] = [[0] * len(self.buckets), 0, 0.0]
+
+            index = bisect.bisect_left(self.buckets, value)
+
+            if index < len(self.buckets):
+                series[0][index] += 1
+
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+
+        with self._lock:
+            series = sorted(self._series.items(), key=lambda item: str(item[0]))
+
+            for label_value, (counts, count, total) in series:
+                labels = '' if self.label is None else f'{self.label}="{escape(label_value)}",'
+                cumulative = 0
+
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+
+                lines.append(f'{self.name}_bucket{{{labels}le="+Inf"}} {count}')
+                plain = f'{{{labels.rstrip(",")}}}' if labels else ''
+                lines.append(f'{self.name}_count{plain} {count}')
+                lines.append(f'{self.name}_sum{plain} {total}')
+
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name, help, label=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, label_value=None, amount=1):
+        with self._lock:
+            self._values[label_value] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+
+        with self._lock:
+            for label_value, value in sorted(self._values.items(), key=lambda item: str(item[0])):
+                labels = '' if self.label is None else f'{{{self.label}="{escape(label_value)}"}}'
+                lines.append(f'{self.name}{labels} {value}')
+
+        return lines
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def normalize(sql):
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+class TimedCursor:
+    # Stepping through a SELECT's rows is part of the query's cost, so the
+    # fetches are timed too.
+    def __init__(self, cursor, metrics, sql, elapsed):
+        self._cursor = cursor
+        self._metrics = metrics
+        self._sql = sql
+        self._elapsed = elapsed
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self._timed(self._cursor.__next__)
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._timed(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._timed(self._cursor.fetchall)
+
+    def _timed(self, func, *args):
+        start = time.perf_counter()
+
+        try:
+            return func(*args)
+        finally:
+            duration = time.perf_counter() - start
+            self._metrics.record_fetch(self._sql, self._elapsed, duration)
+            self._elapsed += duration
+
+
+class InstrumentedConnection:
+    def __init__(self, connection, metrics):
+        self._connection = connection
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __enter__(self):
+        return self._connection.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self._connection.__exit__(*exc_info)
+
+    def execute(self, sql, parameters=()):
+        return self._timed(self._connection.execute, sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self._timed(self._connection.executemany, sql, parameters)
+
+    def executescript(self, script):
+        return self._timed(self._connection.executescript, script)
+
+    def _timed(self, func, sql, *args):
+        start = time.perf_counter()
+        cursor = func(sql, *args)
+        duration = time.perf_counter() - start
+        self._metrics.record_query(sql, duration)
+        return TimedCursor(cursor, self._metrics, sql, duration)
+
+
+class Metrics:
+    def __init__(self, app):
+        self.app = app
+        self.slow_query_seconds = app.config['SLOW_QUERY_SECONDS']
+        self.n_plus_one_threshold = app.config['N_PLUS_ONE_THRESHOLD']
+        self.profile_sample_rate = app.config['PROFILE_SAMPLE_RATE']
+        self.profile_keep = app.config['PROFILE_KEEP']
+        self.profile_dir = app.config['PROFILE_DIR'] or os.path.join(app.instance_path, 'profiles')
+        self.request_seconds = Histogram(
+            'flaskr_request_duration_seconds', 'Wall time per request.', label='endpoint')
+        self.request_db_seconds = Histogram(
+            'flaskr_request_db_seconds', 'Time spent in the database per request.', label='endpoint')
+        self.request_queries = Histogram(
+            'flaskr_request_queries', 'SQL statements executed per request.', COUNTS, label='endpoint')
+        self.render_seconds = Histogram(
+            'flaskr_template_render_seconds', 'Template render time.', label='template')
+        self.query_seconds = Histogram(
+            'flaskr_db_query_seconds', 'Time per SQL statement, including fetching rows.')
+        self.slow_queries = CounterMetric(
+            'flaskr_slow_queries_total', 'Statements slower than SLOW_QUERY_SECONDS.', label='endpoint')
+        self.n_plus_one = CounterMetric(
+            'flaskr_n_plus_one_total', 'Requests repeating one statement N_PLUS_ONE_THRESHOLD times or more.',
+            label='endpoint')
+        self._profiles = []
+        self._profile_lock = threading.Lock()
+
+    def wrap(self, connection):
+        return InstrumentedConnection(connection, self)
+
+    def _request_stats(self):
+        if has_request_context():
+            return g.get('_metrics')
+
+        return None
+
+    def record_query(self, sql, duration):
+        self.query_seconds.observe(duration)
+        stats = self._request_stats()
+
+        if stats is not None:
+            stats['db_seconds'] += duration
+            stats['queries'] += 1
+            statement = normalize(sql)
+            stats['statements'][statement] += 1
+
+            if stats['statements'][statement] == self.n_plus_one_threshold:
+                self.n_plus_one.inc(request.endpoint)
+                self.app.logger.warning(
+                    'Possible N+1 in %s: executed %d times: %s',
+                    request.endpoint, self.n_plus_one_threshold, statement
+                )
+
+        self._check_slow(sql, 0.0, duration)
+
+    def record_fetch(self, sql, elapsed, duration):
+        stats = self._request_stats()
+
+        if stats is not None:
+            stats['db_seconds'] += duration
+
+        self._check_slow(sql, elapsed, duration)
+
+    def _check_slow(self, sql, before, duration):
+        # Flag a statement once, when its running total crosses the limit.
+        if before < self.slow_query_seconds <= before + duration:
+            endpoint = request.endpoint if has_request_context() else None
+            self.slow_queries.inc(endpoint)
+            self.app.logger.warning(
+                'Slow query (%.1f ms) in %s: %s',
+                (before + duration) * 1000, endpoint, normalize(sql)
+            )
+
+    def before_request(self):
+        g._metrics = {
+            'start': time.perf_counter(),
+            'db_seconds': 0.0,
+            'queries': 0,
+            'statements': Counter(),
+            'renders': [],
+            'profiler': None,
+        }
+
+        if self.profile_sample_rate and random.random() < self.profile_sample_rate:
+            profiler = cProfile.Profile()
+
+            try:
+                profiler.enable()
+            except ValueError:  # Another profiler is active on this thread.
+                return
+
+            g._metrics['profiler'] = profiler
+
+    def teardown_request(self, exc=None):
+        stats = g.pop('_metrics', None)
+
+        if stats is None:
+            return
+
+        duration = time.perf_counter() - stats['start']
+        endpoint = request.endpoint or 'unknown'
+        self.request_seconds.observe(duration, endpoint)
+        self.request_db_seconds.observe(stats['db_seconds'], endpoint)
+        self.request_queries.observe(stats['queries'], endpoint)
+
+        if stats['profiler'] is not None:
+            stats['profiler'].disable()
+            self._keep_profile(stats['profiler'], duration, endpoint)
+
+    def _keep_profile(self, profiler, duration, endpoint):
+        # Keep the PROFILE_KEEP slowest sampled requests on disk.
+        with self._profile_lock:
+            if len(self._profiles) >= self.profile_keep and duration <= self._profiles[0][0]:
+                return
+
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(
+                self.profile_dir,
+                f'{duration * 1000:010.1f}ms-{endpoint}-{time.time_ns()}.prof'
+            )
+            profiler.dump_stats(path)
+            heapq.heappush(self._profiles, (duration, path))
+
+            if len(self._profiles) > self.profile_keep:
+                _, evicted = heapq.heappop(self._profiles)
+
+                try:
+                    os.unlink(evicted)
+                except OSError:
+                    pass
+
+    def template_started(self, sender, template, context, **extra):
+        stats = self._request_stats()
+
+        if stats is not None:
+            stats['renders'].append(time.perf_counter())
+
+    def template_finished(self, sender, template, context, **extra):
+        stats = self._request_stats()
+
+        if stats is not None and stats['renders']:
+            self.render_seconds.observe(
+                time.perf_counter() - stats['renders'].pop(), template.name
+            )
+
+    def render(self):
+        lines = []
+
+        for metric in (
+            self.request_seconds, self.request_db_seconds, self.request_queries,
+            self.render_seconds, self.query_seconds, self.slow_queries,
+            self.n_plus_one,
+        ):
+            lines.extend(metric.render())
+
+        writer = self.app.extensions.get('flaskr.writer')
+
+        if writer is not None:
+            lines.extend(writer.batch_size.render())
+            lines.extend(writer.queue_seconds.render())
+
+        for prefix, stats in collect_stats(self.app):
+            for key, value in stats.items():
+                name = f'flaskr_{prefix}_{key}'
+                lines.append(f'# TYPE {name} gauge')
+                lines.append(f'{name} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def collect_stats(app):
+    # The stats() of the app's other components, exported as gauges.
+    for prefix, name in (
+        ('db_pool', 'flaskr.db'),
+        ('cache', 'flaskr.cache'),
+        ('password_hash', 'flaskr.hashing'),
+        ('writer', 'flaskr.writer'),
+    ):
+        component = app.extensions.get(name)
+
+        if component is not None:
+            yield prefix, component.stats()
+
+
+@bp.route('/metrics')
+def metrics():
+    return current_app.response_class(
+        current_app.extensions['flaskr.metrics'].render(),
+        mimetype='text/plain; version=0.0.4',
+    )
+
+
+def init_app(app):
+    if not app.config['INSTRUMENTATION']:
+        return
+
+    instrumentation = app.extensions['flaskr.metrics'] = Metrics(app)
+    app.before_request(instrumentation.before_request)
+    app.teardown_request(instrumentation.teardown_request)
+    before_render_template.connect(instrumentation.template_started, app)
+    template_rendered.connect(instrumentation.template_finished, app)
+    app.register_blueprint(bp)
@@ -0,0 +1,227 @@
+import ast
+import importlib
+import inspect
+import os
+import re
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flaskr.db import get_db
+
+SCHEMA_VERSION = (
+    'CREATE TABLE IF NOT EXISTS schema_version ('
+    ' version INTEGER PRIMARY KEY,'
+    ' name TEXT NOT NULL,'
+    ' applied TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP'
+    ')'
+)
+
+EXPLAIN_MODULES = ('flaskr.blog', 'flaskr.auth')
+SCAN_FORBIDDEN = ('post', 'user')
+
+TABLE_REF = re.compile(
+    r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)'
+    r'(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|ON|ORDER|GROUP|LIMIT|LEFT|INNER|CROSS|SET|USING|VALUES|SELECT)\b)(\w+))?',
+    re.IGNORECASE
+)
+
+
+def get_migrations(app=None):
+    """List the (version, name, path) of every migration, oldest first."""
+    path = os.path.join((app or current_app).root_path, 'migrations')
+    migrations = []
+
+    for filename in os.listdir(path):
+        match = re.fullmatch(r'(\d+)_(\w+)\.sql', filename)
+
+        if match:
+            migrations.append((int(match[1]), match[2], os.path.join(path, filename)))
+
+    return sorted(migrations)
+
+
+def current_version(db):
+    tables = {
+        row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    }
+
+    if 'schema_version' in tables:
+        return db.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+    # Databases created before migrations existed have the original schema.
+    return 1 if 'post' in tables else 0
+
+
+def stamp(db, version=None):
+    # Record migrations up to version (default: all) as applied.
+    db.execute(SCHEMA_VERSION)
+    db.executemany(
+        'INSERT OR IGNORE INTO schema_version (version, name) VALUES (?, ?)',
+        [
+            (number, name) for number, name, _ in get_migrations()
+            if version is None or number <= version
+        ]
+    )
+    db.commit()
+
+
+def upgrade(target=None):
+    """Apply pending migrations, each in its own transaction.
+
+    Foreign keys are switched off while migrating so tables can be rebuilt,
+    and checked before each migration commits. Yields (version, name) as
+    each one is applied.
+    """
+    db = get_db()
+    db.commit()
+    version = current_version(db)
+
+    if version and db.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'schema_version'"
+    ).fetchone() is None:
+        stamp(db, version)
+
+    pending = [
+        migration for migration in get_migrations()
+        if migration[0] > version and (target is None or migration[0] <= target)
+    ]
+    foreign_keys = db.execute('PRAGMA foreign_keys').fetchone()[0]
+    db.execute('PRAGMA foreign_keys = OFF')
+
+    try:
+        for number, name, path in pending:
+            with open(path, encoding='utf8') as f:
+                script = f.read()
+
+            try:
+                db.executescript(f'BEGIN;\n{SCHEMA_VERSION};\n{script}')
+                violations = db.execute('PRAGMA foreign_key_check').fetchall()
+
+                if violations:
+                    raise click.ClickException(
+                        f'Migration {number} ({name}) leaves {len(violations)} '
+                        'foreign key violations.'
+                    )
+
+                db.execute(
+                    'INSERT INTO schema_version (version, name) VALUES (?, ?)',
+                    (number, name)
+                )
+                db.commit()
+            except BaseException:
+                db.rollback()
+                raise
+
+            yield number, name
+    finally:
+        db.execute(f'PRAGMA foreign_keys = {foreign_keys}')
+
+
+@click.command('db-upgrade')
+@click.option('--to', 'target', type=int, help='Stop at this version.')
+@with_appcontext
+def upgrade_command(target):
+    """Bring the database schema up to date."""
+    applied = 0
+
+    for number, name in upgrade(target):
+        click.echo(f'Applied {number:04d}_{name}.')
+        applied += 1
+
+    version = current_version(get_db())
+    click.echo(f'Database is at version {version} ({applied} migrations applied).')
+
+
+def module_queries(module):
+    """Yield (location, sql) for the queries a module runs.
+
+    String literals passed to execute() are found in the source. Queries
+    assembled at run time can be listed by an ``explain_queries()`` function
+    in the module; any other non-literal query is yielded with sql None.
+    """
+    filename = os.path.basename(inspect.getsourcefile(module))
+    calls = sorted(
+        (node for node in ast.walk(ast.parse(inspect.getsource(module)))
+         if isinstance(node, ast.Call)),
+        key=lambda node: node.lineno
+    )
+
+    for node in calls:
+        if (
+            isinstance(node.func, ast.Attribute)
+            and node.func.attr in ('execute', 'executemany')
+            and node.args
+        ):
+            sql = node.args[0]
+            location = f'{filename}:{node.lineno}'
+
+            if isinstance(sql, ast.Constant) and isinstance(sql.value, str):
+                yield location, sql.value
+            else:
+                yield location, None
+
+    for n, sql in enumerate(getattr(module, 'explain_queries', list)(), 1):
+        yield f'{filename}:explain_queries#{n}', sql
+
+
+def full_scans(db, sql):
+    """Return the plan steps of ``sql`` that scan all of post or user.
+
+    Walking an index in order ("SCAN p USING INDEX ...") is allowed: with a
+    LIMIT it stops early, and it never reads the whole table.
+    """
+    tables = {}
+
+    for table, alias in TABLE_REF.findall(sql):
+        tables[table] = table
+        tables[alias or table] = table
+
+    plan = db.execute(f'EXPLAIN QUERY PLAN {sql}', (None,) * sql.count('?')).fetchall()
+    scans = []
+
+    for row in plan:
+        match = re.fullmatch(r'SCAN (\w+)', row['detail'])
+
+        if match and tables.get(match[1], match[1]) in SCAN_FORBIDDEN:
+            scans.append(row['detail'])
+
+    return scans
+
+
+@click.command('db-explain')
+@click.option('--module', 'modules', multiple=True,
+              help=f"Modules to check (default: {', '.join(EXPLAIN_MODULES)}).")
+@click.option('--verbose', '-v', is_flag=True, help='Print every query plan.')
+@with_appcontext
+def explain_command(modules, verbose):
+    """Fail if a query does a full table scan of post or user."""
+    db = get_db()
+    failures = 0
+
+    for module_name in modules or EXPLAIN_MODULES:
+        module = importlib.import_module(module_name)
+
+        for location, sql in module_queries(module):
+            if sql is None:
+                click.echo(f'SKIP {location}: query is not a string literal')
+                continue
+
+            statement = ' '.join(sql.split())
+            scans = full_scans(db, sql)
+
+            if scans:
+                failures += 1
+                click.echo(f"FAIL {location}: {'; '.join(scans)}\n     {statement}")
+            elif verbose:
+                click.echo(f'ok   {location}: {statement}')
+
+    if failures:
+        raise click.ClickException(f'{failures} queries scan a whole table.')
+
+    click.echo('No full table scans.')
+
+
+def init_app(app):
+    app.cli.add_command(upgrade_command)
+    app.cli.add_command(explain_command)
@@ -0,0 +1,37 @@
+-- post.updated and post.version back the article ETag and Last-Modified.
+-- SQLite cannot add a column defaulting to CURRENT_TIMESTAMP, so the table
+-- is rebuilt; existing posts count as last updated when they were created.
+CREATE TABLE post_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    author_id INTEGER NOT NULL,
+    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    version INTEGER NOT NULL DEFAULT 1,
+    title TEXT NOT NULL,
+    body TEXT NOT NULL,
+    summary TEXT,
+    image TEXT,
+    category TEXT,
+    tags TEXT,
+    publish_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    seo_title TEXT,
+    seo_description TEXT,
+    seo_keywords TEXT,
+    FOREIGN KEY (author_id) REFERENCES user (id)
+);
+
+INSERT INTO post_new (
+    id, author_id, created, updated, title, body, summary, image, category,
+    tags, publish_date, seo_title, seo_description, seo_keywords
+)
+SELECT
+    id, author_id, created, created, title, body, summary, image, category,
+    tags, publish_date, seo_title, seo_description, seo_keywords
+FROM post;
+
+-- Keep ids of deleted posts from being handed out again.
+UPDATE sqlite_sequence SET seq = (SELECT seq FROM sqlite_sequence WHERE name = 'post')
+WHERE name = 'post_new';
+
+DROP TABLE post;
+ALTER TABLE post_new RENAME TO post;
@@ -0,0 +1,11 @@
+-- Serve the front page (published posts, newest first) from an index scan
+CREATE INDEX idx_post_created_published ON post (created, id, publish_date);
+
+-- Finding the next scheduled post, and posts gone live since a time
+CREATE INDEX idx_post_publish_date ON post (publish_date);
+
+-- A user's posts
+CREATE INDEX idx_post_author ON post (author_id);
+
+-- Category listings, newest first
+CREATE INDEX idx_post_category ON post (category, created, id, publish_date);
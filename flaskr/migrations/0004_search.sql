@@ -0,0 +1,32 @@
+-- Full-text search over posts, kept in sync with the post table by triggers
+CREATE VIRTUAL TABLE post_fts USING fts5(
+    title,
+    summary,
+    body,
+    tags,
+    seo_keywords,
+    content='post',
+    content_rowid='id',
+    tokenize='porter unicode61'
+);
+
+CREATE TRIGGER post_fts_insert AFTER INSERT ON post BEGIN
+    INSERT INTO post_fts (rowid, title, summary, body, tags, seo_keywords)
+    VALUES (new.id, new.title, new.summary, new.body, new.tags, new.seo_keywords);
+END;
+
+CREATE TRIGGER post_fts_delete AFTER DELETE ON post BEGIN
+    INSERT INTO post_fts (post_fts, rowid, title, summary, body, tags, seo_keywords)
+    VALUES ('delete', old.id, old.title, old.summary, old.body, old.tags, old.seo_keywords);
+END;
+
+CREATE TRIGGER post_fts_update AFTER UPDATE OF title, summary, body, tags, seo_keywords ON post BEGIN
+    INSERT INTO post_fts (post_fts, rowid, title, summary, body, tags, seo_keywords)
+    VALUES ('delete', old.id, old.title, old.summary, old.body, old.tags, old.seo_keywords);
+    INSERT INTO post_fts (rowid, title, summary, body, tags, seo_keywords)
+    VALUES (new.id, new.title, new.summary, new.body, new.tags, new.seo_keywords);
+END;
+
+-- Index the existing posts. On a large blog, running
+-- `flask rebuild-search-index` afterwards does the same in batches.
+INSERT INTO post_fts (post_fts) VALUES ('rebuild');
@@ -0,0 +1,11 @@
+-- Autosaved editor contents, one per user and post (post_id 0 for new posts)
+CREATE TABLE draft (
+    user_id INTEGER NOT NULL,
+    post_id INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL,
+    updated TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, post_id),
+    FOREIGN KEY (user_id) REFERENCES user (id)
+);
+
+CREATE INDEX idx_draft_post ON draft (post_id);
@@ -0,0 +1,29 @@
+-- Tags, normalized out of post.tags. Existing posts are tagged by running
+-- `flask backfill-tags` after upgrading.
+CREATE TABLE tag (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL,
+    post_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX idx_tag_cloud ON tag (post_count DESC, name);
+
+CREATE TABLE post_tag (
+    tag_id INTEGER NOT NULL,
+    post_id INTEGER NOT NULL,
+    created TIMESTAMP NOT NULL,
+    PRIMARY KEY (tag_id, post_id),
+    FOREIGN KEY (tag_id) REFERENCES tag (id),
+    FOREIGN KEY (post_id) REFERENCES post (id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE INDEX idx_post_tag_created ON post_tag (tag_id, created, post_id);
+CREATE INDEX idx_post_tag_post ON post_tag (post_id);
+
+CREATE TRIGGER post_tag_count_insert AFTER INSERT ON post_tag BEGIN
+    UPDATE tag SET post_count = post_count + 1 WHERE id = new.tag_id;
+END;
+
+CREATE TRIGGER post_tag_count_delete AFTER DELETE ON post_tag BEGIN
+    UPDATE tag SET post_count = post_count - 1 WHERE id = old.tag_id;
+END;
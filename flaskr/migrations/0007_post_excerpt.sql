@@ -0,0 +1,6 @@
+-- Plain-text excerpt and stats of body, computed when the post is saved so
+-- listings never load bodies. Fill them for existing posts with
+-- `flask backfill-excerpts`.
+ALTER TABLE post ADD COLUMN excerpt TEXT;
+ALTER TABLE post ADD COLUMN word_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE post ADD COLUMN reading_time INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,14 @@
+-- Listings filter on a published flag instead of comparing publish_date
+-- with the time of every request. Posts scheduled for later are flipped by
+-- the scheduler or `flask publish-due`.
+ALTER TABLE post ADD COLUMN published INTEGER NOT NULL DEFAULT 1;
+UPDATE post SET published = 0
+WHERE publish_date IS NULL OR publish_date > datetime('now', 'localtime');
+
+DROP INDEX idx_post_created_published;
+DROP INDEX idx_post_publish_date;
+DROP INDEX idx_post_category;
+
+CREATE INDEX idx_post_published_created ON post (published, created, id);
+CREATE INDEX idx_post_due ON post (published, publish_date);
+CREATE INDEX idx_post_category ON post (category, published, created, id);
@@ -0,0 +1,12 @@
+-- View counts, flushed in batches from each process's in-memory counters.
+-- score is the log of the views' forward-decayed weight: a view at time t
+-- adds exp(t / tau), so ordering by score ranks posts by recent popularity
+-- without ever rescoring posts that weren't viewed.
+CREATE TABLE post_stats (
+    post_id INTEGER PRIMARY KEY,
+    views INTEGER NOT NULL DEFAULT 0,
+    score REAL NOT NULL DEFAULT 0,
+    FOREIGN KEY (post_id) REFERENCES post (id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_post_stats_score ON post_stats (score DESC, post_id);
@@ -0,0 +1,26 @@
+-- Related posts. post_term holds each post's TF-IDF vector over its title,
+-- tags and body (scaled to unit length), indexed by term so the posts
+-- sharing terms with an edited one can be found without reading them all.
+-- post_related keeps each post's nearest neighbours by cosine similarity,
+-- so an article page reads its related posts with one index range scan.
+CREATE TABLE post_term (
+    term TEXT NOT NULL,
+    post_id INTEGER NOT NULL,
+    weight REAL NOT NULL,
+    PRIMARY KEY (term, post_id),
+    FOREIGN KEY (post_id) REFERENCES post (id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE INDEX idx_post_term_post ON post_term (post_id);
+
+CREATE TABLE post_related (
+    post_id INTEGER NOT NULL,
+    related_id INTEGER NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (post_id, related_id),
+    FOREIGN KEY (post_id) REFERENCES post (id) ON DELETE CASCADE,
+    FOREIGN KEY (related_id) REFERENCES post (id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE INDEX idx_post_related_score ON post_related (post_id, score DESC, related_id);
+CREATE INDEX idx_post_related_related ON post_related (related_id);
@@ -0,0 +1,43 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+
+class Offload:
+    """Bounded thread pools that async views hand their blocking calls to.
+
+    ``db`` has one thread per pooled connection, so queued calls wait for a
+    thread instead of holding one while they wait for a connection. ``io``
+    takes file writes. Calls run in a copy of the caller's context, so the
+    app and request contexts are available to them.
+    """
+
+    def __init__(self, db_workers, io_workers):
+        self.executors = {
+            'db': ThreadPoolExecutor(db_workers, thread_name_prefix='flaskr-db'),
+            'io': ThreadPoolExecutor(io_workers, thread_name_prefix='flaskr-io'),
+        }
+
+    async def run(self, name, func, *args, **kwargs):
+        call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self.executors[name], call)
+
+    def shutdown(self):
+        for executor in self.executors.values():
+            executor.shutdown()
+
+
+def get_offload(app=None):
+    return (app or current_app).extensions['flaskr.offload']
+
+
+async def run_io(func, *args, **kwargs):
+    return await get_offload().run('io', func, *args, **kwargs)
+
+
+def init_app(app):
+    app.extensions['flaskr.offload'] = Offload(
+        app.config['DATABASE_POOL_SIZE'], app.config['ASYNC_IO_WORKERS']
+    )
@@ -0,0 +1,362 @@
+import math
+import re
+from collections import Counter
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flaskr.cache import get_cache
+from flaskr.db import get_db
+from flaskr.excerpts import plain_text
+from flaskr.signals import post_changed
+from flaskr.tasks import get_tasks
+from flaskr.writer import get_writer
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; without it no related posts are computed.
+    np = None
+
+# Terms or posts looked up per statement.
+CHUNK_SIZE = 500
+
+WORD_RE = re.compile(r'[^\W\d_]{2,}')
+
+# A word in the title counts three times, one in the tags twice.
+FIELD_WEIGHTS = (('title', 3), ('tags', 2), ('body', 1))
+
+STOPWORDS = frozenset('''
+    about after all also an and any are as at be been but by can could do
+    does for from had has have he her his how if in into is it its just
+    more most my no not of on one or our out she so some than that the
+    their them then there these they this to up us was we were what when
+    which who will with would you your
+'''.split())
+
+
+def term_counts(post):
+    """Weighted counts of the words in a post's title, tags and body."""
+    counts = Counter()
+
+    for field, weight in FIELD_WEIGHTS:
+        text = plain_text(post[field]) if field == 'body' else post[field] or ''
+
+        for word in WORD_RE.findall(text.lower()):
+            if word not in STOPWORDS:
+                counts[word] += weight
+
+    return counts
+
+
+def weigh(counts, df, total):
+    """TF-IDF vector ({term: weight}) of ``counts``, scaled to unit length.
+
+    ``df`` maps terms to the number of the ``total`` posts containing them.
+    """
+    vector = {
+        term: (1 + math.log(count)) * (math.log((1 + total) / (1 + df[term])) + 1)
+        for term, count in counts.items()
+    }
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {term: weight / norm for term, weight in vector.items()}
+
+
+def chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class TermMatrix:
+    """Post vectors as a sparse matrix, for scoring a batch of posts at once.
+
+    The rows are held both by post (CSR) and by term (postings). A batch's
+    dot products are gathered from the postings of the batch's terms and
+    summed per pair of posts, so a batch costs time and memory in
+    proportion to the postings it touches, not to the size of the corpus.
+    Terms in more than ``max_df`` of the posts are left out of the
+    products: they carry almost no weight, and their postings would be
+    most of the work.
+    """
+
+    def __init__(self, vectors, max_df):
+        vocabulary = {}
+        lengths = np.fromiter(map(len, vectors), np.int64, len(vectors))
+        self.size = len(vectors)
+        self.row_ptr = np.concatenate(([0], np.cumsum(lengths)))
+        self.cols = np.fromiter(
+            (vocabulary.setdefault(term, len(vocabulary)) for vector in vectors for term in vector),
+            np.int64, self.row_ptr[-1]
+        )
+        self.vals = np.fromiter(
+            (weight for vector in vectors for weight in vector.values()),
+            np.float64, self.row_ptr[-1]
+        )
+        order = np.argsort(self.cols, kind='stable')
+        self.posting_rows = np.repeat(np.arange(self.size), lengths)[order]
+        self.posting_vals = self.vals[order]
+        df = np.bincount(self.cols, minlength=len(vocabulary))
+        self.posting_ptr = np.concatenate(([0], np.cumsum(df)))
+        # A term of a single post only ever matches that post.
+        self.posting_len = np.where((df > 1) & (df <= max_df * self.size), df, 0)
+
+    def scores(self, start, stop):
+        """Dot products of rows start:stop with the rows sharing a term.
+
+        Returns three arrays: the batch row (counted from ``start``), the
+        other row and their score, for every pair with a product.
+        """
+        lo, hi = self.row_ptr[start], self.row_ptr[stop]
+        cols = self.cols[lo:hi]
+        lengths = self.posting_len[cols]
+        ends = np.cumsum(lengths)
+        positions = np.arange(ends[-1] if len(ends) else 0) + np.repeat(
+            self.posting_ptr[cols] - (ends - lengths), lengths
+        )
+        rows = np.repeat(
+            np.repeat(np.arange(stop - start), np.diff(self.row_ptr[start:stop + 1])), lengths
+        )
+        products = np.repeat(self.vals[lo:hi], lengths) * self.posting_vals[positions]
+        pairs, inverse = np.unique(
+            rows * self.size + self.posting_rows[positions], return_inverse=True
+        )
+        return pairs // self.size, pairs % self.size, np.bincount(
+            inverse, weights=products, minlength=len(pairs)
+        )
+
+    def nearest(self, start, stop, k, min_score):
+        """The ``k`` best (row, score) pairs of each row start:stop, best first."""
+        rows, others, scores = self.scores(start, stop)
+        keep = (others != rows + start) & (scores >= min_score)
+        rows, others, scores = rows[keep], others[keep], scores[keep]
+        # By batch row, then best first; ties go to the lower row.
+        order = np.lexsort((others, -scores, rows))
+        rows, others, scores = rows[order], others[order], scores[order]
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        nearest = [[] for _ in range(start, stop)]
+
+        for row, other, score in zip(*(array[rank < k].tolist() for array in (rows, others, scores))):
+            nearest[row].append((other, score))
+
+        return nearest
+
+
+def save(vectors, lists):
+    """Replace stored vectors ({post_id: vector}) and related lists
+    ({post_id: [(related_id, score)]}).
+
+    Doesn't commit. Rows for posts deleted since they were read are skipped.
+    """
+    db = get_db()
+
+    for chunk in chunks(vectors):
+        db.execute(
+            f"DELETE FROM post_term WHERE post_id IN ({', '.join('?' * len(chunk))})", chunk
+        )
+
+    db.executemany(
+        'INSERT INTO post_term (term, post_id, weight) SELECT ?, id, ? FROM post WHERE id = ?',
+        [(term, weight, post_id)
+         for post_id, vector in vectors.items() for term, weight in vector.items()]
+    )
+
+    for chunk in chunks(lists):
+        db.execute(
+            f"DELETE FROM post_related WHERE post_id IN ({', '.join('?' * len(chunk))})", chunk
+        )
+
+    db.executemany(
+        'INSERT INTO post_related (post_id, related_id, score) '
+        'SELECT p.id, r.id, ? FROM post p, post r WHERE p.id = ? AND r.id = ?',
+        [(score, post_id, related_id)
+         for post_id, related in lists.items() for related_id, score in related]
+    )
+
+
+def build_related(batch_size=128):
+    """Recompute every post's vector and related posts.
+
+    Scores ``batch_size`` posts against all the others at a time, each batch
+    written in its own transaction. Yields the number of posts done so far.
+    """
+    db = get_db()
+    config = current_app.config
+    ids, counts = [], []
+
+    for post in db.execute('SELECT id, title, tags, body FROM post ORDER BY id'):
+        ids.append(post['id'])
+        counts.append(term_counts(post))
+
+    df = Counter(term for terms in counts for term in terms)
+    vectors = [weigh(terms, df, len(ids)) for terms in counts]
+    matrix = TermMatrix(vectors, config['RELATED_MAX_DF'])
+
+    for start in range(0, len(ids), batch_size):
+        stop = min(start + batch_size, len(ids))
+        nearest = matrix.nearest(start, stop, config['RELATED_POSTS'], config['RELATED_MIN_SCORE'])
+        save(
+            dict(zip(ids[start:stop], vectors[start:stop])),
+            {ids[row]: [(ids[other], score) for other, score in related]
+             for row, related in zip(range(start, stop), nearest)}
+        )
+        db.commit()
+        yield stop
+
+
+def document_frequencies(db, terms, exclude):
+    # How many stored posts other than ``exclude`` contain each term.
+    df = Counter()
+
+    for chunk in chunks(terms):
+        df.update(dict(db.execute(
+            f"SELECT term, COUNT(*) FROM post_term WHERE term IN ({', '.join('?' * len(chunk))}) "
+            'AND post_id != ? GROUP BY term',
+            (*chunk, exclude)
+        ).fetchall()))
+
+    return df
+
+
+def similarities(db, vector, post_id, max_df, total):
+    """Scores of the stored posts sharing a term with ``vector``.
+
+    Returns arrays of post ids and their dot products with ``vector``.
+    """
+    df = document_frequencies(db, vector, post_id)
+    terms = [term for term in vector if df[term] + 1 <= max_df * total]
+    weights = np.array([vector[term] for term in terms])
+    index = {term: n for n, term in enumerate(terms)}
+    post_ids, products = [np.empty(0, np.int64)], [np.empty(0)]
+
+    for chunk in chunks(terms):
+        rows = db.execute(
+            'SELECT term, post_id, weight FROM post_term '
+            f"WHERE term IN ({', '.join('?' * len(chunk))}) AND post_id != ?",
+            (*chunk, post_id)
+        ).fetchall()
+        post_ids.append(np.fromiter((row[1] for row in rows), np.int64, len(rows)))
+        products.append(
+            weights[np.fromiter((index[row[0]] for row in rows), np.int64, len(rows))]
+            * np.fromiter((row[2] for row in rows), np.float64, len(rows))
+        )
+
+    ids, inverse = np.unique(np.concatenate(post_ids), return_inverse=True)
+    return ids, np.bincount(inverse, weights=np.concatenate(products), minlength=len(ids))
+
+
+def best(ids, scores, k, min_score):
+    keep = scores >= min_score
+    ids, scores = ids[keep], scores[keep]
+    return [(int(ids[n]), float(scores[n])) for n in np.lexsort((ids, -scores))[:k]]
+
+
+def update_related(post_id):
+    """Reindex one post and refresh the related lists it changes.
+
+    Scores the post against the stored posts that share a term with it,
+    then updates the lists it enters, moves within or leaves. A list only
+    needs rescoring when the post drops out of it, as whatever takes its
+    place isn't known. Other posts keep the weights they were indexed
+    with; ``flask build-related`` brings them all up to date.
+    """
+    db = get_db()
+    config = current_app.config
+    k, min_score, max_df = (
+        config['RELATED_POSTS'], config['RELATED_MIN_SCORE'], config['RELATED_MAX_DF']
+    )
+    post = db.execute(
+        'SELECT id, title, tags, body FROM post WHERE id = ?', (post_id,)
+    ).fetchone()
+
+    if post is None:
+        return
+
+    total = db.execute('SELECT COUNT(*) FROM post').fetchone()[0]
+    counts = term_counts(post)
+    df = document_frequencies(db, counts, post_id)
+    vector = weigh(counts, {term: df[term] + 1 for term in counts}, total)
+    ids, scores = similarities(db, vector, post_id, max_df, total)
+    lists = {post_id: best(ids, scores, k, min_score)}
+    new_scores = dict(zip(ids.tolist(), scores.tolist()))
+
+    # Lists the post is on, and the posts it is now close enough to.
+    affected = {row[0] for row in db.execute(
+        'SELECT post_id FROM post_related WHERE related_id = ?', (post_id,)
+    )} | set(ids[scores >= min_score].tolist())
+    current = {}
+
+    for chunk in chunks(affected):
+        for row in db.execute(
+            'SELECT post_id, related_id, score FROM post_related '
+            f"WHERE post_id IN ({', '.join('?' * len(chunk))})", chunk
+        ):
+            current.setdefault(row['post_id'], {})[row['related_id']] = row['score']
+
+    for other in sorted(affected):
+        related = current.get(other, {})
+        score = new_scores.get(other, 0.0)
+        previous = related.pop(post_id, None)
+
+        if previous is not None and len(related) + 1 >= k \
+                and score < max(min_score, min(related.values(), default=min_score)):
+            # It may have been overtaken by a post that isn't on the list.
+            stored = dict(db.execute(
+                'SELECT term, weight FROM post_term WHERE post_id = ?', (other,)
+            ).fetchall())
+            other_ids, other_scores = similarities(db, stored, other, max_df, total)
+            # The post's own rows are still its old vector.
+            keep = other_ids != post_id
+            lists[other] = best(
+                np.append(other_ids[keep], post_id), np.append(other_scores[keep], score),
+                k, min_score
+            )
+            continue
+
+        if score >= min_score:
+            related[post_id] = score
+        elif previous is None:
+            continue
+
+        ranked = sorted(related.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+        if previous is not None or post_id in dict(ranked):
+            lists[other] = ranked
+
+    get_writer().write(save, {post_id: vector}, lists)
+    get_cache().invalidate_articles(lists)
+    return lists
+
+
+@click.command('build-related')
+@click.option('--batch-size', default=128, show_default=True,
+              help='Posts scored against the rest at a time.')
+@with_appcontext
+def build_related_command(batch_size):
+    """Recompute the related posts of every post."""
+    if np is None:
+        raise click.ClickException('Related posts need NumPy.')
+
+    total = 0
+
+    for total in build_related(batch_size):
+        click.echo(f'Indexed {total} posts...')
+
+    click.echo(f'Built related posts for {total} posts.')
+
+
+def schedule_update(post_id, app=None):
+    """Run update_related for ``post_id`` in the background."""
+    if np is not None:
+        get_tasks(app).submit(update_related, post_id)
+
+
+def _changed(app, post_id, **extra):
+    # Bulk imports send post_id=None; run build-related after those.
+    if post_id is not None:
+        schedule_update(post_id, app)
+
+
+def init_app(app):
+    post_changed.connect(_changed, app)
+    app.cli.add_command(build_related_command)
@@ -0,0 +1,153 @@
+import threading
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flaskr.db import get_db
+from flaskr.signals import post_changed
+
+
+def is_due(publish_date, now=None):
+    if publish_date is None:
+        return False
+
+    if isinstance(publish_date, str):
+        publish_date = datetime.fromisoformat(publish_date)
+
+    return publish_date <= (now or datetime.now())
+
+
+def publish_due(now=None):
+    """Publish every post whose publish date has passed.
+
+    Sends ``post_changed`` for each post, so caches and feeds are only
+    invalidated when a post actually goes live. Returns the published ids.
+    """
+    db = get_db()
+    # Only the process whose UPDATE flips a row sees its id, so concurrent
+    # runs (workers, cron) announce each post once.
+    ids = [row[0] for row in db.execute(
+        'UPDATE post SET published = 1 '
+        'WHERE published = 0 AND publish_date <= ? RETURNING id',
+        (now or datetime.now(),)
+    ).fetchall()]
+    db.commit()
+    app = current_app._get_current_object()
+
+    for id in sorted(ids):
+        post_changed.send(app, post_id=id)
+
+    return sorted(ids)
+
+
+def next_due():
+    next_publish = get_db().execute(
+        'SELECT MIN(publish_date) FROM post WHERE published = 0'
+    ).fetchone()[0]
+
+    if isinstance(next_publish, str):
+        next_publish = datetime.fromisoformat(next_publish)
+
+    return next_publish
+
+
+def seconds_until_next_publish():
+    # Cached listings must not outlive the moment a scheduled post goes live:
+    # post_changed only reaches the process that published it, so other
+    # workers' caches, and every cache when cron publishes, never hear of it.
+    next_publish = next_due()
+
+    if next_publish is None:
+        return float('inf')
+
+    return (next_publish - datetime.now()).total_seconds()
+
+
+class Scheduler:
+    """Publishes scheduled posts from a background thread.
+
+    The thread sleeps until the next post is due, but never longer than
+    ``interval`` seconds, which bounds how late a post scheduled by another
+    process is noticed. It starts with the first request, so CLI commands
+    don't run it.
+    """
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+
+    def start(self):
+        if self._thread is not None or not self.interval:
+            return
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='flaskr-scheduler', daemon=True
+                )
+                self._thread.start()
+
+    def wake(self):
+        # Look at the schedule again, e.g. after a post was (re)scheduled.
+        self._wake.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        delay = 0
+
+        while not self._stopped:
+            self._wake.wait(delay)
+            self._wake.clear()
+
+            if self._stopped:
+                break
+
+            delay = self.interval
+
+            try:
+                with self.app.app_context():
+                    publish_due()
+                    next_publish = next_due()
+            except Exception:
+                self.app.logger.exception('Publishing scheduled posts failed')
+                continue
+
+            if next_publish is not None:
+                until = (next_publish - datetime.now()).total_seconds()
+                delay = min(max(until, 0), delay)
+
+
+def get_scheduler(app=None):
+    return (app or current_app).extensions['flaskr.scheduler']
+
+
+def _changed(app, post_id=None, **extra):
+    get_scheduler(app).wake()
+
+
+@click.command('publish-due')
+@with_appcontext
+def publish_due_command():
+    """Publish scheduled posts whose time has come (e.g. from cron)."""
+    ids = publish_due()
+    click.echo(f'Published {len(ids)} posts.')
+
+
+def init_app(app):
+    scheduler = app.extensions['flaskr.scheduler'] = Scheduler(
+        app, app.config['SCHEDULER_INTERVAL']
+    )
+    app.before_request(scheduler.start)
+    post_changed.connect(_changed, app)
+    app.cli.add_command(publish_due_command)
@@ -1,4 +1,16 @@
+-- The schema of a new database. Existing databases are brought up to date
+-- by the files in migrations/ (flask db-upgrade); a change here needs a
+-- migration too.
+
 -- Drop the tables if they exist
+DROP TABLE IF EXISTS schema_version;
+DROP TABLE IF EXISTS post_related;
+DROP TABLE IF EXISTS post_term;
+DROP TABLE IF EXISTS post_stats;
+DROP TABLE IF EXISTS post_tag;
+DROP TABLE IF EXISTS tag;
+DROP TABLE IF EXISTS draft;
+DROP TABLE IF EXISTS post_fts;
 DROP TABLE IF EXISTS post;
 DROP TABLE IF EXISTS user;
 
@@ -14,6 +26,8 @@ CREATE TABLE post (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     author_id INTEGER NOT NULL,
     created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    version INTEGER NOT NULL DEFAULT 1,
     title TEXT NOT NULL,
     body TEXT NOT NULL,
     summary TEXT,
@@ -24,5 +38,136 @@ CREATE TABLE post (
     seo_title TEXT,
     seo_description TEXT,
     seo_keywords TEXT,
+    -- Plain-text excerpt and stats of body, computed when the post is saved
+    excerpt TEXT,
+    word_count INTEGER NOT NULL DEFAULT 0,
+    reading_time INTEGER NOT NULL DEFAULT 0,
+    -- Set once publish_date has passed, by the writer or by the scheduler
+    published INTEGER NOT NULL DEFAULT 1,
     FOREIGN KEY (author_id) REFERENCES user (id)
 );
+
+-- Serve the front page (published posts, newest first) from an index scan
+CREATE INDEX idx_post_published_created ON post (published, created, id);
+
+-- Scheduled posts that are due, and the next one to come
+CREATE INDEX idx_post_due ON post (published, publish_date);
+
+-- A user's posts
+CREATE INDEX idx_post_author ON post (author_id);
+
+-- Category listings, newest first
+CREATE INDEX idx_post_category ON post (category, published, created, id);
+
+-- Tags, normalized out of post.tags. post_count is kept up to date by the
+-- triggers on post_tag and feeds the tag cloud without aggregating.
+CREATE TABLE tag (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL,
+    post_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX idx_tag_cloud ON tag (post_count DESC, name);
+
+-- post_tag carries a copy of post.created so a tag's posts can be listed
+-- newest first straight from idx_post_tag_created.
+CREATE TABLE post_tag (
+    tag_id INTEGER NOT NULL,
+    post_id INTEGER NOT NULL,
+    created TIMESTAMP NOT NULL,
+    PRIMARY KEY (tag_id, post_id),
+    FOREIGN KEY (tag_id) REFERENCES tag (id),
+    FOREIGN KEY (post_id) REFERENCES post (id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE INDEX idx_post_tag_created ON post_tag (tag_id, created, post_id);
+CREATE INDEX idx_post_tag_post ON post_tag (post_id);
+
+CREATE TRIGGER post_tag_count_insert AFTER INSERT ON post_tag BEGIN
+    UPDATE tag SET post_count = post_count + 1 WHERE id = new.tag_id;
+END;
+
+CREATE TRIGGER post_tag_count_delete AFTER DELETE ON post_tag BEGIN
+    UPDATE tag SET post_count = post_count - 1 WHERE id = old.tag_id;
+END;
+
+-- Autosaved editor contents, one per user and post (post_id 0 for new posts)
+CREATE TABLE draft (
+    user_id INTEGER NOT NULL,
+    post_id INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL,
+    updated TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, post_id),
+    FOREIGN KEY (user_id) REFERENCES user (id)
+);
+
+CREATE INDEX idx_draft_post ON draft (post_id);
+
+-- View counts, flushed in batches from each process's in-memory counters.
+-- score is the log of the views' forward-decayed weight: a view at time t
+-- adds exp(t / tau), so ordering by score ranks posts by recent popularity
+-- without ever rescoring posts that weren't viewed.
+CREATE TABLE post_stats (
+    post_id INTEGER PRIMARY KEY,
+    views INTEGER NOT NULL DEFAULT 0,
+    score REAL NOT NULL DEFAULT 0,
+    FOREIGN KEY (post_id) REFERENCES post (id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_post_stats_score ON post_stats (score DESC, post_id);
+
+-- Related posts. post_term holds each post's TF-IDF vector over its title,
+-- tags and body (scaled to unit length), indexed by term so the posts
+-- sharing terms with an edited one can be found without reading them all.
+-- post_related keeps each post's nearest neighbours by cosine similarity,
+-- so an article page reads its related posts with one index range scan.
+CREATE TABLE post_term (
+    term TEXT NOT NULL,
+    post_id INTEGER NOT NULL,
+    weight REAL NOT NULL,
+    PRIMARY KEY (term, post_id),
+    FOREIGN KEY (post_id) REFERENCES post (id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE INDEX idx_post_term_post ON post_term (post_id);
+
+CREATE TABLE post_related (
+    post_id INTEGER NOT NULL,
+    related_id INTEGER NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (post_id, related_id),
+    FOREIGN KEY (post_id) REFERENCES post (id) ON DELETE CASCADE,
+    FOREIGN KEY (related_id) REFERENCES post (id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE INDEX idx_post_related_score ON post_related (post_id, score DESC, related_id);
+CREATE INDEX idx_post_related_related ON post_related (related_id);
+
+-- Full-text search over posts, kept in sync with the post table by triggers
+CREATE VIRTUAL TABLE post_fts USING fts5(
+    title,
+    summary,
+    body,
+    tags,
+    seo_keywords,
+    content='post',
+    content_rowid='id',
+    tokenize='porter unicode61'
+);
+
+CREATE TRIGGER post_fts_insert AFTER INSERT ON post BEGIN
+    INSERT INTO post_fts (rowid, title, summary, body, tags, seo_keywords)
+    VALUES (new.id, new.title, new.summary, new.body, new.tags, new.seo_keywords);
+END;
+
+CREATE TRIGGER post_fts_delete AFTER DELETE ON post BEGIN
+    INSERT INTO post_fts (post_fts, rowid, title, summary, body, tags, seo_keywords)
+    VALUES ('delete', old.id, old.title, old.summary, old.body, old.tags, old.seo_keywords);
+END;
+
+CREATE TRIGGER post_fts_update AFTER UPDATE OF title, summary, body, tags, seo_keywords ON post BEGIN
+    INSERT INTO post_fts (post_fts, rowid, title, summary, body, tags, seo_keywords)
+    VALUES ('delete', old.id, old.title, old.summary, old.body, old.tags, old.seo_keywords);
+    INSERT INTO post_fts (rowid, title, summary, body, tags, seo_keywords)
+    VALUES (new.id, new.title, new.summary, new.body, new.tags, new.seo_keywords);
+END;
@@ -0,0 +1,99 @@
+import re
+from flask import Blueprint, abort, current_app, render_template, request
+from markupsafe import Markup, escape
+from flaskr.db import get_db
+
+bp = Blueprint('search', __name__)
+
+# bm25() column weights for title, summary, body, tags, seo_keywords.
+WEIGHTS = (10.0, 5.0, 1.0, 3.0, 3.0)
+
+
+def build_match_query(text):
+    # Quote every word so user input can never be parsed as FTS5 syntax;
+    # the terms are ANDed together and the last one matches as a prefix.
+    terms = re.findall(r'\w+', text)
+
+    if not terms:
+        return None
+
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def highlight(snippet):
+    # snippet() marks matches with \x02/\x03 so the text around them can be
+    # escaped before the markers become <mark> tags.
+    return Markup(
+        str(escape(snippet)).replace('\x02', '<mark>').replace('\x03', '</mark>')
+    )
+
+
+def encode_cursor(result):
+    return f"{result['score']!r}_{result['id']}"
+
+
+def decode_cursor(cursor):
+    score, _, id = cursor.rpartition('_')
+
+    try:
+        return float(score), int(id)
+    except ValueError:
+        abort(400, f"Invalid cursor {cursor!r}.")
+
+
+def search_posts(query, after=None, per_page=None):
+    if per_page is None:
+        per_page = current_app.config['POSTS_PER_PAGE']
+
+    db = get_db()
+    score = 'bm25(post_fts, {}, {}, {}, {}, {})'.format(*WEIGHTS)
+    after = after or (float('-inf'), 0)
+    results = db.execute(
+        'SELECT p.id, title, summary, created, author_id, username, score '
+        f'FROM (SELECT rowid AS id, {score} AS score FROM post_fts WHERE post_fts MATCH ?) s '
+        'JOIN post p ON p.id = s.id JOIN user u ON p.author_id = u.id '
+        'WHERE published = 1 '
+        'AND (score, p.id) > (?, ?) '
+        'ORDER BY score, p.id LIMIT ?',
+        (query, *after, per_page + 1)
+    ).fetchall()
+    more = len(results) > per_page
+    results = results[:per_page]
+
+    # Only build snippets for the page being shown, not every match.
+    snippets = {}
+    if results:
+        ids = [result['id'] for result in results]
+        placeholders = ', '.join('?' * len(ids))
+        snippets = dict(db.execute(
+            "SELECT rowid, snippet(post_fts, -1, char(2), char(3), '…', 24) "
+            'FROM post_fts WHERE post_fts MATCH ? '
+            f'AND rowid IN ({placeholders})',
+            (query, *ids)
+        ).fetchall())
+
+    results = [
+        dict(result, snippet=highlight(snippets.get(result['id'], '')))
+        for result in results
+    ]
+    next_cursor = encode_cursor(results[-1]) if more else None
+    return results, next_cursor
+
+
+@bp.route('/search')
+def index():
+    q = request.args.get('q', '').strip()
+    after = request.args.get('after')
+    query = build_match_query(q)
+    results, next_cursor = [], None
+
+    if query is not None:
+        results, next_cursor = search_posts(
+            query, after=decode_cursor(after) if after else None
+        )
+
+    return render_template(
+        'search/index.html', q=q, results=results, next_cursor=next_cursor
+    )
@@ -0,0 +1,8 @@
+from blinker import Namespace
+
+_signals = Namespace()
+
+# Sent by the app after a post's row has been committed: created, updated,
+# deleted or published. Receivers get ``post_id``, which is None after a
+# bulk change to many posts.
+post_changed = _signals.signal('post-changed')
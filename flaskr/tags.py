@@ -0,0 +1,91 @@
+import click
+from flask.cli import with_appcontext
+from flaskr.db import get_db, iter_post_batches
+
+
+def parse_tags(text):
+    # "Python, web ,python" -> ['python', 'web']
+    names = []
+
+    for name in (text or '').split(','):
+        name = ' '.join(name.split()).lower()
+
+        if name and name not in names:
+            names.append(name)
+
+    return names
+
+
+def sync_post_tags(db, post_id, text):
+    """Make post_tag match the comma-separated ``text`` for one post.
+
+    Only the difference is written. Per-tag post counts are maintained by
+    triggers on post_tag, so the tag cloud never needs an aggregate query.
+    The caller commits.
+    """
+    names = parse_tags(text)
+
+    if names:
+        db.executemany(
+            'INSERT OR IGNORE INTO tag (name) VALUES (?)', [(name,) for name in names]
+        )
+        placeholders = ', '.join('?' * len(names))
+        wanted = {
+            row[0] for row in db.execute(
+                f'SELECT id FROM tag WHERE name IN ({placeholders})', names
+            )
+        }
+    else:
+        wanted = set()
+
+    current = {
+        row[0] for row in db.execute(
+            'SELECT tag_id FROM post_tag WHERE post_id = ?', (post_id,)
+        )
+    }
+    db.executemany(
+        'DELETE FROM post_tag WHERE tag_id = ? AND post_id = ?',
+        [(tag_id, post_id) for tag_id in current - wanted]
+    )
+    db.executemany(
+        'INSERT INTO post_tag (tag_id, post_id, created) '
+        'SELECT ?, id, created FROM post WHERE id = ?',
+        [(tag_id, post_id) for tag_id in wanted - current]
+    )
+
+
+def get_tag_cloud(limit=30):
+    return get_db().execute(
+        'SELECT name, post_count FROM tag WHERE post_count > 0 '
+        'ORDER BY post_count DESC, name LIMIT ?',
+        (limit,)
+    ).fetchall()
+
+
+def backfill_tags(batch_size=1000):
+    # Build post_tag from the free-text tags column; yields the number of
+    # posts processed so far.
+    def sync(posts):
+        db = get_db()
+
+        for post in posts:
+            sync_post_tags(db, post['id'], post['tags'])
+
+    return iter_post_batches(batch_size, sync, 'id, tags')
+
+
+@click.command('backfill-tags')
+@click.option('--batch-size', default=1000, show_default=True)
+@with_appcontext
+def backfill_tags_command(batch_size):
+    total = 0
+
+    for total in backfill_tags(batch_size):
+        click.echo(f'Tagged {total} posts...')
+
+    click.echo(f'Backfilled tags for {total} posts.')
+
+
+def init_app(app):
+    app.jinja_env.globals['parse_tags'] = parse_tags
+    app.cli.add_command(backfill_tags_command)
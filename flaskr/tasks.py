@@ -0,0 +1,67 @@
+import queue
+import threading
+from flask import current_app
+
+
+class TaskQueue:
+    """Runs functions on background threads, each inside an app context.
+
+    Used for work that shouldn't hold up a response, like resizing images.
+    Tasks are kept in memory only; anything still queued when the process
+    exits is lost, so tasks must be safe to skip or redo.
+    """
+
+    def __init__(self, app, workers=1):
+        self.app = app
+        self.workers = workers
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        self._start()
+        self._queue.put((func, args, kwargs))
+
+    def join(self):
+        self._queue.join()
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+
+            for n in range(self.workers):
+                thread = threading.Thread(
+                    target=self._work, name=f'flaskr-tasks-{n}', daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            func, args, kwargs = self._queue.get()
+
+            try:
+                with self.app.app_context():
+                    func(*args, **kwargs)
+            except Exception:
+                self.app.logger.exception('Background task %r failed', func)
+            finally:
+                self._queue.task_done()
+
+
+def get_tasks(app=None):
+    if app is None:
+        app = current_app
+
+    return app.extensions['flaskr.tasks']
+
+
+def submit(func, *args, **kwargs):
+    get_tasks().submit(func, *args, **kwargs)
+
+
+def init_app(app):
+    app.extensions['flaskr.tasks'] = TaskQueue(
+        app, workers=app.config['TASK_WORKERS']
+    )
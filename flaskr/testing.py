@@ -0,0 +1,31 @@
+from flaskr.db import get_pool
+
+
+class AuthActions:
+    """Logs a test client in and out."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def login(self, username='test', password='test'):
+        return self._client.post(
+            '/auth/login',
+            data={'username': username, 'password': password}
+        )
+
+    def logout(self):
+        return self._client.get('/auth/logout')
+
+
+def close_app(app):
+    """Finish an app's background work and close its connections.
+
+    Call before deleting its database: SQLite leaves the -wal and -shm
+    files behind when connections are never closed.
+    """
+    app.extensions['flaskr.tasks'].join()
+    app.extensions['flaskr.drafts'].flush()
+    app.extensions['flaskr.counters'].flush()
+    app.extensions['flaskr.writer'].close()
+    app.extensions['flaskr.hashing'].shutdown()
+    get_pool(app).close()
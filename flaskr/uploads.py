@@ -0,0 +1,208 @@
+import hashlib
+import os
+import re
+import tempfile
+
+import click
+from flask import current_app, url_for
+from flask.cli import with_appcontext
+from werkzeug.utils import secure_filename
+from flaskr import tasks
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it only originals are served.
+    Image = None
+
+CHUNK_SIZE = 64 * 1024
+EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
+
+# Responsive widths generated for every upload: card thumbnails on the index
+# and the article header image.
+VARIANTS = {'thumb': 400, 'medium': 1200}
+VARIANT_RE = re.compile(rf"-(?:{'|'.join(map(str, VARIANTS.values()))})w\.\w+$")
+
+
+class UploadError(ValueError):
+    pass
+
+
+def upload_folder():
+    return current_app.config['UPLOAD_FOLDER']
+
+
+def save_image(image, default=None):
+    """Store an uploaded image under a path derived from its content.
+
+    The upload is streamed to disk in chunks while being hashed, so identical
+    files are stored once and differently-named files never clobber each
+    other. Returns the path relative to the static folder, e.g.
+    ``uploads/ab/ab12...ef.jpg``, and queues the resized variants.
+    """
+    if not image or image.filename == '':
+        return default
+
+    ext = os.path.splitext(secure_filename(image.filename))[1].lower()
+
+    if ext not in EXTENSIONS:
+        raise UploadError('Images must be JPEG, PNG, GIF or WebP files.')
+
+    folder = upload_folder()
+    os.makedirs(folder, exist_ok=True)
+    max_bytes = current_app.config['UPLOAD_MAX_BYTES']
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix='.part')
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while chunk := image.stream.read(CHUNK_SIZE):
+                size += len(chunk)
+
+                if size > max_bytes:
+                    raise UploadError(
+                        f'Images may be at most {max_bytes // (1024 * 1024)} MB.'
+                    )
+
+                digest.update(chunk)
+                f.write(chunk)
+
+        name = digest.hexdigest()
+        relative = f'{name[:2]}/{name}{ext}'
+        path = os.path.join(folder, relative)
+
+        if os.path.exists(path):
+            os.unlink(tmp)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp, path)
+            tasks.submit(make_variants, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+    return f'uploads/{relative}'
+
+
+def variant_path(path, variant):
+    root, ext = os.path.splitext(path)
+
+    if ext == '.gif':
+        ext = '.png'
+
+    return f'{root}-{VARIANTS[variant]}w{ext}'
+
+
+def make_variants(path):
+    if Image is None:
+        return
+
+    with Image.open(path) as original:
+        # GIF variants are stored as PNG; everything else keeps its format.
+        image_format = 'PNG' if path.endswith('.gif') else original.format
+
+        for variant, width in VARIANTS.items():
+            target = variant_path(path, variant)
+
+            if os.path.exists(target) or original.width <= width:
+                continue
+
+            resized = original.copy()
+            resized.thumbnail((width, width * 10))
+
+            if target.endswith(('.jpg', '.jpeg')) and resized.mode != 'RGB':
+                resized = resized.convert('RGB')
+
+            tmp = f'{target}.{os.getpid()}.part'
+            resized.save(tmp, format=image_format, optimize=True, quality=82)
+            os.replace(tmp, target)
+
+
+def needs_variants(path):
+    missing = [
+        width for variant, width in VARIANTS.items()
+        if not os.path.exists(variant_path(path, variant))
+    ]
+
+    if not missing:
+        return False
+
+    try:
+        # Reads only the header.
+        with Image.open(path) as image:
+            return image.width > min(missing)
+    except OSError:
+        return False
+
+
+def backfill_variants():
+    # Queue variants for stored images that lack some, such as those
+    # uploaded before variants were made. Yields the number queued so far.
+    count = 0
+
+    for root, dirs, files in os.walk(upload_folder()):
+        dirs.sort()
+
+        for name in sorted(files):
+            path = os.path.join(root, name)
+
+            if os.path.splitext(name)[1].lower() in EXTENSIONS \
+                    and not VARIANT_RE.search(name) and needs_variants(path):
+                tasks.submit(make_variants, path)
+                count += 1
+                yield count
+
+
+@click.command('backfill-variants')
+@with_appcontext
+def backfill_variants_command():
+    """Generate the resized variants of images uploaded without them."""
+    if Image is None:
+        raise click.ClickException('Resizing images needs Pillow.')
+
+    total = 0
+
+    for total in backfill_variants():
+        if total % 100 == 0:
+            click.echo(f'Queued {total} images...')
+
+    tasks.get_tasks().join()
+    click.echo(f'Backfilled variants for {total} images.')
+
+
+def _static_path(image):
+    return os.path.join(upload_folder(), image.removeprefix('uploads/'))
+
+
+def image_variant(image, variant):
+    """The static path of a variant if it has been generated, else the original."""
+    if image and image.startswith('uploads/'):
+        candidate = variant_path(image, variant)
+
+        if os.path.exists(_static_path(candidate)):
+            return candidate
+
+    return image
+
+
+def image_srcset(image):
+    if not image or not image.startswith('uploads/'):
+        return ''
+
+    entries = []
+
+    for variant, width in VARIANTS.items():
+        candidate = variant_path(image, variant)
+
+        if os.path.exists(_static_path(candidate)):
+            entries.append(f"{url_for('static', filename=candidate)} {width}w")
+
+    return ', '.join(entries)
+
+
+def init_app(app):
+    app.jinja_env.globals.update(
+        image_variant=image_variant, image_srcset=image_srcset
+    )
+    app.cli.add_command(backfill_variants_command)
@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+
+import click
+from flask import current_app, url_for
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache
+from flaskr.db import get_pool
+
+
+def compile_templates(app):
+    """Compile every template, filling the bytecode cache.
+
+    Returns the number of templates compiled.
+    """
+    env = app.jinja_env
+    names = [name for name in env.list_templates() if name.endswith(('.html', '.xml'))]
+
+    for name in names:
+        env.get_template(name)
+
+    return len(names)
+
+
+def prime_pool(app):
+    # Open every pooled connection now (and run its PRAGMAs), rather than
+    # during the first requests that need them.
+    pool = get_pool(app)
+    connections = [pool.acquire() for _ in range(pool.size)]
+
+    for connection in connections:
+        connection.execute('SELECT COUNT(*) FROM sqlite_master')
+        connection.close()
+
+    return len(connections)
+
+
+def prime_url_map(app):
+    # Werkzeug builds the URL matcher on the first match or build.
+    with app.test_request_context('/'):
+        url_for('index')
+
+
+def prime_pool_on_first_request(app, timings):
+    # SQLite connections must not cross a fork, and a server that preloads
+    # the app forks its workers after create_app. So each process opens its
+    # own connections, on its first request.
+    lock = threading.Lock()
+    primed = None
+
+    def prime():
+        nonlocal primed
+
+        if primed == os.getpid():
+            return
+
+        with lock:
+            if primed != os.getpid():
+                start = time.perf_counter()
+                prime_pool(app)
+                timings['pool'] = time.perf_counter() - start
+                primed = os.getpid()
+                app.logger.info('Opened the database connections in %.1f ms',
+                                timings['pool'] * 1000)
+
+    app.before_request(prime)
+
+
+def warm_up(app, started=None):
+    """Get a new worker ready for traffic before it accepts any.
+
+    Compiles the templates and builds the URL map, then logs how long each
+    step (and the whole startup, when ``started`` is a
+    ``time.perf_counter()`` reading from its beginning) took. The database
+    connections are opened on each process's first request instead. The
+    timings are kept in ``app.extensions['flaskr.warmup']``.
+    """
+    timings = {}
+
+    for name, step in (('templates', compile_templates),
+                       ('url_map', prime_url_map)):
+        start = time.perf_counter()
+        step(app)
+        timings[name] = time.perf_counter() - start
+
+    if started is not None:
+        timings['startup'] = time.perf_counter() - started
+
+    app.extensions['flaskr.warmup'] = timings
+    app.logger.info('Warm-up finished: %s', ', '.join(
+        f'{name} {seconds * 1000:.1f} ms' for name, seconds in timings.items()
+    ))
+    prime_pool_on_first_request(app, timings)
+    return timings
+
+
+@click.command('precompile')
+@with_appcontext
+def precompile_command():
+    """Compile all templates into the bytecode cache."""
+    app = current_app._get_current_object()
+
+    if app.jinja_env.bytecode_cache is None:
+        raise click.ClickException('The template bytecode cache is disabled.')
+
+    start = time.perf_counter()
+    count = compile_templates(app)
+    click.echo(
+        f'Compiled {count} templates in {(time.perf_counter() - start) * 1000:.0f} ms.'
+    )
+
+
+def init_app(app):
+    if app.config['TEMPLATE_CACHE']:
+        path = app.config['TEMPLATE_CACHE_DIR'] or os.path.join(app.instance_path, 'jinja')
+        os.makedirs(path, exist_ok=True)
+        # Keyed by each template's source checksum, so edits are picked up.
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(path)
+
+    app.cli.add_command(precompile_command)
@@ -0,0 +1,240 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from flask import current_app
+from werkzeug.exceptions import ServiceUnavailable
+from flaskr.db import connect, get_db, use_db
+from flaskr.metrics import COUNTS, Histogram
+
+
+class Writer:
+    """Runs the process's database writes on one thread, in group commits.
+
+    Views submit a function that writes through get_db() and doesn't commit.
+    The writer takes up to ``max_batch`` queued functions: everything that
+    arrived while the previous batch was committing, plus whatever arrives
+    within ``max_wait`` seconds. It runs each in its own savepoint inside a
+    single IMMEDIATE transaction and then commits once. Each caller gets
+    back its function's return value, or the exception it raised. A function
+    that fails is rolled back alone, and the rest of its batch is still
+    committed.
+
+    The writer has a connection of its own rather than a pooled one. Its
+    callers block while holding pooled connections, so with every one of
+    them held by a caller it could otherwise never start.
+
+    If the thread dies, the writes it held or had queued fail with its
+    error and the next write starts a new thread. ``write`` gives up after
+    ``timeout`` seconds.
+    """
+
+    def __init__(self, app, max_batch=64, max_wait=0.0, timeout=30.0):
+        self.app = app
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.batch_size = Histogram(
+            'flaskr_writer_batch_size', 'Writes committed together.', COUNTS)
+        self.queue_seconds = Histogram(
+            'flaskr_writer_queue_seconds', 'Time a write waited for its transaction.')
+        self._stats = dict.fromkeys(('batches', 'writes', 'failed'), 0)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        """Queue ``func``; returns a Future for its result."""
+        future = Future()
+
+        # Started and queued under the lock, so a write is either drained by
+        # a dying thread or picked up by the one that replaces it.
+        with self._lock:
+            self._start()
+            self._queue.put((future, time.perf_counter(), func, args, kwargs))
+
+        return future
+
+    def write(self, func, *args, **kwargs):
+        future = self.submit(func, *args, **kwargs)
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise ServiceUnavailable('Saving is taking too long, please try again.', retry_after=1)
+
+    def write_at_exit(self, func, *args, **kwargs):
+        """Run ``func`` and commit it on the calling thread.
+
+        For exit hooks, which may run after the writer's daemon thread is
+        gone.
+        """
+        with self.app.app_context():
+            db = get_db()
+
+            try:
+                result = func(*args, **kwargs)
+                db.commit()
+            except BaseException:
+                db.rollback()
+                raise
+
+        return result
+
+    async def write_async(self, func, *args, **kwargs):
+        future = self.submit(func, *args, **kwargs)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise ServiceUnavailable('Saving is taking too long, please try again.', retry_after=1)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, queued=self._queue.qsize())
+
+    def _start(self):
+        # Called with the lock held.
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._work, name='flaskr-writer', daemon=True
+            )
+            self._thread.start()
+
+    def close(self):
+        """Stop the thread once the queued writes are done, and close its connection."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+
+            if thread is not None:
+                self._queue.put(None)
+
+        if thread is not None:
+            thread.join()
+
+    def _collect(self):
+        # A None in the queue, from close(), ends the batch and the thread.
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch and batch[-1] is not None:
+            try:
+                batch.append(self._queue.get(timeout=max(deadline - time.perf_counter(), 0)))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _work(self):
+        db = None
+        batch = []
+
+        try:
+            db = connect(self.app)
+            use_db(db)
+
+            while True:
+                batch = self._collect()
+                stop = batch[-1] is None
+
+                if stop:
+                    batch.pop()
+
+                if batch:
+                    self._run(batch)
+
+                if stop:
+                    return
+        except Exception as e:
+            self.app.logger.exception('Writer thread failed')
+            self._fail(batch, e)
+        finally:
+            if db is not None:
+                db.close()
+
+    def _fail(self, batch, error):
+        # Let the next write start a new thread, and fail every write this
+        # one was holding, so that no caller waits on it.
+        with self._lock:
+            if self._thread is threading.current_thread():
+                self._thread = None
+
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+        for item in batch:
+            if item is not None and not item[0].done():
+                item[0].set_exception(error)
+
+    def _run(self, batch):
+        try:
+            with self.app.app_context():
+                results = self._commit(batch)
+        except Exception as e:
+            # The transaction itself failed; nothing in it was written.
+            self.app.logger.exception('Write batch of %d failed', len(batch))
+            results = [(future, None, e) for future, *_ in batch]
+
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['writes'] += len(batch)
+            self._stats['failed'] += sum(error is not None for _, _, error in results)
+
+        self.batch_size.observe(len(batch))
+
+        for future, result, error in results:
+            if future.cancelled():
+                continue
+
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def _commit(self, batch):
+        db = get_db()
+        started = time.perf_counter()
+        results = []
+        db.execute('BEGIN IMMEDIATE')
+
+        try:
+            for future, queued, func, args, kwargs in batch:
+                # Skip writes whose caller gave up waiting.
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                self.queue_seconds.observe(started - queued)
+                db.execute('SAVEPOINT write')
+
+                try:
+                    results.append((future, func(*args, **kwargs), None))
+                except Exception as e:
+                    db.execute('ROLLBACK TO write')
+                    results.append((future, None, e))
+
+                db.execute('RELEASE write')
+
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+
+        return results
+
+
+def get_writer(app=None):
+    return (app or current_app).extensions['flaskr.writer']
+
+
+def init_app(app):
+    app.extensions['flaskr.writer'] = Writer(
+        app,
+        max_batch=app.config['WRITER_MAX_BATCH'],
+        max_wait=app.config['WRITER_MAX_WAIT'],
+        timeout=app.config['WRITER_TIMEOUT'],
+    )
@@ -1,8 +1,10 @@
 import os
+import shutil
 import tempfile
 import pytest
 from flaskr import create_app
 from flaskr.db import get_db, init_db
+from flaskr.testing import AuthActions, close_app
 
 with open(os.path.join(os.path.dirname(__file__), 'data.sql'), 'rb') as f:
     _data_sql = f.read().decode('utf8')
@@ -11,10 +13,17 @@ with open(os.path.join(os.path.dirname(__file__), 'data.sql'), 'rb') as f:
 @pytest.fixture
 def app():
     db_fd, db_path = tempfile.mkstemp()
+    feed_cache = tempfile.mkdtemp()
+    template_cache = tempfile.mkdtemp()
 
     app = create_app({
         'TESTING': True,
         'DATABASE': db_path,
+        'FEED_CACHE_DIR': feed_cache,
+        'SCHEDULER_INTERVAL': 0,
+        'TEMPLATE_CACHE_DIR': template_cache,
+        # Hash inline instead of starting worker processes for every app.
+        'PASSWORD_HASH_WORKERS': 0,
     })
 
     with app.app_context():
@@ -23,8 +32,32 @@ def app():
 
     yield app
 
+    close_app(app)
     os.close(db_fd)
     os.unlink(db_path)
+    shutil.rmtree(feed_cache)
+    shutil.rmtree(template_cache)
+
+
+@pytest.fixture
+def make_app(app):
+    """Create more apps on the test database, closed after the test."""
+    apps = []
+
+    def make(config=None):
+        apps.append(create_app({
+            'TESTING': True,
+            'DATABASE': app.config['DATABASE'],
+            'SCHEDULER_INTERVAL': 0,
+            'PASSWORD_HASH_WORKERS': 0,
+            **(config or {}),
+        }))
+        return apps[-1]
+
+    yield make
+
+    for other in apps:
+        close_app(other)
 
 
 @pytest.fixture
@@ -37,20 +70,6 @@ def runner(app):
     return app.test_cli_runner()
 
 
-class AuthActions:
-    def __init__(self, client):
-        self._client = client
-
-    def login(self, username='test', password='test'):
-        return self._client.post(
-            '/auth/login',
-            data={'username': username, 'password': password}
-        )
-
-    def logout(self):
-        return self._client.get('/auth/logout')
-
-
 @pytest.fixture
 def auth(client):
     return AuthActions(client)
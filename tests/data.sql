@@ -1,7 +1,8 @@
 -- tests/data.sql
 
 INSERT INTO user (id, username, password)
-VALUES (1, 'test', 'pbkdf2:sha256:150000$8Jd3bKuw$9e6efbf8b1bb4b5fbad5e4f441c1232bb1e5ed295d5dff99b0a91a0c5e45e293'); -- Replace with actual hash
+VALUES (1, 'test', 'pbkdf2:sha256:50000$TCI4GzcX$0de171a4f4dac32e3364c7ddc7c14f3e2fa61f2d17574483f7ffbb431b4acb2f'),
+       (2, 'other', 'pbkdf2:sha256:50000$kJPKsz6N$d2d4784f1b030a9761f5ccaeeaca413f27f2ecb76d6168407af962ddce849f79');
 
-INSERT INTO post (id, title, body, created, author_id)
-VALUES (1, 'test title', 'test\nbody', '2023-01-01', 1);
+INSERT INTO post (id, title, body, excerpt, word_count, reading_time, created, author_id)
+VALUES (1, 'test title', 'test\nbody', 'test\nbody', 1, 1, '2023-01-01 00:00:00', 1);
@@ -0,0 +1,95 @@
+import json
+
+from flaskr.db import get_db
+from flaskr.tags import sync_post_tags
+
+
+def add_posts(app, count):
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            "INSERT INTO post (title, body, tags, created, author_id) VALUES (?, 'body', 'python', ?, 1)",
+            [(f'post {n}', f'2023-02-{n + 1:02d} 00:00:00') for n in range(count)]
+        )
+
+        for (id,) in db.execute("SELECT id FROM post WHERE tags = 'python'").fetchall():
+            sync_post_tags(db, id, 'python')
+
+        db.commit()
+
+
+def test_posts(client):
+    response = client.get('/api/v1/posts')
+    assert response.is_streamed
+    data = json.loads(response.data)
+    assert data == {'next': None, 'prev': None, 'posts': [{
+        'id': 1, 'title': 'test title', 'excerpt': 'test\\nbody', 'author': 'test',
+        'created': '2023-01-01T00:00:00', 'reading_time': 1,
+    }]}
+
+
+def test_sparse_fields(client, app):
+    statements = []
+
+    with app.app_context():
+        get_db().connection.set_trace_callback(statements.append)
+
+    data = client.get('/api/v1/posts?fields=title,tags').get_json()
+    assert data['posts'] == [{'title': 'test title', 'tags': []}]
+    page_query = next(sql for sql in statements if 'LIMIT' in sql)
+    assert 'body' not in page_query and 'excerpt' not in page_query
+
+    response = client.get('/api/v1/posts?fields=title,password')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Unknown fields: password.'
+
+
+def test_streamed_image_urls(client, app):
+    with app.app_context():
+        get_db().execute("UPDATE post SET image = 'uploads/photo.jpg' WHERE id = 1")
+        get_db().commit()
+
+    data = client.get('/api/v1/posts?fields=id,image').get_json()
+    assert data['posts'] == [
+        {'id': 1, 'image': 'http://localhost/static/uploads/photo.jpg'}
+    ]
+
+
+def test_pagination(client, app):
+    add_posts(app, 3)
+    data = client.get('/api/v1/posts?per_page=2&fields=title').get_json()
+    assert [post['title'] for post in data['posts']] == ['post 2', 'post 1']
+    assert data['prev'] is None
+
+    data = client.get(data['next']).get_json()
+    assert [post['title'] for post in data['posts']] == ['post 0', 'test title']
+    assert data['next'] is None and 'fields=title' in data['prev']
+
+    data = client.get(data['prev']).get_json()
+    assert [post['title'] for post in data['posts']] == ['post 2', 'post 1']
+
+    data = client.get('/api/v1/posts?tag=python&fields=id').get_json()
+    assert [post['id'] for post in data['posts']] == [4, 3, 2]
+    assert client.get('/api/v1/posts?tag=missing').status_code == 404
+
+
+def test_etag(client, app):
+    response = client.get('/api/v1/posts')
+    etag = response.headers['ETag']
+    assert client.get('/api/v1/posts', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/v1/posts?fields=id', headers={'If-None-Match': etag}).status_code == 200
+
+    add_posts(app, 1)
+    assert client.get('/api/v1/posts', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_post(client, app):
+    data = client.get('/api/v1/posts/1?fields=id,body,version').get_json()
+    assert data == {'id': 1, 'body': 'test\\nbody', 'version': 1}
+
+    etag = client.get('/api/v1/posts/1').headers['ETag']
+    assert client.get('/api/v1/posts/1', headers={'If-None-Match': etag}).status_code == 304
+
+    response = client.get('/api/v1/posts/99')
+    assert response.status_code == 404
+    assert response.get_json()['status'] == 404
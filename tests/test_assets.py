@@ -0,0 +1,77 @@
+import gzip
+import os
+
+import pytest
+from flask import url_for
+from flaskr.assets import brotli, build_assets, get_assets
+
+
+@pytest.fixture
+def static(app, tmp_path):
+    (tmp_path / 'images').mkdir()
+    (tmp_path / 'images' / 'logo.png').write_bytes(b'\x89PNG fake image')
+    (tmp_path / 'style.css').write_text(
+        'body { background: url("images/logo.png?v=1"); }\n'
+        'a { background: url(data:image/png;base64,AAAA); }\n' + 'p { color: red; }\n' * 200
+    )
+    (tmp_path / 'uploads').mkdir()
+    (tmp_path / 'uploads' / 'user.png').write_bytes(b'upload')
+    app.static_folder = str(tmp_path)
+    return tmp_path
+
+
+def test_build_assets(static):
+    manifest = build_assets(str(static), exclude=[str(static / 'uploads')])
+    assert set(manifest) == {'images/logo.png', 'style.css'}
+    assert manifest['images/logo.png']['encodings'] == {}
+
+    css = manifest['style.css']
+    assert css['path'].startswith('build/style.') and css['path'].endswith('.css')
+    assert 'gzip' in css['encodings']
+    body = (static / css['path']).read_text()
+    logo = os.path.basename(manifest['images/logo.png']['path'])
+    assert f'url("images/{logo}?v=1")' in body
+    assert 'url(data:image/png;base64,AAAA)' in body
+    assert gzip.decompress((static / (css['path'] + '.gz')).read_bytes()).decode() == body
+
+    # Same content, same name.
+    assert build_assets(str(static), exclude=[str(static / 'uploads')]) == manifest
+
+
+def test_serve_precompressed(app, client, static):
+    build_assets(str(static), exclude=[str(static / 'uploads')])
+    get_assets(app).load()
+
+    with app.test_request_context():
+        url = url_for('static', filename='style.css')
+
+    assert url.startswith('/static/build/style.')
+    original = (static / url[len('/static/'):]).read_bytes()
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.mimetype == 'text/css'
+    assert gzip.decompress(response.data) == original
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'max-age=31536000' in response.headers['Cache-Control']
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+    if brotli is not None:
+        response = client.get(url, headers={'Accept-Encoding': 'gzip, br'})
+        assert response.headers['Content-Encoding'] == 'br'
+        assert brotli.decompress(response.data) == original
+
+    response = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == original
+
+    response = client.get('/static/uploads/user.png')
+    assert response.data == b'upload'
+    assert 'immutable' not in response.headers.get('Cache-Control', '')
+
+
+def test_unbuilt_assets_are_served_as_before(app, client):
+    with app.test_request_context():
+        assert url_for('static', filename='style.css') == '/static/style.css'
+
+    assert client.get('/static/style.css').status_code == 200
@@ -1,8 +1,13 @@
 # tests/test_auth.py
 
+import threading
+
 import pytest
 from flask import g, session
+from werkzeug.exceptions import ServiceUnavailable
 from flaskr.db import get_db
+from flaskr.auth import UserCache, invalidate_user
+from flaskr.hashing import PasswordHasher
 from flaskr import create_app
 
 
@@ -61,3 +66,127 @@ def test_logout(client, auth):
     with client:
         auth.logout()
         assert 'user_id' not in session
+
+
+def test_login_rehashes_outdated_hash(client, app, auth):
+    with app.app_context():
+        old = get_db().execute('SELECT password FROM user WHERE id = 1').fetchone()[0]
+
+    assert old.startswith('pbkdf2:')
+    auth.login()
+
+    with app.app_context():
+        new = get_db().execute('SELECT password FROM user WHERE id = 1').fetchone()[0]
+
+    assert new.startswith('scrypt:')
+    auth.logout()
+    assert auth.login().headers['Location'] == '/'
+
+
+def test_hasher_rejects_when_saturated(app):
+    hasher = PasswordHasher('pbkdf2:sha256:1000', 8, workers=0, queue_depth=0)
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow(*args):
+        started.set()
+        release.wait()
+        return 'done'
+
+    thread = threading.Thread(target=hasher._run, args=(slow,))
+    thread.start()
+    started.wait()
+
+    with pytest.raises(ServiceUnavailable) as e:
+        hasher.generate('x')
+
+    assert e.value.retry_after == 1
+    release.set()
+    thread.join()
+
+    stats = hasher.stats()
+    assert stats['rejected'] == 1
+    assert stats['calls'] == 1
+    assert hasher.check(hasher.generate('x'), 'x')
+
+
+def test_hasher_pool_metrics():
+    hasher = PasswordHasher('pbkdf2:sha256:1000', 8, workers=1)
+
+    try:
+        assert hasher.check(hasher.generate('secret'), 'secret')
+        stats = hasher.stats()
+    finally:
+        hasher.shutdown()
+
+    assert hasher._executor is None
+    assert stats['calls'] == 2
+    assert stats['compute_seconds'] > 0
+    assert stats['wait_seconds'] >= 0
+
+
+def rename_user(app, username):
+    with app.app_context():
+        db = get_db()
+        db.execute('UPDATE user SET username = ? WHERE id = 1', (username,))
+        db.commit()
+
+
+def test_user_loaded_lazily(client, auth):
+    auth.login()
+    etag = client.get('/article/1').headers['ETag']
+
+    with client:
+        response = client.get('/article/1', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert 'user' not in g
+
+    with client:
+        client.get('/')
+        assert 'user' in g
+
+
+def test_user_cached(client, app, auth):
+    auth.login()
+    client.get('/')
+    rename_user(app, 'renamed')
+
+    with client:
+        client.get('/')
+        assert g.user == {'id': 1, 'username': 'test'}
+
+    with app.app_context():
+        invalidate_user(1)
+
+    with client:
+        client.get('/')
+        assert g.user['username'] == 'renamed'
+
+
+def test_user_cache_expires():
+    cache = UserCache(size=1, ttl=0)
+    cache.set(1, {'id': 1})
+    assert cache.get(1) is None
+
+    cache = UserCache(size=1, ttl=60)
+    cache.set(1, {'id': 1})
+    cache.set(2, {'id': 2})
+    assert cache.get(1) is None
+    assert cache.get(2) == {'id': 2}
+
+
+def test_session_user_snapshot(client, app, auth):
+    app.config['AUTH_SESSION_USER'] = True
+    auth.login()
+    rename_user(app, 'renamed')
+
+    with app.app_context():
+        invalidate_user(1)
+
+    with client:
+        client.get('/')
+        assert g.user == {'id': 1, 'username': 'test'}
+
+    with client:
+        client.post('/1/delete')
+        assert g.user['username'] == 'renamed'
@@ -0,0 +1,37 @@
+# tests/test_benchmarks.py
+
+from benchmarks.runner import SCENARIOS, compare, percentile, run
+
+
+def test_run_smoke():
+    results = run(users=2, posts=20, requests=3, warmup=1)
+
+    assert set(results['results']) == set(SCENARIOS)
+
+    for result in results['results'].values():
+        assert result['errors'] == 0
+        assert result['requests'] == 3
+        assert 0 < result['p50_ms'] <= result['p95_ms'] <= result['p99_ms']
+
+
+def test_percentile():
+    samples = list(range(1, 101))
+    assert percentile(samples, 50) == 50
+    assert percentile(samples, 99) == 99
+    assert percentile([7], 95) == 7
+
+
+def test_compare_flags_regressions():
+    baseline = {'results': {
+        'index': {'p95_ms': 1.0, 'throughput': 100.0},
+        'article': {'p95_ms': 1.0, 'throughput': 100.0},
+    }}
+    current = {'results': {
+        'index': {'p95_ms': 1.1, 'throughput': 95.0},
+        'article': {'p95_ms': 2.0, 'throughput': 50.0},
+        'search': {'p95_ms': 9.0, 'throughput': 1.0},
+    }}
+
+    regressions = compare(current, baseline, threshold=0.2)
+    assert len(regressions) == 2
+    assert all(r.startswith('article') for r in regressions)
@@ -1,6 +1,7 @@
 # tests/test_blog.py
 
 import pytest
+from flaskr.cache import get_cache
 from flaskr.db import get_db
 from flaskr import create_app
 
@@ -82,3 +83,79 @@ def test_delete(client, auth, app):
         db = get_db()
         post = db.execute('SELECT * FROM post WHERE id = 1').fetchone()
         assert post is None
+
+
+def test_index_pagination(client, app):
+    app.config['POSTS_PER_PAGE'] = 2
+
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            'INSERT INTO post (title, body, created, author_id)'
+            ' VALUES (?, ?, ?, 1)',
+            [(f'post {n}', 'body', f'2023-02-0{n} 00:00:00') for n in (1, 2, 3)]
+        )
+        db.commit()
+
+    response = client.get('/')
+    assert b'post 3' in response.data and b'post 2' in response.data
+    assert b'post 1' not in response.data
+    assert b'after=' not in response.data
+
+    response = client.get('/?before=2023-02-02 00:00:00_3')
+    assert b'post 1' in response.data and b'test title' in response.data
+    assert b'post 2' not in response.data
+    assert b'before=' not in response.data
+
+    response = client.get('/?after=2023-02-01 00:00:00_2')
+    assert b'post 3' in response.data and b'post 2' in response.data
+    assert b'after=' not in response.data
+
+
+def test_index_invalid_cursor(client):
+    assert client.get('/?before=nonsense').status_code == 400
+
+
+@pytest.mark.parametrize('path', ('/', '/article/1'))
+def test_conditional_get(client, app, path):
+    response = client.get(path)
+    etag = response.headers['ETag']
+    assert 'Cookie' in response.headers['Vary']
+
+    response = client.get(path, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+    with app.app_context():
+        db = get_db()
+        db.execute('UPDATE post SET version = version + 1 WHERE id = 1')
+        db.commit()
+        get_cache().invalidate_post(1)
+
+    response = client.get(path, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+@pytest.mark.parametrize('path', ('/', '/article/1'))
+def test_no_last_modified(client, path):
+    # Pages showing other posts can change without any row on them changing.
+    assert 'Last-Modified' not in client.get(path).headers
+
+
+def test_article_ignores_if_modified_since(client, app):
+    response = client.get(
+        '/article/1', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'}
+    )
+    assert response.status_code == 200
+
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+
+    client.post('/1/update', data={'title': 'changed', 'body': 'body'})
+
+    with app.app_context():
+        post = get_db().execute(
+            'SELECT version FROM post WHERE id = 1'
+        ).fetchone()
+        assert post['version'] == 2
@@ -0,0 +1,157 @@
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from flaskr.db import get_db
+
+
+def export(runner):
+    result = runner.invoke(args=['export-posts'])
+    return [json.loads(line) for line in result.stdout.splitlines()]
+
+
+def objects(app):
+    with app.app_context():
+        return sorted(
+            tuple(row) for row in get_db().execute('SELECT type, name FROM sqlite_master')
+        )
+
+
+def test_export(runner, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE post SET tags = 'Python, web' WHERE id = 1")
+        db.commit()
+
+    (post,) = export(runner)
+    assert post['author'] == 'test'
+    assert post['title'] == 'test title'
+    assert post['tags'] == ['python', 'web']
+    assert post['created'] == '2023-01-01 00:00:00'
+
+
+@pytest.mark.parametrize('defer', ('--defer-indexes', '--keep-indexes'))
+def test_import(runner, app, tmp_path, defer):
+    before = objects(app)
+    posts = [
+        {'author': 'test', 'title': 'first import', 'body': 'one', 'tags': ['python', 'web'],
+         'created': '2024-05-01T10:00:00+02:00'},
+        {'author': 'newcomer', 'title': 'second import', 'body': 'two', 'tags': ['Python']},
+        {'author': 'test', 'title': 'third import', 'body': 'three'},
+    ]
+    path = tmp_path / 'posts.jsonl'
+    path.write_text(''.join(json.dumps(post) + '\n' for post in posts))
+
+    result = runner.invoke(args=['import-posts', str(path), '--batch-size', '2', defer])
+    assert 'Imported 3 posts' in result.output
+    assert objects(app) == before
+
+    with app.app_context():
+        db = get_db()
+        rows = db.execute('SELECT * FROM post WHERE id > 1 ORDER BY id').fetchall()
+        assert [row['title'] for row in rows] == ['first import', 'second import', 'third import']
+        assert str(rows[0]['created']) == '2024-05-01 08:00:00'
+        assert db.execute(
+            "SELECT username FROM user WHERE id = ?", (rows[1]['author_id'],)
+        ).fetchone()[0] == 'newcomer'
+        assert dict(db.execute('SELECT name, post_count FROM tag').fetchall()) == {
+            'python': 2, 'web': 1
+        }
+        assert [tuple(row) for row in db.execute(
+            "SELECT rowid FROM post_fts WHERE post_fts MATCH 'second'"
+        )] == [(3,)]
+
+    assert [post['title'] for post in export(runner)][1:] == [
+        'first import', 'second import', 'third import'
+    ]
+
+
+def test_import_is_all_or_nothing(runner, app, tmp_path):
+    before = objects(app)
+    path = tmp_path / 'posts.jsonl'
+    path.write_text(
+        json.dumps({'author': 'test', 'title': 'good', 'body': 'body'}) + '\n'
+        + json.dumps({'author': 'test', 'title': 'no body'}) + '\n'
+        + 'not json\n'
+    )
+
+    result = runner.invoke(args=['import-posts', str(path), '--batch-size', '1'])
+    assert result.exit_code != 0
+    assert 'Line 2: invalid post' in result.output
+    assert objects(app) == before
+
+    with app.app_context():
+        assert get_db().execute('SELECT COUNT(*) FROM post').fetchone()[0] == 1
+
+
+def test_import_string_tags(runner, app, tmp_path):
+    path = tmp_path / 'posts.jsonl'
+    path.write_text(
+        json.dumps({'author': 'test', 'title': 'tagged', 'body': 'body', 'tags': 'Python, web'}) + '\n'
+    )
+
+    result = runner.invoke(args=['import-posts', str(path)])
+    assert result.exit_code == 0
+
+    with app.app_context():
+        db = get_db()
+        assert db.execute(
+            "SELECT tags FROM post WHERE title = 'tagged'"
+        ).fetchone()[0] == 'python, web'
+        assert dict(db.execute('SELECT name, post_count FROM tag').fetchall()) == {
+            'python': 1, 'web': 1
+        }
+
+
+def test_import_rejects_other_tag_types(runner, app, tmp_path):
+    path = tmp_path / 'posts.jsonl'
+    path.write_text(
+        json.dumps({'author': 'test', 'title': 'tagged', 'body': 'body', 'tags': 42}) + '\n'
+    )
+
+    result = runner.invoke(args=['import-posts', str(path)])
+    assert result.exit_code != 0
+    assert 'Line 1: invalid post (tags must be a string or a list, not int)' in result.output
+
+
+@pytest.fixture
+def local_time(monkeypatch):
+    # A fixed UTC+5:30 zone, so local time differs from UTC.
+    monkeypatch.setenv('TZ', 'IST-5:30')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_import_publish_date_is_local_time(runner, app, tmp_path, local_time):
+    due = datetime.now().replace(microsecond=0) + timedelta(minutes=10)
+    utc = (due - timedelta(hours=5, minutes=30)).isoformat() + '+00:00'
+    path = tmp_path / 'posts.jsonl'
+    path.write_text(json.dumps({
+        'author': 'test', 'title': 'scheduled', 'body': 'body',
+        'publish_date': utc, 'created': '2024-05-01T10:00:00+02:00',
+    }) + '\n')
+
+    runner.invoke(args=['import-posts', str(path)])
+
+    with app.app_context():
+        row = get_db().execute(
+            "SELECT publish_date, created, published FROM post WHERE title = 'scheduled'"
+        ).fetchone()
+
+    # Compared with datetime.now() by the scheduler, so stored in local time;
+    # created stays UTC like CURRENT_TIMESTAMP.
+    assert row['publish_date'] == due
+    assert str(row['created']) == '2024-05-01 08:00:00'
+    assert row['published'] == 0
+
+
+def test_round_trip(runner, app, tmp_path):
+    path = tmp_path / 'posts.jsonl'
+    runner.invoke(args=['export-posts', str(path)])
+    runner.invoke(args=['import-posts', str(path)])
+    first, copy = export(runner)
+    del first['id'], copy['id']
+    assert first == copy
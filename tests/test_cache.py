@@ -0,0 +1,188 @@
+# tests/test_cache.py
+
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from flaskr.cache import FileSystemCache, LRUCache, get_cache
+from flaskr.db import get_db
+from flaskr.scheduler import publish_due
+
+
+def login(client, user_id=1):
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+
+
+def test_anonymous_pages_cached(client, app):
+    assert client.get('/').headers['X-Cache'] == 'MISS'
+    response = client.get('/')
+    assert response.headers['X-Cache'] == 'HIT'
+    assert b'test title' in response.data
+    assert client.get('/article/1').headers['X-Cache'] == 'MISS'
+    assert client.get('/article/1').headers['X-Cache'] == 'HIT'
+
+    with app.app_context():
+        assert get_cache().stats() == {'hits': 2, 'misses': 2, 'evictions': 0}
+
+
+def test_logged_in_pages_not_cached(client):
+    login(client)
+    client.get('/')
+    assert 'X-Cache' not in client.get('/').headers
+
+
+def test_writes_invalidate(client):
+    client.get('/')
+    client.get('/article/1')
+    login(client)
+    client.post('/1/update', data={'title': 'changed', 'body': 'body'})
+
+    with client.session_transaction() as session:
+        session.clear()
+
+    response = client.get('/')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert b'changed' in response.data
+    assert b'changed' in client.get('/article/1').data
+
+
+def test_other_articles_kept(client, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO post (title, body, author_id) VALUES ('b', 'b', 1)")
+        db.commit()
+
+    client.get('/article/2')
+    login(client)
+    client.post('/1/delete')
+
+    with client.session_transaction() as session:
+        session.clear()
+
+    assert client.get('/article/2').headers['X-Cache'] == 'HIT'
+
+
+def test_publishing_a_scheduled_post_invalidates(client, app):
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "INSERT INTO post (title, body, author_id, publish_date, published) VALUES ('soon', 'b', 1, ?, 0)",
+            (datetime.now() + timedelta(seconds=0.5),)
+        )
+        db.commit()
+
+    assert b'soon' not in client.get('/').data
+    assert client.get('/').headers['X-Cache'] == 'HIT'
+
+    with app.app_context():
+        assert publish_due() == []
+        time.sleep(0.6)
+        assert publish_due() == [2]
+
+    response = client.get('/')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert b'soon' in response.data
+
+
+def test_publishing_from_another_process_shows_on_time(client, app, make_app):
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "INSERT INTO post (title, body, author_id, publish_date, published) VALUES ('soon', 'b', 1, ?, 0)",
+            (datetime.now() + timedelta(seconds=0.5),)
+        )
+        db.commit()
+
+    assert b'soon' not in client.get('/').data
+    assert client.get('/').headers['X-Cache'] == 'HIT'
+    time.sleep(0.6)
+
+    # Another worker, or cron, publishes; this app's cache gets no signal.
+    with make_app().app_context():
+        assert publish_due() == [2]
+
+    response = client.get('/')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert b'soon' in response.data
+
+
+def test_lru_evicts_by_size():
+    cache = LRUCache(max_bytes=10)
+    cache.set('ns', 'a', {'body': b'12345'}, 60)
+    cache.set('ns', 'b', {'body': b'12345'}, 60)
+    cache.get('ns', 'a')
+    cache.set('ns', 'c', {'body': b'123'}, 60)
+
+    assert cache.get('ns', 'b') is None
+    assert cache.get('ns', 'a') is not None
+    assert cache.evictions == 1
+    assert cache.size == 8
+
+    cache.set('ns', 'big', {'body': b'x' * 11}, 60)
+    assert cache.get('ns', 'big') is None
+
+
+@pytest.mark.parametrize('backend', ('lru', 'filesystem'))
+def test_backend_expiry_and_clear(tmp_path, backend):
+    cache = LRUCache(100) if backend == 'lru' else FileSystemCache(str(tmp_path))
+    cache.set('ns', 'a', {'status': 200, 'body': b'a'}, 60)
+    cache.set('ns', 'b', {'status': 200, 'body': b'b'}, -1)
+    cache.set('other', 'a', {'status': 200, 'body': b'c'}, 60)
+
+    assert cache.get('ns', 'a') == {'status': 200, 'body': b'a'}
+    assert cache.get('ns', 'b') is None
+
+    cache.clear('ns')
+    assert cache.get('ns', 'a') is None
+    assert cache.get('other', 'a')['body'] == b'c'
+
+
+def test_filesystem_cache_shared(make_app, tmp_path):
+    config = {'CACHE_TYPE': 'filesystem', 'CACHE_DIR': str(tmp_path)}
+    first, second = make_app(config), make_app(config)
+
+    first.test_client().get('/article/1')
+    assert second.test_client().get('/article/1').headers['X-Cache'] == 'HIT'
+
+    with second.app_context():
+        get_cache().invalidate_post(1)
+
+    assert first.test_client().get('/article/1').headers['X-Cache'] == 'MISS'
+
+
+@pytest.mark.parametrize('cache_type', ('lru', 'filesystem'))
+def test_bulk_change_invalidates_every_article(make_app, tmp_path, cache_type):
+    app = make_app({'CACHE_TYPE': cache_type, 'CACHE_DIR': str(tmp_path)})
+    client = app.test_client()
+
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO post (title, body, author_id) VALUES ('b', 'b', 1)")
+        db.commit()
+
+    for path in ('/', '/article/1', '/article/2'):
+        client.get(path)
+
+    with app.app_context():
+        get_cache().invalidate_post(None)
+
+    for path in ('/', '/article/1', '/article/2'):
+        assert client.get(path).headers['X-Cache'] == 'MISS'
+
+
+def test_filesystem_generation_is_shared(make_app, tmp_path):
+    config = {'CACHE_TYPE': 'filesystem', 'CACHE_DIR': str(tmp_path)}
+    first, second = make_app(config), make_app(config)
+
+    def view(article_id):
+        # Another worker changes the post while this one renders it.
+        with second.app_context():
+            get_cache().invalidate_post(article_id)
+
+        return 'stale'
+
+    with first.test_request_context('/article/1'):
+        get_cache().serve(view, {'article_id': 1}, post_arg='article_id')
+
+    assert first.test_client().get('/article/1').headers['X-Cache'] == 'MISS'
@@ -0,0 +1,106 @@
+import math
+
+from flaskr.counters import decayed_weight, get_view_counter, logaddexp, record_views
+from flaskr.db import get_db
+
+DAY = 24 * 3600
+
+
+def stats(app):
+    with app.app_context():
+        return [tuple(row) for row in get_db().execute(
+            'SELECT post_id, views FROM post_stats ORDER BY post_id'
+        )]
+
+
+def add_post(app, title):
+    with app.app_context():
+        db = get_db()
+        post_id = db.execute(
+            "INSERT INTO post (title, body, author_id) VALUES (?, 'body', 1)", (title,)
+        ).lastrowid
+        db.commit()
+
+    return post_id
+
+
+def test_views_are_buffered(client, app):
+    assert client.get('/article/1').status_code == 200
+    assert client.get('/article/1').headers['X-Cache'] == 'HIT'
+    assert client.get('/article/404').status_code == 404
+    assert stats(app) == []
+
+    assert get_view_counter(app).flush() == 2
+    assert stats(app) == [(1, 2)]
+
+    client.get('/article/1')
+    get_view_counter(app).flush()
+    assert stats(app) == [(1, 3)]
+
+
+def test_views_of_deleted_posts_are_dropped(app):
+    counter = get_view_counter(app)
+    counter.add(1)
+    counter.add(42)
+    counter.flush()
+    assert stats(app) == [(1, 1)]
+
+
+def test_flush_at_exit(app):
+    counter = get_view_counter(app)
+    counter.add(1)
+    assert counter.flush(at_exit=True) == 1
+    assert stats(app) == [(1, 1)]
+
+
+def test_logaddexp():
+    assert logaddexp(None, 1.5) == 1.5
+    assert math.isclose(logaddexp(math.log(2), math.log(3)), math.log(5))
+
+
+def test_recent_views_outweigh_old_ones(app):
+    newer = add_post(app, 'newer')
+    now = 1_700_000_000
+
+    with app.app_context():
+        # Ten views three days (one half-life) ago count as five now.
+        record_views({1: 10}, now - 3 * DAY, 3 * DAY)
+        record_views({newer: 6}, now, 3 * DAY)
+        rows = get_db().execute(
+            'SELECT post_id, score FROM post_stats ORDER BY score DESC'
+        ).fetchall()
+
+    assert [row['post_id'] for row in rows] == [newer, 1]
+    assert math.isclose(rows[1]['score'], decayed_weight(5, now, 3 * DAY))
+
+
+def test_popular(client, app):
+    other = add_post(app, 'other post')
+    counter = get_view_counter(app)
+    counter.add(other)
+    counter.add(other)
+    counter.add(1)
+    counter.flush()
+
+    response = client.get('/popular')
+    assert response.status_code == 200
+    assert response.data.index(b'other post') < response.data.index(b'test title')
+    assert b'2 views' in response.data
+
+
+def test_popular_etag_changes_with_views(client, auth, app):
+    other = add_post(app, 'other post')
+    counter = get_view_counter(app)
+    counter.add(other)
+    counter.add(other)
+    counter.flush()
+    # Logged in, so the page isn't served from the response cache.
+    auth.login()
+    etag = client.get('/popular').headers['ETag']
+
+    # Same posts in the same order; only the count shown changes.
+    counter.add(other)
+    counter.flush()
+    response = client.get('/popular', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'3 views' in response.data
@@ -1,9 +1,12 @@
 # tests/test_db.py
 
+import asyncio
 import sqlite3
+import threading
 
 import pytest
-from flaskr.db import get_db
+from flask import g
+from flaskr.db import ConnectionPool, get_db, get_pool, run_db
 
 
 def test_get_close_db(app):
@@ -28,3 +31,97 @@ def test_init_db_command(runner, monkeypatch):
     result = runner.invoke(args=['init-db'])
     assert 'Initialized' in result.output
     assert Recorder.called
+
+
+def test_pool_reuses_connections(app):
+    with app.app_context():
+        first = get_db().connection
+
+    with app.app_context():
+        assert get_db().connection is first
+        assert get_db().execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert get_db().execute('PRAGMA foreign_keys').fetchone()[0] == 1
+
+    stats = get_pool(app).stats()
+    assert stats['creations'] == 1
+    assert stats['checkouts'] >= 2
+    assert stats['in_use'] == 0
+
+
+def test_pool_bounded(app):
+    pool = ConnectionPool(app.config['DATABASE'], size=1, timeout=0.05)
+    db = pool.acquire()
+
+    with pytest.raises(sqlite3.OperationalError) as e:
+        pool.acquire()
+
+    assert 'Timed out' in str(e.value)
+    assert pool.stats()['waits'] == 1
+
+    db.close()
+    db = pool.acquire()
+    assert db.connection is not None
+    db.close()
+    pool.close()
+
+
+def test_pool_recycles_old_connections(app):
+    pool = ConnectionPool(app.config['DATABASE'], max_age=0)
+    first = pool.acquire()
+    connection = first.connection
+    first.close()
+
+    second = pool.acquire()
+    assert second.connection is not connection
+    assert pool.stats()['recycled'] == 1
+    second.close()
+    pool.close()
+
+
+def test_pool_rolls_back_on_release(app):
+    pool = ConnectionPool(app.config['DATABASE'], size=1)
+    db = pool.acquire()
+    db.execute('DELETE FROM post')
+    db.close()
+
+    db = pool.acquire()
+    assert db.execute('SELECT COUNT(*) FROM post').fetchone()[0] == 1
+    db.close()
+    pool.close()
+
+
+def test_run_db_releases_connection(app):
+    def count():
+        return get_db().execute('SELECT COUNT(*) FROM post').fetchone()[0]
+
+    with app.app_context():
+        assert asyncio.run(run_db(count)) == 1
+        assert 'db' not in g
+        assert get_pool(app).stats()['in_use'] == 0
+
+
+def test_run_db_calls_use_their_own_connections(app):
+    barrier = threading.Barrier(2, timeout=5)
+
+    def connection():
+        barrier.wait()
+        return get_db().connection
+
+    async def both():
+        return await asyncio.gather(run_db(connection), run_db(connection))
+
+    with app.app_context():
+        request_connection = get_db().connection
+        first, second = asyncio.run(both())
+
+    assert first is not second
+    assert request_connection not in (first, second)
+
+
+def test_async_update_holds_no_connection(client, auth, app):
+    auth.login()
+    response = client.post('/1/update', data={'title': 'updated', 'body': 'body'})
+    assert response.status_code == 302
+    # Reindexing the post for related posts runs in the background.
+    app.extensions['flaskr.tasks'].join()
+    assert get_pool(app).stats()['in_use'] == 0
@@ -0,0 +1,116 @@
+# tests/test_drafts.py
+
+import threading
+import time
+
+import pytest
+from flaskr.db import get_db
+from flaskr.drafts import get_drafts
+from flaskr.writer import get_writer
+from werkzeug.exceptions import ServiceUnavailable
+
+
+@pytest.fixture
+def login(client):
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+
+
+def stored_drafts(app):
+    with app.app_context():
+        return get_db().execute(
+            'SELECT user_id, post_id, data FROM draft ORDER BY user_id, post_id'
+        ).fetchall()
+
+
+def test_autosave_requires_login(client):
+    assert client.post('/autosave').headers['Location'] == '/auth/login'
+
+
+def test_autosave_per_user(client, app, login):
+    response = client.post('/autosave', data={'title': 'mine', 'junk': 'x'})
+    assert response.json == {'status': 'success'}
+    assert client.get('/autosave').json['draft'] == {'title': 'mine'}
+
+    with client.session_transaction() as session:
+        session['user_id'] = 2
+
+    assert client.get('/autosave').json['draft'] is None
+    client.post('/autosave', data={'title': 'theirs'})
+    assert [tuple(row) for row in stored_drafts(app)] == [
+        (1, 0, '{"title": "mine"}'), (2, 0, '{"title": "theirs"}'),
+    ]
+
+
+def test_autosave_coalesces(client, app, login):
+    get_drafts(app).window = 0.2
+
+    for n in range(5):
+        client.post('/autosave', data={'title': f'v{n}'})
+
+    assert client.get('/autosave').json['draft'] == {'title': 'v4'}
+    assert stored_drafts(app)[0]['data'] == '{"title": "v0"}'
+
+    time.sleep(0.4)
+    assert stored_drafts(app)[0]['data'] == '{"title": "v4"}'
+    assert get_drafts(app).writes == 2
+    assert get_drafts(app).coalesced == 3
+
+
+def test_autosave_existing_post(client, app, login):
+    client.post('/autosave', data={'post_id': 1, 'title': 'edit'})
+    assert client.get('/autosave?post_id=1').json['draft'] == {'title': 'edit'}
+    assert client.get('/autosave').json['draft'] is None
+
+    client.post('/1/update', data={'title': 'edit', 'body': 'body'})
+    assert client.get('/autosave?post_id=1').json['draft'] is None
+
+
+def test_autosave_checks_author(client, login):
+    assert client.post('/autosave', data={'post_id': 5}).status_code == 404
+
+    with client.session_transaction() as session:
+        session['user_id'] = 2
+
+    assert client.get('/autosave?post_id=1').status_code == 403
+
+
+def test_create_discards_draft(client, app, login):
+    client.post('/autosave', data={'title': 'new'})
+    client.post('/create', data={'title': 'new', 'body': 'body'})
+    assert stored_drafts(app) == []
+
+
+def test_held_draft_readable_until_committed(app):
+    drafts = get_drafts(app)
+    drafts.save(1, 0, {'title': 'first'})
+    drafts.save(1, 0, {'title': 'held'})
+    drafts._timers[(1, 0)].cancel()
+    # Keep the writer busy so the flush waits on it.
+    release = threading.Event()
+    busy = get_writer(app).submit(release.wait)
+    flush = threading.Thread(target=drafts._flush, args=((1, 0),))
+    flush.start()
+
+    try:
+        time.sleep(0.1)
+
+        with app.app_context():
+            assert drafts.load(1, 0) == {'title': 'held'}
+    finally:
+        release.set()
+        busy.result()
+        flush.join()
+
+    assert drafts._pending == {}
+    assert stored_drafts(app)[0]['data'] == '{"title": "held"}'
+
+
+def test_autosave_reports_writer_failures(client, app, login, monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise ServiceUnavailable('Saving is taking too long, please try again.')
+
+    monkeypatch.setattr(get_writer(app), 'write', unavailable)
+    response = client.post('/autosave', data={'title': 'lost'})
+    assert response.status_code == 500
+    assert response.json['status'] == 'error'
@@ -0,0 +1,56 @@
+from flaskr.db import get_db
+from flaskr.excerpts import plain_text, summarize
+
+
+def test_plain_text():
+    html = '<p>Hello&nbsp;<b>world</b></p><p>again</p><script>alert(1)</script><style>p {}</style>'
+    assert plain_text(html) == 'Hello world again'
+    assert plain_text(None) == ''
+
+
+def test_summarize(app):
+    with app.app_context():
+        stats = summarize('<p>' + 'word ' * 450 + '</p>', length=22)
+        assert stats == {'excerpt': 'word word word word…', 'word_count': 450, 'reading_time': 3}
+        assert summarize('<p>Short.</p>')['excerpt'] == 'Short.'
+
+
+def test_excerpt_written_with_post(client, app):
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+
+    client.post('/create', data={'title': 'new', 'body': '<p>Fresh <em>body</em></p>'})
+    client.post('/1/update', data={'title': 'renamed', 'body': '<h2>Edited</h2><p>text</p>'})
+
+    with app.app_context():
+        rows = get_db().execute(
+            'SELECT id, excerpt, word_count, reading_time FROM post ORDER BY id'
+        ).fetchall()
+        assert [tuple(row) for row in rows] == [(1, 'Edited text', 2, 1), (2, 'Fresh body', 2, 1)]
+
+    response = client.get('/')
+    assert b'Fresh body' in response.data
+    assert b'&lt;em&gt;' not in response.data and b'<em>body' not in response.data
+
+
+def test_listing_does_not_load_bodies(app):
+    from flaskr.blog import PAGE_COLUMNS
+    assert 'body' not in PAGE_COLUMNS.split(', ')
+
+
+def test_backfill_excerpts(runner, app):
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "INSERT INTO post (title, body, author_id) VALUES ('old', '<p>Old <i>post</i></p>', 1)"
+        )
+        db.commit()
+
+    result = runner.invoke(args=['backfill-excerpts'])
+    assert 'Backfilled excerpts for 1 posts.' in result.output
+
+    with app.app_context():
+        assert get_db().execute('SELECT excerpt FROM post WHERE id = 2').fetchone()[0] == 'Old post'
+
+    result = runner.invoke(args=['backfill-excerpts', '--all'])
+    assert 'Backfilled excerpts for 2 posts.' in result.output
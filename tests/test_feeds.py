@@ -0,0 +1,91 @@
+import os
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+from flaskr.db import get_db
+from flaskr.scheduler import publish_due
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+SITEMAP = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+
+def test_feed(client, app):
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "UPDATE post SET seo_title = 'SEO <title>', tags = 'python, web' WHERE id = 1"
+        )
+        db.commit()
+
+    response = client.get('/feed.xml')
+    assert response.mimetype == 'application/atom+xml'
+    feed = ET.fromstring(response.data)
+    entry = feed.find(f'{ATOM}entry')
+    assert entry.find(f'{ATOM}title').text == 'SEO <title>'
+    assert entry.find(f'{ATOM}id').text == 'http://localhost/article/1'
+    assert [c.get('term') for c in entry.findall(f'{ATOM}category')] == ['python', 'web']
+
+
+def test_feed_is_cached_until_a_post_changes(client, app):
+    cached = os.path.join(app.config['FEED_CACHE_DIR'], 'feed.xml')
+    assert b'test title' in client.get('/feed.xml').data
+    assert os.path.exists(cached)
+    assert b'test title' in client.get('/feed.xml').data
+
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+
+    client.post('/1/update', data={'title': 'renamed', 'body': 'body'})
+    assert not os.path.exists(cached)
+    assert b'renamed' in client.get('/feed.xml').data
+
+
+def test_cached_feed_expires_when_a_scheduled_post_is_published(client, app):
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "INSERT INTO post (title, body, publish_date, published, author_id) VALUES ('scheduled', 'b', ?, 0, 1)",
+            (datetime.now(),)
+        )
+        db.commit()
+
+    assert b'scheduled' not in client.get('/feed.xml').data
+    assert os.path.exists(os.path.join(app.config['FEED_CACHE_DIR'], 'feed.xml'))
+
+    with app.app_context():
+        publish_due()
+
+    assert b'scheduled' in client.get('/feed.xml').data
+
+
+def test_sitemap(client, app):
+    urlset = ET.fromstring(client.get('/sitemap.xml').data)
+    locs = [url.find(f'{SITEMAP}loc').text for url in urlset]
+    assert locs == ['http://localhost/', 'http://localhost/article/1']
+    assert client.get('/sitemap-1.xml').status_code == 404
+
+
+def test_sitemap_index(client, app):
+    app.config['SITEMAP_MAX_URLS'] = 3
+
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            'INSERT INTO post (title, body, author_id) VALUES (?, ?, 1)',
+            [(f'post {n}', 'body') for n in range(4)]
+        )
+        db.commit()
+
+    index = ET.fromstring(client.get('/sitemap.xml').data)
+    shards = [s.find(f'{SITEMAP}loc').text for s in index]
+    assert shards == [f'http://localhost/sitemap-{n}.xml' for n in (1, 2, 3)]
+
+    urls = []
+
+    for n in (1, 2, 3):
+        urlset = ET.fromstring(client.get(f'/sitemap-{n}.xml').data)
+        assert len(urlset) <= 3
+        urls += [url.find(f'{SITEMAP}loc').text for url in urlset]
+
+    assert urls == ['http://localhost/'] + [f'http://localhost/article/{n}' for n in range(1, 6)]
+    assert client.get('/sitemap-4.xml').status_code == 404
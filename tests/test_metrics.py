@@ -0,0 +1,83 @@
+# tests/test_metrics.py
+
+import pytest
+from flaskr.db import get_db
+from flaskr.metrics import Histogram, InstrumentedConnection
+
+
+@pytest.fixture
+def instrumented(make_app, tmp_path):
+    return make_app({
+        'INSTRUMENTATION': True,
+        'PROFILE_DIR': str(tmp_path),
+    })
+
+
+def test_disabled_by_default(client, app):
+    assert client.get('/metrics').status_code == 404
+
+    with app.app_context():
+        assert not isinstance(get_db(), InstrumentedConnection)
+
+
+def test_request_metrics(instrumented):
+    client = instrumented.test_client()
+    client.get('/')
+    text = client.get('/metrics').data.decode()
+
+    assert 'flaskr_request_duration_seconds_count{endpoint="blog.index"} 1' in text
+    assert 'flaskr_request_queries_bucket{endpoint="blog.index",le="+Inf"} 1' in text
+    assert 'flaskr_request_db_seconds_sum{endpoint="blog.index"}' in text
+    assert 'flaskr_template_render_seconds_count{template="blog/index.html"} 1' in text
+    assert 'flaskr_db_pool_checkouts' in text
+    assert 'flaskr_cache_misses 1' in text
+
+
+def test_slow_and_repeated_queries(instrumented, caplog):
+    metrics = instrumented.extensions['flaskr.metrics']
+    metrics.slow_query_seconds = 1e-9
+    metrics.n_plus_one_threshold = 3
+
+    @instrumented.route('/n-plus-one')
+    def n_plus_one():
+        db = get_db()
+
+        for id in range(3):
+            db.execute('SELECT * FROM post WHERE id = ?', (id,)).fetchone()
+
+        return ''
+
+    client = instrumented.test_client()
+    client.get('/n-plus-one')
+    text = client.get('/metrics').data.decode()
+
+    assert 'flaskr_n_plus_one_total{endpoint="n_plus_one"} 1' in text
+    assert 'flaskr_slow_queries_total{endpoint="n_plus_one"} 3' in text
+    assert 'Possible N+1 in n_plus_one' in caplog.text
+
+
+def test_profiles_slowest_requests(instrumented, tmp_path):
+    metrics = instrumented.extensions['flaskr.metrics']
+    metrics.profile_sample_rate = 1.0
+    metrics.profile_keep = 2
+    client = instrumented.test_client()
+
+    for _ in range(4):
+        client.get('/')
+
+    assert len(list(tmp_path.glob('*.prof'))) == 2
+
+
+def test_histogram_buckets():
+    histogram = Histogram('h', 'help', buckets=(1, 5))
+    histogram.observe(1)
+    histogram.observe(3)
+    histogram.observe(10)
+
+    assert histogram.render()[2:] == [
+        'h_bucket{le="1"} 1',
+        'h_bucket{le="5"} 2',
+        'h_bucket{le="+Inf"} 3',
+        'h_count 3',
+        'h_sum 14.0',
+    ]
@@ -0,0 +1,140 @@
+import os
+import sqlite3
+import tempfile
+
+import click
+import pytest
+from flaskr import create_app
+from flaskr.db import get_db, get_pool
+from flaskr.migrate import current_version, full_scans, get_migrations, upgrade
+
+
+def schema(db):
+    # Everything that defines the schema, independent of how the CREATE
+    # statements were formatted.
+    snapshot = {}
+
+    for type, name, table, sql in db.execute(
+        "SELECT type, name, tbl_name, sql FROM sqlite_master "
+        "WHERE name NOT LIKE 'sqlite_%' AND name NOT LIKE 'post_fts_%'"
+    ):
+        if type == 'table' and not sql.startswith('CREATE VIRTUAL'):
+            snapshot[name] = (
+                [tuple(row) for row in db.execute(f'PRAGMA table_xinfo("{name}")')],
+                [tuple(row) for row in db.execute(f'PRAGMA foreign_key_list("{name}")')],
+                'WITHOUT ROWID' in sql,
+            )
+        elif type == 'index':
+            snapshot[name] = (table, [tuple(row) for row in db.execute(f'PRAGMA index_xinfo("{name}")')])
+        else:
+            snapshot[name] = ' '.join(sql.split())
+
+    return snapshot
+
+
+@pytest.fixture
+def empty_app():
+    db_fd, db_path = tempfile.mkstemp()
+    app = create_app({'TESTING': True, 'DATABASE': db_path})
+    yield app
+    get_pool(app).close()
+    os.close(db_fd)
+    os.unlink(db_path)
+
+
+def test_migrations_build_the_fresh_schema(app, empty_app):
+    with empty_app.app_context():
+        applied = list(upgrade())
+        migrated = schema(get_db())
+        assert current_version(get_db()) == applied[-1][0]
+
+    with app.app_context():
+        assert schema(get_db()) == migrated
+        assert current_version(get_db()) == get_migrations()[-1][0]
+
+    with empty_app.app_context():
+        assert list(upgrade()) == []
+
+
+def test_upgrade_unversioned_database(empty_app):
+    # A database made by the original schema.sql, before migrations.
+    with empty_app.app_context():
+        db = get_db()
+
+        with open(get_migrations()[0][2]) as f:
+            db.executescript(f.read())
+
+        db.execute("INSERT INTO user (username, password) VALUES ('a', 'x')")
+        db.execute(
+            "INSERT INTO post (title, body, tags, author_id) VALUES ('old post', 'body', 'x', 1)"
+        )
+        db.execute('DELETE FROM post')
+        db.execute(
+            "INSERT INTO post (id, title, body, author_id, created) "
+            "VALUES (5, 'kept', 'body', 1, '2020-01-01 00:00:00')"
+        )
+        db.commit()
+
+        assert [number for number, _ in upgrade()] == [n for n, *_ in get_migrations()][1:]
+        post = db.execute('SELECT * FROM post').fetchone()
+        assert post['title'] == 'kept' and post['version'] == 1
+        assert post['updated'] == post['created']
+        assert db.execute(
+            "SELECT rowid FROM post_fts WHERE post_fts MATCH 'kept'"
+        ).fetchone()[0] == 5
+
+
+def test_failed_migration_rolls_back(empty_app, monkeypatch, tmp_path):
+    (tmp_path / '0001_good.sql').write_text('CREATE TABLE a (id INTEGER);')
+    (tmp_path / '0002_bad.sql').write_text('CREATE TABLE b (id INTEGER);\nNOT SQL;')
+    monkeypatch.setattr(empty_app, 'root_path', str(tmp_path.parent))
+    os.rename(tmp_path, tmp_path.parent / 'migrations')
+
+    try:
+        with empty_app.app_context():
+            db = get_db()
+
+            with pytest.raises(sqlite3.OperationalError):
+                list(upgrade())
+
+            tables = {row[0] for row in db.execute("SELECT name FROM sqlite_master")}
+            assert 'a' in tables and 'b' not in tables
+            assert current_version(db) == 1
+            assert db.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+    finally:
+        os.rename(tmp_path.parent / 'migrations', tmp_path)
+
+
+def test_db_upgrade_command(empty_app):
+    result = empty_app.test_cli_runner().invoke(args=['db-upgrade', '--to', '2'])
+    assert 'Applied 0002_post_version.' in result.output
+    assert 'Database is at version 2 (2 migrations applied).' in result.output
+
+
+def test_full_scans(app):
+    with app.app_context():
+        db = get_db()
+        assert full_scans(db, 'SELECT * FROM post p WHERE p.title = ?') == ['SCAN p']
+        assert full_scans(db, 'SELECT * FROM user WHERE password = ?') == ['SCAN user']
+        assert full_scans(db, 'SELECT * FROM user WHERE username = ?') == []
+
+
+def test_db_explain_command(runner):
+    result = runner.invoke(args=['db-explain'])
+    assert result.exit_code == 0, result.output
+    assert 'No full table scans.' in result.output
+
+
+def test_foreign_key_violations_abort(empty_app):
+    with empty_app.app_context():
+        db = get_db()
+        list(upgrade(target=2))
+        db.execute('PRAGMA foreign_keys = OFF')
+        db.execute("INSERT INTO post (title, body, author_id) VALUES ('orphan', 'body', 42)")
+        db.commit()
+        db.execute('PRAGMA foreign_keys = ON')
+
+        with pytest.raises(click.ClickException, match='foreign key'):
+            list(upgrade(target=3))
+
+        assert current_version(db) == 2
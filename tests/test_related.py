@@ -0,0 +1,213 @@
+import pytest
+from flaskr.db import get_db
+from flaskr.related import TermMatrix, build_related, term_counts, update_related, weigh
+from flaskr.tasks import get_tasks
+
+np = pytest.importorskip('numpy')
+
+POSTS = [
+    (10, 'Brewing espresso at home', 'coffee', '<p>Espresso needs finely ground coffee beans and a good grinder.</p>'),
+    (11, 'Pour over coffee', 'coffee', '<p>Pour over brewing brings out the beans, with a slow pour and a grinder.</p>'),
+    (12, 'Growing tomatoes', 'garden', '<p>Tomatoes want full sun, deep watering and staked vines in the garden.</p>'),
+    (13, 'Watering the garden', 'garden', '<p>Deep watering in the morning keeps garden vines and tomatoes healthy.</p>'),
+]
+
+
+@pytest.fixture
+def posts(app):
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            'INSERT INTO post (id, title, tags, body, author_id) VALUES (?, ?, ?, ?, 1)', POSTS
+        )
+        db.commit()
+
+
+def related_ids(post_id):
+    return [row[0] for row in get_db().execute(
+        'SELECT related_id FROM post_related WHERE post_id = ? ORDER BY score DESC', (post_id,)
+    )]
+
+
+def test_term_counts():
+    counts = term_counts({'title': 'Coffee', 'tags': 'coffee, beans', 'body': '<p>The coffee 42</p>'})
+    assert counts == {'coffee': 6, 'beans': 2}
+
+
+def test_weigh_is_unit_length():
+    vector = weigh({'coffee': 6, 'beans': 2}, {'coffee': 1, 'beans': 3}, 4)
+    assert sum(weight * weight for weight in vector.values()) == pytest.approx(1)
+    assert vector['coffee'] > vector['beans']
+
+
+def test_nearest_matches_dense_scores():
+    rng = np.random.default_rng(0)
+    vocabulary = [f'term{n}' for n in range(30)]
+    vectors = []
+
+    for _ in range(40):
+        terms = rng.choice(vocabulary, size=6, replace=False)
+        vectors.append(weigh(dict(zip(terms, rng.integers(1, 5, 6).tolist())), {}.fromkeys(terms, 1), 40))
+
+    matrix = TermMatrix(vectors, max_df=1)
+    dense = np.array([[vector.get(term, 0) for term in vocabulary] for vector in vectors])
+    expected = dense[10:20] @ dense.T
+
+    for row, related in enumerate(matrix.nearest(10, 20, 3, 0.01)):
+        scores = expected[row].copy()
+        scores[row + 10] = 0
+        assert [other for other, _ in related] == sorted(
+            np.flatnonzero(scores >= 0.01), key=lambda other: (-scores[other], other)
+        )[:3]
+        assert [score for _, score in related] == pytest.approx(
+            [scores[other] for other, _ in related]
+        )
+
+
+def test_build_related(app, posts):
+    with app.app_context():
+        assert list(build_related(batch_size=2)) == [2, 4, 5]
+        assert related_ids(10) == [11]
+        assert related_ids(12) == [13]
+        assert related_ids(1) == []
+
+        scores = dict(get_db().execute(
+            'SELECT post_id, score FROM post_related WHERE related_id = 10'
+        ).fetchall())
+        assert set(scores) == {11}
+        assert 0 < scores[11] <= 1
+
+
+def test_build_related_command(runner, posts):
+    result = runner.invoke(args=['build-related'])
+    assert 'Built related posts for 5 posts.' in result.output
+
+
+def test_update_related(app, posts):
+    with app.app_context():
+        list(build_related())
+        db = get_db()
+        db.execute(
+            'INSERT INTO post (id, title, tags, body, author_id) VALUES (?, ?, ?, ?, 1)',
+            (14, 'Coffee grinder review', 'coffee', '<p>A burr grinder for espresso beans.</p>')
+        )
+        db.commit()
+
+        lists = update_related(14)
+        assert set(related_ids(14)) == {10, 11}
+        assert set(lists) == {14, 10, 11}
+        assert 14 in related_ids(10)
+        assert related_ids(12) == [13]
+
+        # Rewritten about gardening, it leaves the coffee posts' lists.
+        db.execute(
+            "UPDATE post SET title = 'Staking tomatoes', tags = 'garden', "
+            "body = '<p>Staked vines and tomatoes in the garden.</p>' WHERE id = 14"
+        )
+        db.commit()
+        update_related(14)
+        assert 14 not in related_ids(10)
+        assert 14 not in related_ids(11)
+        assert set(related_ids(14)) == {12, 13}
+
+
+def test_update_full_list_rescores(app, posts):
+    app.config['RELATED_POSTS'] = 1
+
+    with app.app_context():
+        list(build_related())
+        assert related_ids(10) == [11]
+        get_db().execute(
+            "UPDATE post SET title = 'Staking tomatoes', tags = 'garden', "
+            "body = '<p>Staked vines and tomatoes.</p>' WHERE id = 11"
+        )
+        get_db().commit()
+        update_related(11)
+        # 11 dropped off 10's list; nothing else is close enough to take its place.
+        assert related_ids(10) == []
+
+
+def test_deleting_post_removes_rows(app, posts):
+    with app.app_context():
+        list(build_related())
+        db = get_db()
+        db.execute('DELETE FROM post WHERE id = 11')
+        db.commit()
+        assert related_ids(10) == []
+        assert db.execute('SELECT COUNT(*) FROM post_term WHERE post_id = 11').fetchone()[0] == 0
+
+
+def test_article_shows_related(app, client, posts):
+    with app.app_context():
+        list(build_related())
+
+    response = client.get('/article/10')
+    assert b'Related articles' in response.data
+    assert b'href="/article/11"' in response.data
+    assert b'href="/article/12"' not in response.data
+    assert b'Related articles' not in client.get('/article/1').data
+
+    # A change to another post's related list shows up on revalidation.
+    etag = response.headers['ETag']
+    assert client.get('/article/10', headers={'If-None-Match': etag}).status_code == 304
+
+    with app.app_context():
+        get_db().execute(
+            "UPDATE post SET title = 'Tomatoes', body = '<p>Tomatoes</p>', tags = 'garden' WHERE id = 11"
+        )
+        get_db().commit()
+        update_related(11)
+
+    response = client.get('/article/10', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'href="/article/11"' not in response.data
+
+
+def test_deleting_post_rescores_lists_it_was_on(app, client, auth, posts):
+    with app.app_context():
+        list(build_related())
+        get_db().execute('UPDATE post SET author_id = 1')
+        get_db().commit()
+
+    assert b'href="/article/11"' in client.get('/article/10').data
+    auth.login()
+    client.post('/11/delete')
+    get_tasks(app).join()
+    auth.logout()
+    assert b'href="/article/11"' not in client.get('/article/10').data
+
+
+def test_saving_post_updates_related(app, client, auth, posts):
+    with app.app_context():
+        list(build_related())
+
+    auth.login()
+    client.post('/create', data={
+        'title': 'Espresso grinder', 'body': '<p>A grinder for espresso beans.</p>',
+        'tags': 'coffee',
+    })
+    get_tasks(app).join()
+
+    with app.app_context():
+        post_id = get_db().execute(
+            "SELECT id FROM post WHERE title = 'Espresso grinder'"
+        ).fetchone()[0]
+        assert set(related_ids(post_id)) >= {10}
+
+
+def test_related_title_change_updates_article(app, client, posts):
+    with app.app_context():
+        list(build_related())
+
+    etag = client.get('/article/10').headers['ETag']
+
+    with app.app_context():
+        get_db().execute(
+            "UPDATE post SET title = 'Pour over coffee, revisited', version = version + 1 WHERE id = 11"
+        )
+        get_db().commit()
+        update_related(11)
+
+    response = client.get('/article/10', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Pour over coffee, revisited' in response.data
@@ -0,0 +1,99 @@
+import time
+from datetime import datetime, timedelta
+
+from flaskr.db import get_db
+from flaskr.scheduler import Scheduler, is_due, publish_due
+from flaskr.signals import post_changed
+
+
+def schedule(app, title, publish_date):
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            'INSERT INTO post (title, body, author_id, publish_date, published) '
+            'VALUES (?, ?, 1, ?, 0)',
+            (title, 'body', publish_date)
+        )
+        db.commit()
+
+
+def test_is_due():
+    now = datetime(2024, 1, 1, 12)
+    assert is_due(now, now)
+    assert is_due('2024-01-01 11:59:00', now)
+    assert not is_due(now + timedelta(seconds=1), now)
+    assert not is_due(None, now)
+
+
+def test_publish_due(app):
+    schedule(app, 'due', datetime.now() - timedelta(minutes=1))
+    schedule(app, 'later', datetime.now() + timedelta(days=1))
+    sent = []
+
+    def receiver(sender, post_id):
+        sent.append(post_id)
+
+    with app.app_context(), post_changed.connected_to(receiver, app):
+        assert publish_due() == [2]
+        assert publish_due() == []
+        published = get_db().execute(
+            'SELECT title FROM post WHERE published = 1 ORDER BY id'
+        ).fetchall()
+
+    assert [row['title'] for row in published] == ['test title', 'due']
+    assert sent == [2]
+
+
+def test_listings_show_published_posts(client, app):
+    schedule(app, 'scheduled', datetime.now() - timedelta(minutes=1))
+    assert b'scheduled' not in client.get('/').data
+    assert client.get('/api/v1/posts/2').status_code == 404
+
+    with app.app_context():
+        publish_due()
+
+    assert b'scheduled' in client.get('/').data
+    assert client.get('/api/v1/posts/2').status_code == 200
+
+
+def test_create_publishes_immediately_or_schedules(client, auth, app):
+    auth.login()
+    client.post('/create', data={'title': 'now', 'body': 'body'})
+    client.post('/create', data={
+        'title': 'later', 'body': 'body', 'publish_date': '2999-01-01T00:00',
+    })
+
+    with app.app_context():
+        rows = get_db().execute(
+            'SELECT title, published FROM post WHERE id > 1 ORDER BY id'
+        ).fetchall()
+
+    assert [tuple(row) for row in rows] == [('now', 1), ('later', 0)]
+
+
+def test_publish_due_command(runner, app):
+    schedule(app, 'due', datetime.now() - timedelta(minutes=1))
+    result = runner.invoke(args=['publish-due'])
+    assert 'Published 1 posts.' in result.output
+
+
+def test_scheduler_publishes_when_due(app):
+    schedule(app, 'soon', datetime.now() + timedelta(seconds=0.3))
+    scheduler = Scheduler(app, interval=10)
+    scheduler.start()
+
+    try:
+        for _ in range(50):
+            with app.app_context():
+                published = get_db().execute(
+                    'SELECT published FROM post WHERE id = 2'
+                ).fetchone()[0]
+
+            if published:
+                break
+
+            time.sleep(0.05)
+    finally:
+        scheduler.stop()
+
+    assert published
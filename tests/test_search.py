@@ -0,0 +1,127 @@
+# tests/test_search.py
+
+import pytest
+from flaskr.db import get_db, rebuild_search_index
+
+
+def test_search(client):
+    response = client.get('/search?q=tit')
+    assert b'test title' in response.data
+    assert b'<mark>title</mark>' in response.data
+
+    response = client.get('/search?q=missing')
+    assert b'test title' not in response.data
+    assert b'No articles match' in response.data
+
+
+@pytest.mark.parametrize('q', ('', '"', 'AND OR NOT', '*'))
+def test_search_rejects_nothing(client, q):
+    assert client.get('/search', query_string={'q': q}).status_code == 200
+
+
+def test_search_follows_writes(client, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE post SET title = 'renamed' WHERE id = 1")
+        db.commit()
+
+    assert b'/article/1' in client.get('/search?q=renamed').data
+    assert b'/article/1' not in client.get('/search?q=title').data
+
+    with app.app_context():
+        db = get_db()
+        db.execute('DELETE FROM post WHERE id = 1')
+        db.commit()
+
+    assert b'/article/1' not in client.get('/search?q=renamed').data
+
+
+def test_search_pagination(client, app):
+    app.config['POSTS_PER_PAGE'] = 2
+
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            'INSERT INTO post (title, body, author_id) VALUES (?, ?, 1)',
+            [(f'paged {n}', 'body') for n in range(3)]
+        )
+        db.commit()
+
+    response = client.get('/search?q=paged')
+    assert response.data.count(b'paged ') == 2
+    assert b'after=' in response.data
+
+    cursor = response.data.split(b'after=')[1].split(b'"')[0].decode()
+    response = client.get(f'/search?q=paged&after={cursor}')
+    assert response.data.count(b'paged ') == 1
+    assert b'after=' not in response.data
+
+
+def test_rebuild_search_index(runner, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO post_fts (post_fts) VALUES ('delete-all')")
+        db.executemany(
+            'INSERT INTO post (title, body, author_id) VALUES (?, ?, 1)',
+            [(f'post {n}', 'body') for n in range(4)]
+        )
+        db.commit()
+
+    result = runner.invoke(args=['rebuild-search-index', '--batch-size', '2'])
+    assert 'Rebuilt the search index (5 posts)' in result.output
+
+    with app.app_context():
+        assert get_db().execute(
+            "SELECT COUNT(*) FROM post_fts WHERE post_fts MATCH 'post OR test'"
+        ).fetchone()[0] == 5
+
+
+def matches(db, query):
+    return [row[0] for row in db.execute(
+        'SELECT rowid FROM post_fts WHERE post_fts MATCH ? ORDER BY rowid', (query,)
+    )]
+
+
+def test_search_works_during_rebuild(app):
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            'INSERT INTO post (title, body, author_id) VALUES (?, ?, 1)',
+            [(f'post {n}', 'body') for n in range(4)]
+        )
+        db.commit()
+        rebuild = rebuild_search_index(batch_size=2)
+
+        assert next(rebuild) == 2
+        assert matches(db, 'body') == [2, 3, 4, 5]
+        # Changes to copied and not yet copied posts both reach the new index.
+        db.execute("UPDATE post SET body = 'changed' WHERE id IN (1, 4)")
+        db.execute('DELETE FROM post WHERE id = 2')
+        db.execute("INSERT INTO post (title, body, author_id) VALUES ('late', 'body', 1)")
+        db.commit()
+        assert list(rebuild) == [4, 6]
+
+        assert matches(db, 'changed') == [1, 4]
+        assert matches(db, 'body') == [3, 5, 6]
+        assert db.execute(
+            "SELECT name FROM sqlite_master WHERE name LIKE 'post_fts_build%'"
+        ).fetchall() == []
+        db.execute("INSERT INTO post (title, body, author_id) VALUES ('after', 'fresh', 1)")
+        db.commit()
+        assert matches(db, 'fresh') == [7]
+        db.execute("INSERT INTO post_fts (post_fts) VALUES ('integrity-check')")
+
+
+def test_search_indexes_created_posts(client):
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+
+    response = client.post(
+        '/create', data={'title': 'fresh', 'body': 'searchable words'}
+    )
+    assert response.headers['Location'] == '/article/2'
+    assert b'/article/2' in client.get('/search?q=searchable').data
+
+    client.post('/2/update', data={'title': 'fresh', 'body': 'other words'})
+    assert b'/article/2' not in client.get('/search?q=searchable').data
+    assert b'/article/2' in client.get('/search?q=other').data
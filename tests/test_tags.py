@@ -0,0 +1,74 @@
+from flaskr.db import get_db
+from flaskr.tags import parse_tags
+
+
+def tag_counts(app):
+    with app.app_context():
+        return dict(get_db().execute('SELECT name, post_count FROM tag').fetchall())
+
+
+def test_parse_tags():
+    assert parse_tags(' Python, web ,python,,  big   data ') == ['python', 'web', 'big data']
+    assert parse_tags(None) == []
+
+
+def test_tags_follow_posts(client, app):
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+
+    client.post('/create', data={'title': 'tagged', 'body': 'body', 'tags': 'Python, web'})
+    assert tag_counts(app) == {'python': 1, 'web': 1}
+
+    client.post('/2/update', data={'title': 'tagged', 'body': 'body', 'tags': 'web, sqlite'})
+    assert tag_counts(app) == {'python': 0, 'web': 1, 'sqlite': 1}
+
+    client.post('/2/delete')
+    assert tag_counts(app) == {'python': 0, 'web': 0, 'sqlite': 0}
+
+
+def test_tag_listing(client, app):
+    app.config['POSTS_PER_PAGE'] = 1
+
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+
+    for n, tags in enumerate(('python', 'python, web', 'web')):
+        client.post('/create', data={'title': f'post {n}', 'body': 'body', 'tags': tags})
+
+    response = client.get('/tag/python')
+    assert b'post 1' in response.data and b'post 0' not in response.data
+    assert b'/tag/python?before=' in response.data
+
+    with app.app_context():
+        created = get_db().execute('SELECT created FROM post WHERE id = 3').fetchone()[0]
+
+    response = client.get(f'/tag/python?before={created}_3')
+    assert b'post 0' in response.data and b'post 1' not in response.data
+
+    response = client.get('/')
+    assert b'href="/tag/web"' in response.data
+    assert client.get('/tag/missing').status_code == 404
+
+
+def test_category_listing(client, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE post SET category = 'python' WHERE id = 1")
+        db.commit()
+
+    assert b'test title' in client.get('/category/python').data
+    assert b'test title' not in client.get('/category/flutter').data
+
+
+def test_backfill_tags(runner, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE post SET tags = 'a, b' WHERE id = 1")
+        db.commit()
+
+    result = runner.invoke(args=['backfill-tags', '--batch-size', '1'])
+    assert 'Backfilled tags for 1 posts.' in result.output
+    assert tag_counts(app) == {'a': 1, 'b': 1}
+
+    runner.invoke(args=['backfill-tags'])
+    assert tag_counts(app) == {'a': 1, 'b': 1}
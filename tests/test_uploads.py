@@ -0,0 +1,117 @@
+# tests/test_uploads.py
+
+import io
+
+import pytest
+from flaskr.db import get_db
+from flaskr.tasks import get_tasks
+from flaskr.uploads import (
+    VARIANTS, UploadError, image_srcset, image_variant, save_image, variant_path
+)
+from werkzeug.datastructures import FileStorage
+
+PIL = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture
+def uploads(app, tmp_path):
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    return tmp_path
+
+
+def png(width, height=10):
+    data = io.BytesIO()
+    PIL.new('RGB', (width, height), 'red').save(data, format='PNG')
+    return data.getvalue()
+
+
+def upload(data, filename='photo.png'):
+    return FileStorage(io.BytesIO(data), filename=filename)
+
+
+def test_content_addressed_and_deduplicated(app, uploads):
+    with app.test_request_context():
+        first = save_image(upload(png(20), 'a.png'))
+        second = save_image(upload(png(20), 'b.png'))
+        other = save_image(upload(png(30), 'a.png'))
+
+    assert first == second != other
+    name = first.rsplit('/', 1)[1]
+    assert first == f'uploads/{name[:2]}/{name}'
+    assert len(list(uploads.glob('*/*.png'))) == 2
+    assert not list(uploads.glob('*.part'))
+
+
+def test_rejects_large_and_unknown_files(app, uploads):
+    app.config['UPLOAD_MAX_BYTES'] = 10
+
+    with app.test_request_context():
+        with pytest.raises(UploadError):
+            save_image(upload(png(20)))
+
+        with pytest.raises(UploadError):
+            save_image(upload(b'x', 'script.html'))
+
+        assert save_image(None, default='uploads/old.png') == 'uploads/old.png'
+
+    assert not list(uploads.rglob('*.*'))
+
+
+def test_variants_generated_in_background(app, uploads):
+    with app.test_request_context():
+        image = save_image(upload(png(1600, 900)))
+        get_tasks().join()
+
+        assert image_variant(image, 'thumb').endswith(f"-{VARIANTS['thumb']}w.png")
+        assert f"{VARIANTS['medium']}w" in image_srcset(image)
+
+    thumb = PIL.open(uploads / variant_path(image, 'thumb').removeprefix('uploads/'))
+    assert thumb.size == (400, 225)
+
+
+def test_small_images_keep_original(app, uploads):
+    with app.test_request_context():
+        image = save_image(upload(png(100)))
+        get_tasks().join()
+
+        assert image_variant(image, 'thumb') == image
+        assert image_srcset(image) == ''
+
+
+def test_create_with_image(client, app, uploads):
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+
+    response = client.post('/create', data={
+        'title': 'pictured', 'body': 'body',
+        'image': (io.BytesIO(png(800)), 'header.png'),
+    })
+    assert response.status_code == 302
+    get_tasks(app).join()
+
+    with app.app_context():
+        image = get_db().execute(
+            'SELECT image FROM post WHERE id = 2'
+        ).fetchone()['image']
+
+    assert image.startswith('uploads/')
+    assert b'400w' in client.get('/').data
+
+
+
+def test_backfill_variants(runner, app, uploads):
+    (uploads / 'old-header.png').write_bytes(png(1600, 900))
+    (uploads / 'small.png').write_bytes(png(100))
+    (uploads / 'notes.txt').write_text('not an image')
+
+    result = runner.invoke(args=['backfill-variants'])
+    assert 'Backfilled variants for 1 images.' in result.output
+    assert (uploads / 'old-header-400w.png').exists()
+    assert (uploads / 'old-header-1200w.png').exists()
+
+    with app.test_request_context():
+        assert image_variant('uploads/old-header.png', 'thumb') == 'uploads/old-header-400w.png'
+
+    # Images with all their variants, and variants themselves, are skipped.
+    result = runner.invoke(args=['backfill-variants'])
+    assert 'Backfilled variants for 0 images.' in result.output
@@ -0,0 +1,49 @@
+import logging
+import os
+
+from flaskr.db import get_pool
+
+
+def cached_templates(app):
+    return os.listdir(app.config['TEMPLATE_CACHE_DIR'])
+
+
+def test_bytecode_cache(client, app):
+    assert cached_templates(app) == []
+    client.get('/')
+    assert len(cached_templates(app)) == 2  # base.html and blog/index.html
+
+
+def test_precompile_command(runner, app):
+    result = runner.invoke(args=['precompile'])
+    assert 'Compiled' in result.output
+    assert len(cached_templates(app)) == len(app.jinja_env.list_templates())
+
+
+def test_precompile_without_cache(app):
+    app.jinja_env.bytecode_cache = None
+    result = app.test_cli_runner().invoke(args=['precompile'])
+    assert result.exit_code != 0
+    assert 'disabled' in result.output
+
+
+def test_warm_up(app, make_app, caplog):
+    caplog.set_level(logging.INFO, logger='flaskr')
+    warm = make_app({**app.config, 'WARM_UP': True})
+    timings = warm.extensions['flaskr.warmup']
+
+    assert set(timings) == {'templates', 'url_map', 'startup'}
+    assert timings['startup'] >= timings['templates'] + timings['url_map']
+    assert 'Warm-up finished' in caplog.text
+    # No connection is opened before a (possibly forked) worker serves.
+    assert get_pool(warm).stats()['open'] == 0
+
+    warm.test_client().get('/')
+    warm.test_client().get('/')
+    assert 'pool' in timings
+    assert get_pool(warm).stats()['creations'] == warm.config['DATABASE_POOL_SIZE']
+
+
+def test_no_warm_up_by_default(app):
+    assert 'flaskr.warmup' not in app.extensions
+    assert get_pool(app).stats()['creations'] == 1  # opened by init_db
@@ -0,0 +1,159 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+from flaskr import writer as writer_module
+from flaskr.db import get_db
+from flaskr.writer import Writer, get_writer
+from werkzeug.exceptions import ServiceUnavailable
+
+
+def insert_post(title):
+    return get_db().execute(
+        "INSERT INTO post (title, body, author_id) VALUES (?, 'body', 1)", (title,)
+    ).lastrowid
+
+
+def titles(app):
+    with app.app_context():
+        return [row[0] for row in get_db().execute('SELECT title FROM post ORDER BY id')]
+
+
+@pytest.fixture
+def make_writer(app):
+    writers = []
+
+    def make(**options):
+        writers.append(Writer(app, **options))
+        return writers[-1]
+
+    yield make
+
+    for writer in writers:
+        writer.close()
+
+
+def test_writes_are_committed_together(app, make_writer):
+    writer = make_writer(max_batch=10, max_wait=0.2)
+    futures = [writer.submit(insert_post, f'post {n}') for n in range(5)]
+
+    assert [future.result() for future in futures] == [2, 3, 4, 5, 6]
+    assert titles(app)[1:] == [f'post {n}' for n in range(5)]
+    assert writer.stats() == {'batches': 1, 'writes': 5, 'failed': 0, 'queued': 0}
+
+
+def test_batches_are_bounded(make_writer):
+    writer = make_writer(max_batch=2, max_wait=0.2)
+    futures = [writer.submit(insert_post, f'post {n}') for n in range(5)]
+
+    for future in futures:
+        future.result()
+
+    assert writer.stats()['batches'] == 3
+
+
+def test_failed_write_is_rolled_back_alone(app, make_writer):
+    writer = make_writer(max_batch=10, max_wait=0.2)
+
+    def fails():
+        insert_post('half done')
+        get_db().execute('INSERT INTO post (id, title, body, author_id) VALUES (1, 0, 0, 1)')
+
+    first = writer.submit(insert_post, 'first')
+    failed = writer.submit(fails)
+    last = writer.submit(insert_post, 'last')
+
+    with pytest.raises(sqlite3.IntegrityError):
+        failed.result()
+
+    assert first.result() and last.result()
+    assert titles(app) == ['test title', 'first', 'last']
+    assert writer.stats()['failed'] == 1
+
+
+def test_write_async(app):
+    with app.app_context():
+        post_id = asyncio.run(get_writer().write_async(insert_post, 'async'))
+
+    assert post_id == 2
+    assert titles(app)[-1] == 'async'
+
+
+def test_views_write_through_the_writer(client, auth, app):
+    auth.login()  # Rehashes the test user's password: one write.
+    client.post('/create', data={'title': 'created', 'body': 'body'})
+    client.post('/2/delete')
+    # Indexing the new post for related posts writes once more.
+    app.extensions['flaskr.tasks'].join()
+
+    assert get_writer(app).stats()['writes'] == 4
+    assert titles(app) == ['test title']
+
+
+def test_writes_need_no_pooled_connection(app, make_app):
+    # The request holds the only pooled connection while it waits on the
+    # writer, so the writer must not need one.
+    small = make_app({'DATABASE_POOL_SIZE': 1, 'DATABASE_POOL_TIMEOUT': 2})
+    client = small.test_client()
+
+    response = client.post('/auth/register', data={'username': 'a', 'password': 'a'})
+    assert response.headers['Location'] == '/auth/login'
+    client.post('/auth/login', data={'username': 'test', 'password': 'test'})
+    assert client.post('/1/delete').status_code == 302
+    small.extensions['flaskr.tasks'].join()
+
+    assert titles(app) == []
+
+
+def test_close_finishes_queued_writes(app):
+    writer = Writer(app)
+    future = writer.submit(insert_post, 'last')
+    writer.close()
+
+    assert future.result() == 2
+    assert writer._thread is None
+
+
+def test_dead_thread_fails_writes_and_restarts(app, make_writer, monkeypatch):
+    connect = writer_module.connect
+
+    def broken(app):
+        raise sqlite3.OperationalError('unable to open database file')
+
+    monkeypatch.setattr(writer_module, 'connect', broken)
+    writer = make_writer()
+
+    with pytest.raises(sqlite3.OperationalError):
+        writer.write(insert_post, 'lost')
+
+    monkeypatch.setattr(writer_module, 'connect', connect)
+    assert writer.write(insert_post, 'saved') == 2
+    assert titles(app) == ['test title', 'saved']
+
+
+def test_write_times_out(app, make_writer):
+    writer = make_writer(timeout=0.1)
+    release = threading.Event()
+    busy = writer.submit(release.wait)
+
+    with pytest.raises(ServiceUnavailable):
+        writer.write(insert_post, 'too late')
+
+    release.set()
+    busy.result()
+    writer.close()
+    # The caller gave up, so the write is skipped rather than done behind its back.
+    assert titles(app) == ['test title']
+
+
+def test_write_at_exit_runs_inline(app):
+    writer = Writer(app)
+
+    assert writer.write_at_exit(insert_post, 'at exit') == 2
+
+    with pytest.raises(sqlite3.IntegrityError):
+        writer.write_at_exit(lambda: (insert_post('rolled back'), insert_post(None)))
+
+    assert titles(app) == ['test title', 'at exit']
+    assert writer._thread is None